@@ -24,6 +24,7 @@ This package contains four pygtk widgets for drawing simple charts:
  - pie_chart.PieChart for pie charts,
  - bar_chart.BarChart for bar charts,
  - bar_chart.MultiBarChart for charts with groups of bars.
+The export module renders many charts to images in worker processes.
 """
 __docformat__ = "epytext"
 
@@ -16,7 +16,7 @@
 #       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #       MA 02110-1301, USA.
 """
-Contains the BarChart widget.
+Contains the BarChart widget and its drawing model BarChartModel.
 
 Author: John Dickinson (john@johnandkaren.com),
 Sven Festersen (sven@sven-festersen.de)
@@ -135,13 +135,13 @@ class Bar(chart.Area):
         else:
             raise AttributeError, "Property %s does not exist." % property.name
         
-    def _do_draw(self, context, rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels):
+    def _do_draw(self, context, rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels, sensitive_areas):
         if mode == MODE_VERTICAL:
-            self._do_draw_single_vertical(context, rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels)
+            self._do_draw_single_vertical(context, rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels, sensitive_areas)
         elif mode == MODE_HORIZONTAL:
-            self._do_draw_single_horizontal(context, rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels)
+            self._do_draw_single_horizontal(context, rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels, sensitive_areas)
         
-    def _do_draw_single_vertical(self, context,  rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels):
+    def _do_draw_single_vertical(self, context,  rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels, sensitive_areas):
         bar_width = (rect.width - (n - 1) * bar_padding) / n
         bar_height = (rect.height - value_label_size - label_size) * self._value / max_value
         bar_x = rect.x + i * (bar_width + bar_padding)
@@ -174,9 +174,9 @@ class Bar(chart.Area):
             self._label_object.draw(context, rect)
             context.fill()
             
-        chart.add_sensitive_area(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), self)
+        sensitive_areas.add(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), self)
         
-    def _do_draw_single_horizontal(self, context,  rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels):
+    def _do_draw_single_horizontal(self, context,  rect, n, i, mode, max_value, bar_padding, value_label_size, label_size, draw_labels, sensitive_areas):
         bar_width = (rect.width - value_label_size - label_size) * self._value / max_value
         bar_height = (rect.height - (n - 1) * bar_padding) / n
         bar_x = rect.x + label_size
@@ -208,7 +208,7 @@ class Bar(chart.Area):
             self._label_object.draw(context, rect)
             context.fill()
             
-        chart.add_sensitive_area(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), self)
+        sensitive_areas.add(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), self)
         
     def get_value_label_size(self, context, rect, mode, n, bar_padding):
         if mode == MODE_VERTICAL:
@@ -241,7 +241,6 @@ class Bar(chart.Area):
         @type radius: int in [0, 100].
         """
         self.set_property("corner-radius", radius)
-        self.emit("appearance_changed")
         
     def get_corner_radius(self):
         """
@@ -333,10 +332,12 @@ class Grid(ChartObject):
         labels = []
         if mode == MODE_VERTICAL:
             delta = (rect.height - value_label_size - label_size) / n
+            #offsets of the lines from the bottom of rect
+            offsets = [i * delta + label_size for i in range(0, int(n + 1))]
             if self._show_values:
                 max_label_size = 0
-                for i in range(0, int(n + 1)):
-                    y = rect.y + rect.height - i * delta - label_size
+                for i, offset in enumerate(offsets):
+                    y = rect.y + rect.height - offset
                     value = maximum_value * float(i) / n
                     value_label = label.Label((rect.x, y), str(value))
                     max_label_size = max(max_label_size, value_label.get_calculated_dimensions(context, rect)[0])
@@ -344,27 +345,28 @@ class Grid(ChartObject):
                 max_label_size += 3
                 rect = gtk.gdk.Rectangle(int(rect.x + max_label_size), rect.y, int(rect.width - max_label_size), rect.height)
                 for i in range(0, len(labels)):
-                    y = rect.y + rect.height - i * delta - label_size
+                    y = rect.y + rect.height - offsets[i]
                     value_label = labels[i]
                     value_label.set_position((rect.x - 3, y))
                     value_label.set_anchor(label.ANCHOR_RIGHT_CENTER)
                     value_label.draw(context, rect)
                     context.fill()
             
-            for i in range(0, int(n + 1)):
-                y = rect.y + rect.height - i * delta - label_size
-                context.set_source_rgb(*color_gdk_to_cairo(self._color))
-                context.move_to(rect.x, y)
+            context.set_source_rgb(*color_gdk_to_cairo(self._color))
+            for offset in offsets:
+                context.move_to(rect.x, rect.y + rect.height - offset)
                 context.rel_line_to(rect.width, 0)
-                context.stroke()
+            context.stroke()
             rect = gtk.gdk.Rectangle(rect.x + self._padding, rect.y, rect.width - 2 * self._padding, rect.height)
         elif mode == MODE_HORIZONTAL:
             delta = (rect.width - value_label_size - label_size) / n
+            #offsets of the lines from the left of rect
+            offsets = [i * delta + label_size for i in range(0, int(n + 1))]
             
             if self._show_values:
                 max_label_size = 0
-                for i in range(0, int(n + 1)):
-                    x = rect.x + i * delta + label_size
+                for i, offset in enumerate(offsets):
+                    x = rect.x + offset
                     value = maximum_value * float(i) / n
                     value_label = label.Label((x, rect.y + rect.height), str(value))
                     max_label_size = max(max_label_size, value_label.get_calculated_dimensions(context, rect)[1])
@@ -372,19 +374,18 @@ class Grid(ChartObject):
                 max_label_size += 3
                 rect = gtk.gdk.Rectangle(rect.x, rect.y, rect.width, int(rect.height - max_label_size))
                 for i in range(0, len(labels)):
-                    x = rect.x + i * delta + label_size
+                    x = rect.x + offsets[i]
                     value_label = labels[i]
                     value_label.set_position((x, rect.y + rect.height + 3))
                     value_label.set_anchor(label.ANCHOR_TOP_CENTER)
                     value_label.draw(context, rect)
                     context.fill()
             
-            for i in range(0, int(n + 1)):
-                x = rect.x + i * delta + label_size
-                context.set_source_rgb(*color_gdk_to_cairo(self._color))
-                context.move_to(x, rect.y)
+            context.set_source_rgb(*color_gdk_to_cairo(self._color))
+            for offset in offsets:
+                context.move_to(rect.x + offset, rect.y)
                 context.rel_line_to(0, rect.height)
-                context.stroke()
+            context.stroke()
             rect = gtk.gdk.Rectangle(rect.x, rect.y + self._padding, rect.width, rect.height - 2 * self._padding)
         return rect
         
@@ -396,7 +397,6 @@ class Grid(ChartObject):
         @type show: boolean.
         """
         self.set_property("show-values", show)
-        self.emit("appearance_changed")
         
     def get_show_values(self):
         """
@@ -414,7 +414,6 @@ class Grid(ChartObject):
         @type color: gtk.gdk.Color.
         """
         self.set_property("color", color)
-        self.emit("appearance_changed")
         
     def get_color(self):
         """
@@ -436,7 +435,6 @@ class Grid(ChartObject):
         @type style: one of the constants above.
         """
         self.set_property("line-style", style)
-        self.emit("appearance_changed")
         
     def get_line_style(self):
         """
@@ -453,7 +451,6 @@ class Grid(ChartObject):
         @type padding: int in [0, 100].
         """
         self.set_property("padding", padding)
-        self.emit("appearance_changed")
         
     def get_padding(self):
         """
@@ -465,13 +462,20 @@ class Grid(ChartObject):
             
 
 
-class BarChart(chart.Chart):
+#the signals of BarChartModel, BarChart emits them, too
+BAR_CHART_SIGNALS = {"bar-clicked": (gobject.SIGNAL_RUN_LAST,
+                                    gobject.TYPE_NONE,
+                                    (gobject.TYPE_PYOBJECT,))}
+
+
+class BarChartModel(chart.ChartModel):
     """
-    This is a widget that show a simple BarChart.
+    This is the drawing model of a simple BarChart, see
+    chart.ChartModel.
     
     Properties
     ==========
-    The BarChart class inherits properties from chart.Chart.
+    The BarChartModel class inherits properties from chart.ChartModel.
     Additional properites:
      - draw-labels (set wether to draw bar label, type: boolean)
      - enable-mouseover (set whether to show a mouseover effect, type:
@@ -484,7 +488,7 @@ class BarChart(chart.Chart):
       
     Signals
     =======
-    The BarChart class inherits signals from chart.Chart.
+    The BarChartModel class inherits signals from chart.ChartModel.
     Additional signals:
      - bar-clicked: emitted when a bar on the bar chart was clicked
       callback signature:
@@ -492,9 +496,7 @@ class BarChart(chart.Chart):
     
     """
     
-    __gsignals__ = {"bar-clicked": (gobject.SIGNAL_RUN_LAST, 
-                                    gobject.TYPE_NONE, 
-                                    (gobject.TYPE_PYOBJECT,))}
+    __gsignals__ = dict(BAR_CHART_SIGNALS)
                                     
     __gproperties__ = {"bar-padding": (gobject.TYPE_INT, "bar padding",
                                         "The distance between two bars.",
@@ -515,7 +517,7 @@ class BarChart(chart.Chart):
                                             gobject.PARAM_READWRITE)}
     
     def __init__(self):
-        super(BarChart, self).__init__()
+        super(BarChartModel, self).__init__()
         #private properties:
         self._bars = []
         #gobject properties:
@@ -564,17 +566,16 @@ class BarChart(chart.Chart):
     #drawing methods
     def draw(self, context):
         """
-        Draw the widget. This method is called automatically. Don't call it
-        yourself. If you want to force a redrawing of the widget, call
+        Draw the chart. This method is called automatically. Don't call it
+        yourself. If you want to force a redrawing of the chart, call
         the queue_draw() method.
         
         @type context: cairo.Context
         @param context: The context to draw on.
         """
-        label.begin_drawing()
+        label.begin_drawing(self._style_cache)
         
-        rect = self.get_allocation()
-        rect = gtk.gdk.Rectangle(0, 0, rect.width, rect.height) #transform rect to context coordinates
+        rect = self._get_draw_rect()
         context.set_line_width(1)
                                     
         rect = self.draw_basics(context, rect)
@@ -609,7 +610,7 @@ class BarChart(chart.Chart):
             n = len(self._bars)
             minimum_width = rect.x + self._bar_padding + 100
             minimum_height = rect.y + self._padding + (n - 1) * self._bar_padding + n * 10
-        self.set_size_request(minimum_width, minimum_height)
+        self._set_minimum_size(minimum_width, minimum_height)
         
     def draw_basics(self, context, rect):
         """
@@ -642,9 +643,9 @@ class BarChart(chart.Chart):
             return
         
         #draw the bars
-        chart.init_sensitive_areas()
+        self._sensitive_areas.clear()
         for i, bar in enumerate(self._bars):
-            bar.draw(context, rect, len(self._bars), i, self._mode, maximum_value, self._bar_padding, value_label_size, label_size, self._draw_labels)
+            bar.draw(context, rect, len(self._bars), i, self._mode, maximum_value, self._bar_padding, value_label_size, label_size, self._draw_labels, self._sensitive_areas)
         
     #other methods
     def add_bar(self, bar):
@@ -656,14 +657,14 @@ class BarChart(chart.Chart):
     #callbacks
     def _cb_motion_notify(self, widget, event):
         if not self._mouseover: return
-        bars = chart.get_sensitive_areas(event.x, event.y)
+        bars = self._sensitive_areas.get_areas(event.x, event.y)
         if bars == []: return
         for bar in self._bars:
             bar.set_property("highlighted", bar in bars)
-        self.queue_draw()
+        self.queue_redraw()
         
     def _cb_button_pressed(self, widget, event):
-        bars = chart.get_sensitive_areas(event.x, event.y)
+        bars = self._sensitive_areas.get_areas(event.x, event.y)
         for bar in bars:
             self.emit("bar-clicked", bar)
             
@@ -676,7 +677,6 @@ class BarChart(chart.Chart):
         @type padding: int in [0, 100].
         """
         self.set_property("bar-padding", padding)
-        self.queue_draw()
         
     def get_bar_padding(self):
         """
@@ -695,7 +695,6 @@ class BarChart(chart.Chart):
         @type value: int, float or None.
         """
         self.set_property("maximum-value", value)
-        self.queue_draw()
         
     def get_maximum_value(self):
         """
@@ -716,7 +715,6 @@ class BarChart(chart.Chart):
         @type mode: one of the mode constants above.
         """
         self.set_property("mode", mode)
-        self.queue_draw()
         
     def get_mode(self):
         """
@@ -734,7 +732,6 @@ class BarChart(chart.Chart):
         @type draw: boolean.
         """
         self.set_property("draw-labels", draw)
-        self.queue_draw()
         
     def get_draw_labels(self):
         """
@@ -761,3 +758,17 @@ class BarChart(chart.Chart):
         """
         return self.get_property("enable-mouseover")
         
+        
+class BarChart(chart.Chart):
+    """
+    This is a widget that shows a simple BarChart. See BarChartModel
+    for its attributes, methods, properties and signals.
+    """
+    
+    __gsignals__ = dict(BAR_CHART_SIGNALS)
+    
+    def __init__(self, model=None):
+        if model == None:
+            model = BarChartModel()
+        chart.Chart.__init__(self, model)
+        self._forward_signals(BAR_CHART_SIGNALS)
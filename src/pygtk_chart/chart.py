@@ -23,6 +23,7 @@
 Module Contents
 ===============
 This is the main module. It contains the base classes for chart widgets.
+ - class ChartModel: base class for the drawing models of all charts.
  - class Chart: base class for all chart widgets.
  - class Background: background of a chart widget.
  - class Title: title of a chart.
@@ -35,12 +36,16 @@ Author: Sven Festersen (sven@sven-festersen.de)
 """
 __docformat__ = "epytext"
 import cairo
+import contextlib
 import gobject
 import gtk
+import gzip
+import math
 import os
 import pango
 import pangocairo
 import pygtk
+import time
 
 from pygtk_chart.chart_object import ChartObject
 from pygtk_chart.basics import *
@@ -49,94 +54,379 @@ from pygtk_chart import label
 COLOR_AUTO = 0
 AREA_CIRCLE = 0
 AREA_RECTANGLE = 1
-CLICK_SENSITIVE_AREAS = []
 
 
-def init_sensitive_areas():
-    global CLICK_SENSITIVE_AREAS
-    CLICK_SENSITIVE_AREAS = []
-    
-def add_sensitive_area(type, coords, data):
-    global CLICK_SENSITIVE_AREAS
-    CLICK_SENSITIVE_AREAS.append((type, coords, data))
+class SensitiveAreas(object):
+    """
+    A spatial index of the click sensitive areas of a chart. Adding an
+    area only stores it. The first lookup after a change sorts the
+    areas into the cells of a uniform grid, so looking up the areas at
+    a position only has to test the areas in one cell. The cell size
+    is derived from the number of areas, the size of their bounding box
+    and their mean size, so that a cell holds only a few areas, no
+    matter if the chart has ten or a million of them.
+    """
     
-def get_sensitive_areas(x, y):
-    res = []
-    global CLICK_SENSITIVE_AREAS
-    for type, coords, data in CLICK_SENSITIVE_AREAS:
+    def __init__(self, cell_size=None):
+        self._fixed_cell_size = cell_size
+        self._areas = []
+        self._bounds = []
+        self._cells = None
+        self._cell_size = None
+        
+    def __len__(self):
+        return len(self._areas)
+        
+    def clear(self):
+        """
+        Remove all areas.
+        """
+        self._areas = []
+        self._bounds = []
+        self._cells = None
+        
+    def add(self, type, coords, data):
+        """
+        Add an area. If type is AREA_CIRCLE, coords has to be a tuple
+        (x, y, radius), if type is AREA_RECTANGLE it has to be a tuple
+        (x, y, width, height).
+        """
         if type == AREA_CIRCLE:
             ax, ay, radius = coords
-            if (ax - x) ** 2 + (ay - y) ** 2 <= radius ** 2:
-                res.append(data)
+            bounds = ax - radius, ay - radius, ax + radius, ay + radius
         elif type == AREA_RECTANGLE:
             ax, ay, width, height = coords
-            if ax <= x <= ax + width and ay <= y <= ay + height:
-                res.append(data)
-    return res
+            bounds = (min(ax, ax + width), min(ay, ay + height),
+                        max(ax, ax + width), max(ay, ay + height))
+        else:
+            raise ValueError, "Unknown area type %s." % type
+        self._areas.append((type, coords, data))
+        self._bounds.append(bounds)
+        self._cells = None
+        
+    def get_cell_size(self):
+        """
+        Returns the size of the grid cells in px.
+        
+        @return: float.
+        """
+        if self._cells == None:
+            self._build()
+        return self._cell_size
+        
+    def _build(self):
+        """
+        Sort the areas into the grid.
+        """
+        bounds = self._bounds
+        n = len(bounds)
+        if self._fixed_cell_size != None:
+            size = float(self._fixed_cell_size)
+        elif n == 0:
+            size = 1.0
+        else:
+            x0 = min(b[0] for b in bounds)
+            y0 = min(b[1] for b in bounds)
+            x1 = max(b[2] for b in bounds)
+            y1 = max(b[3] for b in bounds)
+            #the mean extent of an area: smaller cells would put every
+            #area into many cells
+            extent = sum(b[2] - b[0] + b[3] - b[1] for b in bounds) / (2.0 * n)
+            #the spacing of n areas spread evenly over the bounding box:
+            #larger cells would hold many areas
+            spacing = math.sqrt(max(x1 - x0, 1) * max(y1 - y0, 1) / float(n))
+            size = max(extent, spacing, 1.0)
+        cells = {}
+        floor = math.floor
+        for index, (x0, y0, x1, y1) in enumerate(bounds):
+            i0, i1 = int(floor(x0 / size)), int(floor(x1 / size))
+            j0, j1 = int(floor(y0 / size)), int(floor(y1 / size))
+            for i in xrange(i0, i1 + 1):
+                for j in xrange(j0, j1 + 1):
+                    if (i, j) in cells:
+                        cells[(i, j)].append(index)
+                    else:
+                        cells[(i, j)] = [index]
+        self._cell_size = size
+        self._cells = cells
+                    
+    def get_areas(self, x, y):
+        """
+        Returns a list of the data of all areas that contain the point
+        (x, y), in the order the areas were added.
+        """
+        if self._cells == None:
+            self._build()
+        res = []
+        size = self._cell_size
+        cell = (int(math.floor(x / size)), int(math.floor(y / size)))
+        for index in self._cells.get(cell, []):
+            type, coords, data = self._areas[index]
+            if type == AREA_CIRCLE:
+                ax, ay, radius = coords
+                if (ax - x) ** 2 + (ay - y) ** 2 <= radius ** 2:
+                    res.append(data)
+            elif type == AREA_RECTANGLE:
+                x0, y0, x1, y1 = self._bounds[index]
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    res.append(data)
+        return res
+        
+    def get_enabled(self):
+        """
+        Returns False if added areas are ignored, so callers can skip
+        computing them.
+        
+        @return: boolean.
+        """
+        return True
+        
+        
+class NoSensitiveAreas(SensitiveAreas):
+    """
+    A SensitiveAreas that ignores all areas added. It is used while a
+    chart is rendered for export, where nothing can be clicked.
+    """
+    
+    def add(self, type, coords, data):
+        pass
+        
+    def get_enabled(self):
+        return False
 
 
-class Chart(gtk.DrawingArea):
+class ChartModel(gobject.GObject):
     """
-    This is the base class for all chart widgets.
+    This is the base class for the drawing models of all charts. A
+    model keeps the properties and objects of a chart and draws them.
+    It doesn't need a widget or a display, so it can be drawn on any
+    cairo surface, e.g. in a batch job. The chart widgets (see Chart)
+    are thin wrappers that show a model on the screen.
     
     Properties
     ==========
-    The Chart class inherits properties from gtk.DrawingArea.
+    The ChartModel class inherits properties from gobject.GObject.
     Additional properties:
      - padding (the amount of free white space between the chart's
        content and its border in px, type: int in [0, 100].
+     - max-fps (the maximum number of redraws per second, type: int in
+       [0, 1000]).
        
     Signals
     =======
-    The Chart class inherits signals from gtk.DrawingArea.
+    The ChartModel class inherits signals from gobject.GObject.
+    Additional signals:
+     - redraw-requested: emitted when the chart has to be redrawn,
+       callback signature:
+       def callback(model, area), area is the gtk.gdk.Rectangle to
+       redraw or None for the whole chart.
+     - minimum-size-changed: emitted when the chart needs another
+       minimum size to show its content, callback signature:
+       def callback(model, width, height).
+    
+    Redrawing
+    =========
+    Changes to the chart and its objects don't redraw the chart
+    immediately. All changes made within one frame (1 / max-fps seconds)
+    are collected and result in a single redraw. Use freeze() and
+    thaw() (or the frozen() context manager) to suppress redraws
+    completely during bulk updates.
+    
+    Rendering
+    =========
+    Use render() to draw a chart on any cairo surface at a given size,
+    e.g. to create images in a batch job. Without a widget, draw() uses
+    the size set with set_size() and text is drawn with
+    label.DEFAULT_FONT (see set_style_defaults()).
     """
     
+    __gsignals__ = {"redraw-requested": (gobject.SIGNAL_RUN_LAST,
+                                        gobject.TYPE_NONE,
+                                        (gobject.TYPE_PYOBJECT,)),
+                    "minimum-size-changed": (gobject.SIGNAL_RUN_LAST,
+                                            gobject.TYPE_NONE,
+                                            (gobject.TYPE_INT,
+                                            gobject.TYPE_INT))}
+    
     __gproperties__ = {"padding": (gobject.TYPE_INT, "padding",
                                     "The chart's padding.", 0, 100, 16,
-                                    gobject.PARAM_READWRITE)}
+                                    gobject.PARAM_READWRITE),
+                        "max-fps": (gobject.TYPE_INT, "maximum fps",
+                                    "The maximum number of redraws per second.",
+                                    0, 1000, 60, gobject.PARAM_READWRITE)}
                                     
-    _popup = None
+    _max_fps = 60
+    _redraw_source = None
+    _last_redraw = 0
+    _freeze_count = 0
+    _changed_while_frozen = False
+    _render_size = None
+    _render_resolution = None
+    _minimum_size = None
     
     def __init__(self):
-        gtk.DrawingArea.__init__(self)
+        gobject.GObject.__init__(self)
         #private properties:
         self._padding = 16
+        self._size = (400, 300)
+        self._sensitive_areas = SensitiveAreas()
+        self._style_cache = label.StyleCache()
+        self._selection_color = gtk.gdk.color_parse("#86abd9")
         #objects needed for every chart:
         self.background = Background()
         self.background.connect("appearance-changed", self._cb_appearance_changed)
         self.title = Title()
         self.title.connect("appearance-changed", self._cb_appearance_changed)
         
-        self.add_events(gtk.gdk.BUTTON_PRESS_MASK|gtk.gdk.BUTTON_RELEASE_MASK|gtk.gdk.SCROLL_MASK|gtk.gdk.POINTER_MOTION_MASK)
-        self.connect("expose_event", self._cb_expose_event)
-        self.connect("button_press_event", self._cb_button_pressed)
-        self.connect("button_release_event", self._cb_button_released)
-        self.connect("motion-notify-event", self._cb_motion_notify)
-        
     def do_get_property(self, property):
         if property.name == "padding":
             return self._padding
+        elif property.name == "max-fps":
+            return self._max_fps
         else:
             raise AttributeError, "Property %s does not exist." % property.name
 
     def do_set_property(self, property, value):
         if property.name == "padding":
             self._padding = value
+        elif property.name == "max-fps":
+            self._max_fps = value
         else:
             raise AttributeError, "Property %s does not exist." % property.name
+            
+    def set_property(self, name, value):
+        """
+        Set the property name to value and schedule a redraw of the
+        chart.
+        
+        @type name: string
+        @param name: The name of the property.
+        @param value: The new value of the property.
+        """
+        gobject.GObject.set_property(self, name, value)
+        self.queue_redraw()
         
     def _cb_appearance_changed(self, object):
         """
         This method is called after the appearance of an object changed
-        and forces a redraw.
+        and schedules a redraw.
+        """
+        self.queue_redraw()
+        
+    def set_style_defaults(self, font_desc, font_options=None,
+                            selection_color=None):
         """
-        self.queue_draw()
+        Set the style the chart is drawn with. Chart widgets call this
+        with the font and the selection color of their gtk style and
+        the font options of their screen. The text layouts of the chart
+        are dropped and the chart is redrawn.
         
+        @type font_desc: pango.FontDescription
+        @param font_desc: The default font.
+        @type font_options: cairo.FontOptions
+        @param font_options: The options to render text with (default:
+        cairo's defaults).
+        @type selection_color: gtk.gdk.Color
+        @param selection_color: The color of selections (optional).
+        """
+        self._style_cache.set_font_description(font_desc)
+        self._style_cache.set_font_options(font_options)
+        if selection_color != None:
+            self._selection_color = selection_color
+        self.queue_redraw()
+        
+
+    def _cb_redraw(self):
+        """
+        This method is called by the main loop when a scheduled redraw
+        is due.
+        """
+        self._redraw_source = None
+        self._last_redraw = time.time()
+        self.emit("redraw-requested", None)
+        return False
+        
+    def queue_draw(self):
+        """
+        Redraw the whole chart as soon as possible, regardless of the
+        frame rate.
+        """
+        self.emit("redraw-requested", None)
+        
+    def queue_draw_area(self, x, y, width, height):
+        """
+        Redraw a rectangular part of the chart as soon as possible.
+        """
+        self.emit("redraw-requested",
+                    gtk.gdk.Rectangle(x, y, width, height))
+        
+    def queue_redraw(self):
+        """
+        Schedule a redraw of the chart. Unlike queue_draw(), calling
+        this method many times within one frame results in a single
+        redraw, and no redraw happens while the chart is frozen.
+        """
+        if self._freeze_count > 0:
+            self._changed_while_frozen = True
+            return
+        if self._redraw_source != None:
+            return
+        delay = 0
+        if self._max_fps > 0:
+            delay = self._last_redraw + 1.0 / self._max_fps - time.time()
+        if delay > 0:
+            self._redraw_source = gobject.timeout_add(int(delay * 1000) + 1,
+                                                        self._cb_redraw)
+        else:
+            self._redraw_source = gobject.idle_add(self._cb_redraw)
+            
+    def freeze(self):
+        """
+        Suppress redraws until thaw() is called. Calls to freeze() can
+        be nested, every call has to be matched by a call to thaw().
+        """
+        self._freeze_count += 1
+        
+    def thaw(self):
+        """
+        Undo a call to freeze(). When the last freeze() is undone and
+        the chart changed in the meantime, a redraw is scheduled.
+        """
+        if self._freeze_count == 0:
+            return
+        self._freeze_count -= 1
+        if self._freeze_count == 0 and self._changed_while_frozen:
+            self._changed_while_frozen = False
+            self.queue_redraw()
+            
+    def get_frozen(self):
+        """
+        Returns True if the chart is frozen.
+        
+        @return: boolean.
+        """
+        return self._freeze_count > 0
+        
+    @contextlib.contextmanager
+    def frozen(self):
+        """
+        A context manager that freezes the chart while the with-block
+        is executed:
+        
+            with chart.frozen():
+                graph.set_color(color)
+                graph.add_points(points)
+        """
+        self.freeze()
+        try:
+            yield self
+        finally:
+            self.thaw()
+        
+    #The mouse event handlers are connected to the widget showing the
+    #chart, event coordinates are chart coordinates.
     def _cb_button_pressed(self, widget, event):
-        if event.button == 3:
-            if type(self._popup) == gtk.Menu:
-                self._popup.show_all()
-                self._popup.popup(None, None, None, event.button, event.time)
+        pass
                 
     def _cb_button_released(self, widget, event):
         pass
@@ -144,22 +434,18 @@ class Chart(gtk.DrawingArea):
     def _cb_motion_notify(self, widget, event):
         pass
         
-    def _cb_expose_event(self, widget, event):
+    def _cb_scroll_event(self, widget, event):
+        pass
+        
+    def expose(self, context):
         """
-        This method is called when an instance of Chart receives
-        the gtk expose_event.
+        Draw the chart for an expose of the widget showing it. context
+        is clipped to the exposed area.
         
-        @type widget: gtk.Widget
-        @param widget: The widget that received the event.
-        @type event: gtk.Event
-        @param event: The event.
+        @type context: cairo.Context
+        @param context: The context to draw on.
         """
-        self.context = widget.window.cairo_create()
-        self.context.rectangle(event.area.x, event.area.y, \
-                                event.area.width, event.area.height)
-        self.context.clip()
-        self.draw(self.context)
-        return False
+        self.draw(context)
         
     def draw_basics(self, context, rect):
         """
@@ -183,80 +469,234 @@ class Chart(gtk.DrawingArea):
         
     def draw(self, context):
         """
-        Draw the widget. This method is called automatically. Don't call it
-        yourself. If you want to force a redrawing of the widget, call
+        Draw the chart. This method is called automatically. Don't call it
+        yourself. If you want to force a redrawing of the chart, call
         the queue_draw() method.
         
         @type context: cairo.Context
         @param context: The context to draw on.
         """
-        rect = self.get_allocation()
-        rect = gtk.gdk.Rectangle(0, 0, rect.width, rect.height) #transform rect to context coordinates
+        rect = self._get_draw_rect()
         context.set_line_width(1)
         rect = self.draw_basics(context, rect)
         
-    def set_popup(self, menu):
+    def _get_draw_rect(self):
         """
-        Set the popup menu for the chart.
+        Returns the rectangle to draw the chart in, in context
+        coordinates. This is the size given to render() while rendering,
+        the size of the chart (see set_size()) otherwise.
         
-        @param menu: the menu
-        @type menu: get.Menu
+        @return: gtk.gdk.Rectangle.
         """
-        self._popup = menu
+        if self._render_size != None:
+            width, height = self._render_size
+        else:
+            width, height = self._size
+        return gtk.gdk.Rectangle(0, 0, width, height)
         
-    def export_svg(self, filename, size=None):
+    def set_size(self, width, height):
         """
-        Saves the contents of the widget to svg file. The size of the image
-        will be the size of the widget.
+        Set the size the chart is drawn at by draw() and exported at by
+        default. Chart widgets set it to their allocation.
         
-        @type filename: string
-        @param filename: The path to the file where you want the chart to be saved.
+        @type width: int
+        @param width: The width of the chart in px.
+        @type height: int
+        @param height: The height of the chart in px.
+        """
+        self._size = (width, height)
+        
+    def get_size(self):
+        """
+        Returns the size of the chart (default: 400x300).
+        
+        @return: (width, height).
+        """
+        return self._size
+        
+    def _set_minimum_size(self, width, height):
+        """
+        Ask the widget showing the chart for at least width x height px.
+        This is ignored while the chart is rendered.
+        """
+        if self._render_size != None or \
+                self._minimum_size == (width, height):
+            return
+        self._minimum_size = width, height
+        self.emit("minimum-size-changed", width, height)
+        
+    def render(self, target, width, height, resolution=None):
+        """
+        Draw the chart on target at the given size. Unlike draw(), this
+        doesn't depend on the size of the chart. No widget or display is
+        needed. The state of the chart (its size, the areas that react
+        to the mouse, ...) is not changed and no click sensitive areas
+        are collected.
+        
+        If resolution (the number of output pixels per unit of the
+        target, e.g. dpi / 72 for vector surfaces) is given, data that
+        can't be distinguished at that resolution is left out, e.g. line
+        charts decimate all graphs and draw only one data point per
+        output pixel. Use this to keep vector exports of large data
+        sets small.
+        
+        @type target: cairo.Surface or cairo.Context
+        @param target: The surface or context to draw on.
+        @type width: int
+        @param width: The width of the chart in px.
+        @type height: int
+        @param height: The height of the chart in px.
+        @type resolution: float
+        @param resolution: The output resolution (optional).
+        """
+        if not isinstance(target, cairo.Context):
+            target = cairo.Context(target)
+        if not isinstance(target, pangocairo.CairoContext):
+            target = pangocairo.CairoContext(target)
+        old_state = self._render_size, self._render_resolution, \
+                    self._sensitive_areas
+        self._render_size = width, height
+        self._render_resolution = resolution
+        self._sensitive_areas = NoSensitiveAreas()
+        try:
+            self.draw(target)
+        finally:
+            self._render_size, self._render_resolution, \
+            self._sensitive_areas = old_state
+        
+    def render_to_buffer(self, width, height, buffer=None, stride=None):
+        """
+        Render the chart into a block of memory and return it. The
+        pixels are stored in cairo's FORMAT_ARGB32 (32 bit premultiplied
+        ARGB in native byte order, i.e. BGRA on little endian machines),
+        one row every stride bytes. If buffer is given, the chart is
+        drawn over its current content and buffer itself is returned,
+        nothing is copied. It has to support the writable buffer
+        interface (e.g. bytearray, mmap.mmap or a numpy array) and hold
+        at least stride * height bytes.
+        
+        @type width: int
+        @param width: The width of the chart in px.
+        @type height: int
+        @param height: The height of the chart in px.
+        @param buffer: The memory to draw in (default: a new bytearray).
+        @type stride: int
+        @param stride: The number of bytes per row (default: the
+        minimal stride for width, see
+        cairo.ImageSurface.format_stride_for_width()).
+        @return: buffer.
+        """
+        if stride is None:
+            stride = cairo.ImageSurface.format_stride_for_width(
+                                                cairo.FORMAT_ARGB32, width)
+        if buffer is None:
+            buffer = bytearray(stride * height)
+        surface = cairo.ImageSurface.create_for_data(buffer,
+                                                        cairo.FORMAT_ARGB32,
+                                                        width, height, stride)
+        self.render(surface, width, height)
+        surface.finish()
+        return buffer
+            
+    def _get_export_size(self, size):
+        """
+        Returns the (width, height) to export the chart with: size or,
+        if size is None, the size of the chart.
+        """
+        if size is None:
+            return self._size
+        return size
+        
+    def _export_vector(self, surface_class, filename, size, dpi):
+        """
+        Render the chart on a new surface_class (e.g. cairo.PDFSurface)
+        writing to filename and finish the surface. The chart is
+        simplified for the given output resolution (see render()).
+        """
+        width, height = self._get_export_size(size)
+        surface = surface_class(filename, width, height)
+        self.render(surface, width, height, dpi / 72.0)
+        surface.finish()
+        
+    def export_svg(self, filename, size=None, compress=None, dpi=72):
+        """
+        Saves the chart to svg file. The size of the image
+        will be the size of the chart (see set_size()).
+        
+        @type filename: string or file-like object
+        @param filename: The path to the file where you want the chart to be saved
+        or a writable file-like object.
         @type size: tuple
         @param size: Optional parameter to give the desired height and width of the image.
+        @type compress: boolean
+        @param compress: Set whether to write gzip compressed svg (svgz). By default
+        svgz is written if filename ends with '.svgz'.
+        @type dpi: int
+        @param dpi: The resolution the image will be displayed at. Details of large
+        data sets that are smaller than one pixel at this resolution are left out.
         """
-        if size is None:
-            rect = self.get_allocation()
-            width = rect.width
-            height = rect.height
+        if compress is None:
+            compress = isinstance(filename, basestring) and \
+                        filename.endswith(".svgz")
+        if not compress:
+            self._export_vector(cairo.SVGSurface, filename, size, dpi)
+            return
+        if isinstance(filename, basestring):
+            output = gzip.open(filename, "wb")
         else:
-            width, height = size
-            old_alloc = self.get_allocation
-            self.get_allocation = lambda: gtk.gdk.Rectangle(0, 0, width, height)
-        surface = cairo.SVGSurface(filename, width, height)
-        ctx = cairo.Context(surface)
-        context = pangocairo.CairoContext(ctx)
-        self.draw(context)
-        surface.finish()
-        if size is not None:
-            self.get_allocation = old_alloc
+            output = gzip.GzipFile(fileobj=filename, mode="wb")
+        try:
+            self._export_vector(cairo.SVGSurface, output, size, dpi)
+        finally:
+            output.close()
+            
+    def export_pdf(self, filename, size=None, dpi=72):
+        """
+        Saves the chart to pdf file. The size of the image
+        will be the size of the chart (see set_size()).
+        
+        @type filename: string or file-like object
+        @param filename: The path to the file where you want the chart to be saved
+        or a writable file-like object.
+        @type size: tuple
+        @param size: Optional parameter to give the desired height and width of the image.
+        @type dpi: int
+        @param dpi: The resolution the document will be displayed or printed at,
+        see export_svg().
+        """
+        self._export_vector(cairo.PDFSurface, filename, size, dpi)
+        
+    def export_ps(self, filename, size=None, dpi=72):
+        """
+        Saves the chart to postscript file. The size of the image
+        will be the size of the chart (see set_size()).
+        
+        @type filename: string or file-like object
+        @param filename: The path to the file where you want the chart to be saved
+        or a writable file-like object.
+        @type size: tuple
+        @param size: Optional parameter to give the desired height and width of the image.
+        @type dpi: int
+        @param dpi: The resolution the document will be displayed or printed at,
+        see export_svg().
+        """
+        self._export_vector(cairo.PSSurface, filename, size, dpi)
         
     def export_png(self, filename, size=None):
         """
-        Saves the contents of the widget to png file. The size of the image
-        will be the size of the widget.
+        Saves the chart to png file. The size of the image
+        will be the size of the chart (see set_size()).
         
-        @type filename: string
-        @param filename: The path to the file where you want the chart to be saved.
+        @type filename: string or file-like object
+        @param filename: The path to the file where you want the chart to be saved
+        or a writable file-like object.
         @type size: tuple
         @param size: Optional parameter to give the desired height and width of the image.
         """
-        if size is None:
-            rect = self.get_allocation()
-            width = rect.width
-            height = rect.height
-        else:
-            width, height = size
-            old_alloc = self.get_allocation
-            self.get_allocation = lambda: gtk.gdk.Rectangle(0, 0, width, height)
+        width, height = self._get_export_size(size)
         surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
-        ctx = cairo.Context(surface)
-        context = pangocairo.CairoContext(ctx)
-        self.set_size_request(width, height)
-        self.draw(context)
+        self.render(surface, width, height)
         surface.write_to_png(filename)
-        if size is not None:
-            self.get_allocation = old_alloc
-        
         
     def set_padding(self, padding):
         """
@@ -266,7 +706,6 @@ class Chart(gtk.DrawingArea):
         @type padding: int in [0, 100] (default: 16).
         """
         self.set_property("padding", padding)
-        self.queue_draw()
         
     def get_padding(self):
         """
@@ -275,7 +714,198 @@ class Chart(gtk.DrawingArea):
         @return: int in [0, 100].
         """
         return self.get_property("padding")
+        
+    def set_max_fps(self, fps):
+        """
+        Set the maximum number of redraws per second. Changes that
+        happen faster are collected and drawn together. Set fps to 0 to
+        redraw as soon as the main loop is idle.
+        
+        @param fps: the maximum frame rate
+        @type fps: int in [0, 1000] (default: 60).
+        """
+        self.set_property("max-fps", fps)
+        
+    def get_max_fps(self):
+        """
+        Returns the maximum number of redraws per second.
+        
+        @return: int in [0, 1000].
+        """
+        return self.get_property("max-fps")
+        
+        
+class Chart(gtk.DrawingArea):
+    """
+    This is the base class for all chart widgets. A chart widget shows
+    a drawing model (see ChartModel) and passes the events of the mouse
+    to it. The attributes and methods of the model (e.g. title,
+    set_padding() or export_png()) can be used on the widget, the
+    properties of the model are properties of the widget and the
+    signals of a chart (e.g. 'point-clicked') are emitted by the widget.
+    
+    Properties
+    ==========
+    The Chart class inherits properties from gtk.DrawingArea and has
+    the properties of its model.
     
+    Signals
+    =======
+    The Chart class inherits signals from gtk.DrawingArea.
+    """
+    
+    def __init__(self, model=None):
+        gtk.DrawingArea.__init__(self)
+        if model == None:
+            model = ChartModel()
+        self._model = model
+        self._popup = None
+        model.connect("redraw-requested", self._cb_redraw_requested)
+        model.connect("minimum-size-changed", self._cb_minimum_size_changed)
+        if model._minimum_size != None:
+            self.set_size_request(*model._minimum_size)
+            
+        self.add_events(gtk.gdk.BUTTON_PRESS_MASK|gtk.gdk.BUTTON_RELEASE_MASK|gtk.gdk.SCROLL_MASK|gtk.gdk.POINTER_MOTION_MASK)
+        self.connect("expose_event", self._cb_expose_event)
+        self.connect("button_press_event", self._cb_button_pressed)
+        self.connect("button_release_event", model._cb_button_released)
+        self.connect("motion-notify-event", model._cb_motion_notify)
+        self.connect("scroll-event", model._cb_scroll_event)
+        self.connect("size-allocate", self._cb_size_allocate)
+        self.connect("style-set", self._cb_style_changed)
+        self.connect("screen-changed", self._cb_style_changed)
+        
+    def __getattr__(self, name):
+        #everything the widget doesn't have is looked up on the model
+        if name == "_model":
+            raise AttributeError, name
+        return getattr(self._model, name)
+        
+    def _forward_signals(self, signals):
+        """
+        Emit the signals of the model on the widget, too. signals is a
+        dict like __gsignals__, the widget class has to define the same
+        signals.
+        """
+        for name in signals:
+            self._model.connect(name, self._cb_model_signal, name)
+            
+    def _cb_model_signal(self, model, *args):
+        self.emit(args[-1], *args[:-1])
+        
+    def _has_model_property(self, name):
+        name = name.replace("_", "-")
+        for pspec in gobject.list_properties(self._model):
+            if pspec.name == name:
+                return True
+        return False
+        
+    def set_property(self, name, value):
+        """
+        Set the property name of the model, or of the widget if the
+        model doesn't have that property, to value.
+        
+        @type name: string
+        @param name: The name of the property.
+        @param value: The new value of the property.
+        """
+        if self._has_model_property(name):
+            self._model.set_property(name, value)
+        else:
+            gtk.DrawingArea.set_property(self, name, value)
+            
+    def get_property(self, name):
+        """
+        Returns the value of the property name of the model, or of the
+        widget if the model doesn't have that property.
+        
+        @type name: string
+        @param name: The name of the property.
+        """
+        if self._has_model_property(name):
+            return self._model.get_property(name)
+        return gtk.DrawingArea.get_property(self, name)
+        
+    def get_model(self):
+        """
+        Returns the drawing model shown by the widget.
+        
+        @return: ChartModel.
+        """
+        return self._model
+        
+    def draw(self, context, *args):
+        """
+        Draw the chart on context, see ChartModel.draw().
+        """
+        self._model.draw(context, *args)
+        
+    def queue_draw(self):
+        """
+        Redraw the whole chart, see ChartModel.queue_draw().
+        """
+        self._model.queue_draw()
+        
+    def set_popup(self, menu):
+        """
+        Set the popup menu for the chart.
+        
+        @param menu: the menu
+        @type menu: get.Menu
+        """
+        self._popup = menu
+        
+    def _cb_redraw_requested(self, model, area):
+        if area == None:
+            gtk.DrawingArea.queue_draw(self)
+        else:
+            gtk.DrawingArea.queue_draw_area(self, area.x, area.y,
+                                            area.width, area.height)
+            
+    def _cb_minimum_size_changed(self, model, width, height):
+        self.set_size_request(width, height)
+        
+    def _cb_size_allocate(self, widget, allocation):
+        self._model.set_size(allocation.width, allocation.height)
+        
+    def _cb_style_changed(self, widget, old):
+        """
+        This method is called when the style or the screen of the
+        widget changed. The font and the selection color of the style
+        and the font options of the screen are passed to the model.
+        """
+        style = self.get_style()
+        screen = self.get_screen()
+        font_options = None
+        if screen != None:
+            font_options = screen.get_font_options()
+        self._model.set_style_defaults(style.font_desc, font_options,
+                                        style.bg[gtk.STATE_SELECTED])
+        
+    def _cb_button_pressed(self, widget, event):
+        self._model._cb_button_pressed(widget, event)
+        if event.button == 3:
+            if type(self._popup) == gtk.Menu:
+                self._popup.show_all()
+                self._popup.popup(None, None, None, event.button, event.time)
+                
+    def _cb_expose_event(self, widget, event):
+        """
+        This method is called when an instance of Chart receives
+        the gtk expose_event.
+        
+        @type widget: gtk.Widget
+        @param widget: The widget that received the event.
+        @type event: gtk.Event
+        @param event: The event.
+        """
+        context = widget.window.cairo_create()
+        context.rectangle(event.area.x, event.area.y, event.area.width,
+                            event.area.height)
+        context.clip()
+        self._model.expose(context)
+        return False
+        
         
 class Background(ChartObject):
     """
@@ -381,7 +1011,6 @@ class Background(ChartObject):
         self.set_property("color", color)
         self.set_property("gradient", None)
         self.set_property("image", "")
-        self.emit("appearance_changed")
         
     def get_color(self):
         """
@@ -403,7 +1032,6 @@ class Background(ChartObject):
         self.set_property("color", None)
         self.set_property("gradient", (color_start, color_end))
         self.set_property("image", "")
-        self.emit("appearance_changed")
         
     def get_gradient(self):
         """
@@ -430,7 +1058,6 @@ class Background(ChartObject):
         self.set_property("color", None)
         self.set_property("gradient", None)
         self.set_property("image", filename)
-        self.emit("appearance_changed")
         
     def get_image(self):
         return self.get_property("image")
@@ -547,7 +1174,6 @@ class Area(ChartObject):
         @type value: float.
         """
         self.set_property("value", value)
-        self.emit("appearance_changed")
         
     def get_value(self):
         """
@@ -564,7 +1190,6 @@ class Area(ChartObject):
         @type color: gtk.gdk.Color.
         """
         self.set_property("color", color)
-        self.emit("appearance_changed")
         
     def get_color(self):
         """
@@ -582,7 +1207,6 @@ class Area(ChartObject):
         @type label: string.
         """
         self.set_property("label", label)
-        self.emit("appearance_changed")
         
     def get_label(self):
         """
@@ -599,7 +1223,6 @@ class Area(ChartObject):
         @type highlighted: boolean.
         """
         self.set_property("highlighted", highlighted)
-        self.emit("appearance_changed")
         
     def get_highlighted(self):
         """
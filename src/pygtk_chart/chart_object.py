@@ -24,6 +24,7 @@ This module contains the ChartObject class.
 Author: Sven Festersen (sven@sven-festersen.de)
 """
 import cairo
+import contextlib
 import gobject
 
 class ChartObject(gobject.GObject):
@@ -47,6 +48,11 @@ class ChartObject(gobject.GObject):
     ChartObject inherits signals from gobject.GObject,
     Additional signals:
      - appearance-changed (emitted if the object needs to be redrawn).
+     
+    Use freeze() and thaw() (or the frozen() context manager) to
+    suppress appearance-changed while changing the object many times,
+    e.g. when adding lots of points to a graph. The signal is emitted
+    once on thaw() if there were changes.
     """
     
     __gsignals__ = {"appearance-changed": (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, [])}
@@ -60,6 +66,9 @@ class ChartObject(gobject.GObject):
                                     "use antialiasing",
                                     "Set whether to use antialiasing when drawing the object.",
                                     True, gobject.PARAM_READWRITE)}
+                                    
+    _freeze_count = 0
+    _changed_while_frozen = False
     
     def __init__(self):
         gobject.GObject.__init__(self)
@@ -82,6 +91,26 @@ class ChartObject(gobject.GObject):
         else:
             raise AttributeError, "Property %s does not exist." % property.name
         
+    def set_property(self, name, value):
+        """
+        Set the property name to value and emit the
+        'appearance-changed' signal, so that a chart containing the
+        object redraws it.
+        
+        @type name: string
+        @param name: The name of the property.
+        @param value: The new value of the property.
+        """
+        gobject.GObject.set_property(self, name, value)
+        self.emit("appearance_changed")
+        
+    def emit(self, signal, *args):
+        if self._freeze_count > 0 and signal in ("appearance-changed",
+                                                    "appearance_changed"):
+            self._changed_while_frozen = True
+            return None
+        return gobject.GObject.emit(self, signal, *args)
+        
     def _do_draw(self, context, rect):
         """
         A derived class should override this method. The drawing stuff
@@ -122,7 +151,6 @@ class ChartObject(gobject.GObject):
         ChartObject.
         """
         self.set_property("antialias", antialias)
-        self.emit("appearance_changed")
         
     def get_antialias(self):
         """
@@ -141,7 +169,6 @@ class ChartObject(gobject.GObject):
         @param visible: If False, the PlotObject won't be drawn.
         """
         self.set_property("visible", visible)
-        self.emit("appearance_changed")
         
     def get_visible(self):
         """
@@ -151,5 +178,50 @@ class ChartObject(gobject.GObject):
         """
         return self.get_property("visible")
         
+    def freeze(self):
+        """
+        Suppress the appearance-changed signal until thaw() is called.
+        Calls to freeze() can be nested, every call has to be matched
+        by a call to thaw().
+        """
+        self._freeze_count += 1
+        
+    def thaw(self):
+        """
+        Undo a call to freeze(). When the last freeze() is undone and
+        the object changed in the meantime, appearance-changed is
+        emitted once.
+        """
+        if self._freeze_count == 0:
+            return
+        self._freeze_count -= 1
+        if self._freeze_count == 0 and self._changed_while_frozen:
+            self._changed_while_frozen = False
+            self.emit("appearance_changed")
+            
+    def get_frozen(self):
+        """
+        Returns True if the object is frozen.
+        
+        @return: boolean.
+        """
+        return self._freeze_count > 0
+        
+    @contextlib.contextmanager
+    def frozen(self):
+        """
+        A context manager that freezes the object while the with-block
+        is executed:
+        
+            with graph.frozen():
+                for point in points:
+                    graph.add_point(point)
+        """
+        self.freeze()
+        try:
+            yield self
+        finally:
+            self.thaw()
+        
 
 gobject.type_register(ChartObject)
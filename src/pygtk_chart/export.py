@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+#       
+#       export.py
+#       
+#       Copyright 2010 Sven Festersen, John Dickinson
+#       
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#       
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+Module Contents
+===============
+Functions to render many charts to images, e.g. in a batch job, and
+to write multi-page pdf or postscript documents.
+
+Charts are described by specs: dictionaries that only contain plain
+python values, so they can be pickled and sent to worker processes.
+A spec has these keys:
+ - type: "line", "bar", "multibar" or "pie".
+ - width, height: the size of the image in px (default: 400x300).
+ - properties: a dict of properties of the chart (optional).
+ - objects: a dict that maps the name of an attribute of the chart
+   (e.g. "title", "background", "grid", "xaxis") to a dict of
+   properties of that object (optional).
+ - graphs (line charts): a list of dicts with the keys name, xdata,
+   ydata and optionally xaxis, yaxis and properties.
+ - bars (bar charts): a list of dicts with the keys name, value and
+   optionally title and properties.
+ - groups (multi bar charts): a list of dicts with the keys name and
+   bars (like the bars of a bar chart) and optionally title and
+   properties.
+ - areas (pie charts): a list of dicts like the bars of a bar chart.
+ - filename: the name of the file to write (optional, see
+   render_many()).
+ - dpi: the resolution vector images are simplified for (optional,
+   default: 72, see chart.ChartModel.export_svg()).
+Properties with 'color' in their name can be given as color strings,
+e.g. "#ff0000", instead of gtk.gdk.Colors. Specs are turned into chart
+models (see chart.ChartModel), not widgets, so no display is needed.
+
+Example:
+    
+    spec = {"type": "bar",
+            "objects": {"title": {"text": "Sales"}},
+            "bars": [{"name": "q1", "value": 12, "title": "Q1"},
+                     {"name": "q2", "value": 17, "title": "Q2"}]}
+    for data in render_many([spec] * 1000, workers=4):
+        ...
+
+Author: Sven Festersen, John Dickinson
+"""
+__docformat__ = "epytext"
+
+import cairo
+import collections
+import cPickle
+import gtk
+import itertools
+import multiprocessing
+import os
+import StringIO
+import subprocess
+import sys
+
+from pygtk_chart import bar_chart
+from pygtk_chart import line_chart
+from pygtk_chart import multi_bar_chart
+from pygtk_chart import pie_chart
+
+FORMATS = ["png", "svg", "svgz", "pdf", "ps"]
+
+
+def _convert_value(name, value):
+    if "color" in name and isinstance(value, basestring):
+        return gtk.gdk.color_parse(value)
+    return value
+
+def _set_properties(object, properties):
+    for name, value in properties.iteritems():
+        object.set_property(name, _convert_value(name, value))
+
+def _make_bars(bar_class, specs):
+    bars = []
+    for spec in specs:
+        bar = bar_class(spec["name"], spec["value"], spec.get("title", ""))
+        _set_properties(bar, spec.get("properties", {}))
+        bars.append(bar)
+    return bars
+
+def create_chart(spec):
+    """
+    Create the drawing model of a chart from a spec (see the module
+    documentation). Use e.g. line_chart.LineChart(model) to show it.
+    
+    @type spec: dict
+    @return: a chart.ChartModel subclass instance.
+    """
+    chart_type = spec.get("type", "line")
+    if chart_type == "line":
+        chart = line_chart.LineChartModel()
+        for graph_spec in spec.get("graphs", []):
+            graph = line_chart.Graph(graph_spec["name"], graph_spec["xdata"],
+                                        graph_spec["ydata"])
+            _set_properties(graph, graph_spec.get("properties", {}))
+            chart.add_graph(graph, graph_spec.get("xaxis", 1),
+                            graph_spec.get("yaxis", 1))
+    elif chart_type == "bar":
+        chart = bar_chart.BarChartModel()
+        for bar in _make_bars(bar_chart.Bar, spec.get("bars", [])):
+            chart.add_bar(bar)
+    elif chart_type == "multibar":
+        chart = multi_bar_chart.MultiBarChartModel()
+        for group_spec in spec.get("groups", []):
+            group = multi_bar_chart.BarGroup(group_spec["name"],
+                                                group_spec.get("title", ""))
+            _set_properties(group, group_spec.get("properties", {}))
+            for bar in _make_bars(multi_bar_chart.Bar,
+                                    group_spec.get("bars", [])):
+                group.add_bar(bar)
+            chart.add_group(group)
+    elif chart_type == "pie":
+        chart = pie_chart.PieChartModel()
+        for area in _make_bars(pie_chart.PieArea, spec.get("areas", [])):
+            chart.add_area(area)
+    else:
+        raise ValueError, "Unknown chart type: %s" % chart_type
+    _set_properties(chart, spec.get("properties", {}))
+    for name, properties in spec.get("objects", {}).iteritems():
+        _set_properties(getattr(chart, name), properties)
+    return chart
+
+def render_spec(spec, format="png"):
+    """
+    Render the chart described by spec and return the image data as
+    a string.
+    
+    @type spec: dict
+    @param spec: The chart spec (see the module documentation).
+    @type format: string
+    @param format: One of FORMATS.
+    @return: string.
+    """
+    if format not in FORMATS:
+        raise ValueError, "Unknown format: %s" % format
+    chart = create_chart(spec)
+    width = spec.get("width", 400)
+    height = spec.get("height", 300)
+    output = StringIO.StringIO()
+    dpi = spec.get("dpi", 72)
+    if format == "png":
+        chart.export_png(output, (width, height))
+    elif format == "svgz":
+        chart.export_svg(output, (width, height), True, dpi)
+    else:
+        getattr(chart, "export_%s" % format)(output, (width, height),
+                                                dpi=dpi)
+    return output.getvalue()
+    
+def write_pages(charts, filename, size=(400, 300), format="pdf", dpi=72):
+    """
+    Write a document with one chart per page, e.g. a pdf report.
+    
+    @type charts: an iterable of charts or specs
+    @param charts: The charts to render. Specs (see the module
+    documentation) are created with create_chart().
+    @type filename: string or file-like object
+    @param filename: The file to write to.
+    @type size: tuple
+    @param size: The (width, height) of the pages in pt.
+    @type format: string
+    @param format: "pdf" or "ps".
+    @type dpi: int
+    @param dpi: The resolution the charts are simplified for.
+    """
+    if format == "pdf":
+        surface_class = cairo.PDFSurface
+    elif format == "ps":
+        surface_class = cairo.PSSurface
+    else:
+        raise ValueError, "Unknown format: %s" % format
+    width, height = size
+    surface = surface_class(filename, width, height)
+    context = cairo.Context(surface)
+    for chart in charts:
+        if isinstance(chart, dict):
+            chart = create_chart(chart)
+        context.save()
+        chart.render(context, width, height, dpi / 72.0)
+        context.restore()
+        context.show_page()
+    surface.finish()
+
+def _render_job(job):
+    """
+    Render one spec in a worker process. job is a tuple (index, spec,
+    format, directory).
+    """
+    index, spec, format, directory = job
+    data = render_spec(spec, format)
+    if directory == None:
+        return data
+    filename = spec.get("filename", "chart%05d.%s" % (index, format))
+    filename = os.path.join(directory, filename)
+    f = open(filename, "wb")
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return filename
+
+def _render_chunk(jobs):
+    """
+    Render a list of jobs. Returns a tuple ("ok", results) or, if a job
+    failed, ("error", exception).
+    """
+    try:
+        return "ok", [_render_job(job) for job in jobs]
+    except Exception, e:
+        return "error", e
+
+def _worker_main():
+    """
+    The main loop of a worker process started by render_many(): read
+    pickled lists of jobs from stdin until it is closed and write the
+    pickled results to stdout. Everything else written to stdout goes
+    to stderr.
+    """
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    while True:
+        try:
+            jobs = cPickle.load(sys.stdin)
+        except EOFError:
+            break
+        cPickle.dump(_render_chunk(jobs), output, cPickle.HIGHEST_PROTOCOL)
+        output.flush()
+
+def _start_worker():
+    """
+    Start a worker process running _worker_main() in a new python
+    interpreter.
+    """
+    path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys; sys.path.insert(0, %r); " \
+            "from pygtk_chart import export; export._worker_main()" % path
+    return subprocess.Popen([sys.executable, "-c", code],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            close_fds=True)
+
+def _read_result(worker):
+    try:
+        status, value = cPickle.load(worker.stdout)
+    except EOFError:
+        raise RuntimeError, "A render worker process died."
+    if status == "error":
+        raise value
+    return value
+
+def render_many(specs, workers=None, format="png", directory=None,
+                chunksize=8):
+    """
+    Render many charts in worker processes. This is a generator that
+    yields the results in the order of specs as soon as they are
+    available: the image data as string if directory is None, the name
+    of the written file otherwise. The files are named after the
+    'filename' key of the specs, or 'chart<index>.<format>'.
+    
+    The workers are new python processes, not forks of the calling
+    process, so they share no gtk state or display connection with
+    it. They render chart models (see create_chart()) off-screen,
+    which needs no display. The specs and the results are pickled.
+    
+    @type specs: an iterable of dicts
+    @param specs: The chart specs (see the module documentation).
+    @type workers: int
+    @param workers: The number of worker processes (default: number of
+    cpus). With workers=1 the charts are rendered in this process.
+    @type format: string
+    @param format: One of FORMATS.
+    @type directory: string
+    @param directory: The directory to write the images to.
+    @type chunksize: int
+    @param chunksize: The number of specs sent to a worker at once.
+    """
+    if format not in FORMATS:
+        raise ValueError, "Unknown format: %s" % format
+    jobs = ((index, spec, format, directory)
+            for index, spec in enumerate(specs))
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    if workers == 1:
+        for job in jobs:
+            yield _render_job(job)
+        return
+    chunks = iter(lambda: list(itertools.islice(jobs, chunksize)), [])
+    #every worker renders one chunk at a time, the chunks are handed out
+    #round robin, so the results are read in the order of specs
+    pool = []
+    busy = collections.deque()
+    try:
+        for chunk in itertools.islice(chunks, workers):
+            worker = _start_worker()
+            pool.append(worker)
+            cPickle.dump(chunk, worker.stdin, cPickle.HIGHEST_PROTOCOL)
+            worker.stdin.flush()
+            busy.append(worker)
+        while busy:
+            worker = busy.popleft()
+            results = _read_result(worker)
+            for chunk in itertools.islice(chunks, 1):
+                cPickle.dump(chunk, worker.stdin, cPickle.HIGHEST_PROTOCOL)
+                worker.stdin.flush()
+                busy.append(worker)
+            for result in results:
+                yield result
+    finally:
+        for worker in pool:
+            worker.stdin.close()
+        for worker in pool:
+            if busy and worker.poll() == None:
+                #the results are not needed anymore
+                worker.kill()
+            worker.wait()
+            worker.stdout.close()
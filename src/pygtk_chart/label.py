@@ -24,10 +24,12 @@ Contains the Label class.
 Author: Sven Festersen (sven@sven-festersen.de)
 """
 import cairo
+import collections
 import gobject
 import gtk
 import math
 import pango
+import pangocairo
 import pygtk
 
 from pygtk_chart import basics
@@ -61,27 +63,215 @@ WEIGHT_ULTRABOLD = pango.WEIGHT_ULTRABOLD
 WEIGHT_HEAVY = pango.WEIGHT_HEAVY
 
 
-DRAWING_INITIALIZED = False
-REGISTERED_LABELS = []
+DEFAULT_FONT = "Sans 10"
 
+#(style cache, registered labels) for every chart that is being drawn
+DRAWING_STACK = []
 
-def begin_drawing():
-    global DRAWING_INITIALIZED
-    DRAWING_INITIALIZED = True
+
+class StyleCache(object):
+    """
+    Keeps the style information that a chart needs to draw text: the
+    default font, the font options and a pango context created from
+    the cairo font map, together with the layouts laid out with that
+    context (a LayoutCache). No widget or display is needed, the
+    default font is DEFAULT_FONT. Every chart has its own StyleCache
+    and a chart widget copies the font of its gtk style and the font
+    options of its screen into it, so a style change only drops the
+    layouts of that chart.
+    """
+    
+    def __init__(self):
+        self._font_desc = pango.FontDescription(DEFAULT_FONT)
+        self._font_options = None
+        self._pango_context = None
+        self._layouts = LayoutCache()
+        
+    def invalidate(self):
+        """
+        Forget the pango context and the layouts created with it.
+        """
+        self._pango_context = None
+        self._layouts.clear()
+        
+    def set_font_description(self, font_desc):
+        """
+        Set the default font (a pango.FontDescription).
+        """
+        self._font_desc = font_desc
+        self.invalidate()
+        
+    def get_font_description(self):
+        """
+        Returns the default font (a pango.FontDescription).
+        """
+        return self._font_desc
+        
+    def set_font_options(self, font_options):
+        """
+        Set the cairo.FontOptions to lay out text with, e.g. the font
+        options of a screen. None means cairo's defaults.
+        """
+        self._font_options = font_options
+        self.invalidate()
+        
+    def get_font_options(self):
+        """
+        Returns the font options (a cairo.FontOptions or None).
+        """
+        return self._font_options
+        
+    def get_pango_context(self):
+        """
+        Returns the pango context that layouts are created with.
+        """
+        if self._pango_context == None:
+            font_map = pangocairo.cairo_font_map_get_default()
+            context = font_map.create_context()
+            context.set_font_description(self._font_desc)
+            if self._font_options != None:
+                pangocairo.context_set_font_options(context,
+                                                    self._font_options)
+            self._pango_context = context
+        return self._pango_context
+        
+    def get_layout_cache(self):
+        """
+        Returns the LayoutCache of the layouts created with the pango
+        context.
+        """
+        return self._layouts
+        
+    def get_layout(self, text, markup, size, weight, slant, underline, width,
+                    wrap):
+        """
+        Returns a tuple (layout, text_width, text_height), see
+        LayoutCache.get_layout().
+        """
+        return self._layouts.get_layout(self.get_pango_context(), text,
+                                        markup, size, weight, slant,
+                                        underline, width, wrap)
+        
+    def get_font_family(self):
+        """
+        Returns the family of the default font.
+        """
+        return self._font_desc.get_family()
+        
+        
+class LayoutCache(object):
+    """
+    A least recently used cache of measured pango layouts. Layouts are
+    keyed on everything that influences their shape:
+    (text, markup, size, weight, slant, underline, width, wrap), so
+    labels with the same text and font attributes share one layout and
+    the text is only shaped once.
+    The attributes hits and misses count the lookups.
+    """
+    
+    def __init__(self, max_size=512):
+        self._max_size = max_size
+        self._layouts = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    def __len__(self):
+        return len(self._layouts)
+        
+    def clear(self):
+        """
+        Remove all layouts and reset the counters.
+        """
+        self._layouts.clear()
+        self.hits = 0
+        self.misses = 0
+        
+    def get_max_size(self):
+        return self._max_size
+        
+    def set_max_size(self, max_size):
+        """
+        Set the maximum number of layouts to keep.
+        """
+        self._max_size = max_size
+        while len(self._layouts) > self._max_size:
+            self._layouts.popitem(False)
+            
+    def get_layout(self, pango_context, text, markup, size, weight, slant,
+                    underline, width, wrap):
+        """
+        Returns a tuple (layout, text_width, text_height) for a layout
+        with the given text and attributes, created with pango_context.
+        width is the width of the layout in pango units. All layouts in
+        one cache have to be created with the same pango context. Don't
+        modify the returned layout.
+        """
+        key = (text, markup, size, weight, slant, underline, width, wrap)
+        res = self._layouts.pop(key, None)
+        if res != None:
+            self.hits += 1
+            self._layouts[key] = res
+            return res
+        self.misses += 1
+        
+        layout = pango.Layout(pango_context)
+        if markup:
+            layout.set_markup(text)
+        else:
+            attrs = pango.AttrList()
+            attrs.insert(pango.AttrWeight(weight, 0, len(text)))
+            attrs.insert(pango.AttrStyle(slant, 0, len(text)))
+            attrs.insert(pango.AttrUnderline(underline, 0, len(text)))
+            if size != None:
+                attrs.insert(pango.AttrSize(1000 * size, 0, len(text)))
+            layout.set_text(text)
+            layout.set_attributes(attrs)
+        if wrap:
+            layout.set_wrap(pango.WRAP_WORD_CHAR)
+        layout.set_width(width)
+        text_width, text_height = layout.get_pixel_size()
+        res = layout, text_width, text_height
+        
+        self._layouts[key] = res
+        if len(self._layouts) > self._max_size:
+            self._layouts.popitem(False)
+        return res
+        
+        
+STYLE_CACHE = StyleCache()
+
+
+def begin_drawing(style_cache=None):
+    """
+    Start drawing a chart. Until the matching call to finish_drawing(),
+    labels are laid out with style_cache (default: STYLE_CACHE) and
+    registered (see get_registered_labels()). Calls can be nested, e.g.
+    when a chart is rendered while another one is drawn.
+    """
+    if style_cache == None:
+        style_cache = STYLE_CACHE
+    DRAWING_STACK.append((style_cache, []))
     
 def finish_drawing():
-    global REGISTERED_LABELS
-    global DRAWING_INITIALIZED
-    REGISTERED_LABELS = []
-    DRAWING_INITIALIZED = False
+    if DRAWING_STACK:
+        DRAWING_STACK.pop()
+        
+def get_style_cache():
+    """
+    Returns the StyleCache of the chart that is drawn at the moment or
+    STYLE_CACHE if no chart is drawn.
+    """
+    if DRAWING_STACK:
+        return DRAWING_STACK[-1][0]
+    return STYLE_CACHE
     
 def register_label(label):
-    if DRAWING_INITIALIZED:
-        REGISTERED_LABELS.append(label)
+    if DRAWING_STACK:
+        DRAWING_STACK[-1][1].append(label)
     
 def get_registered_labels():
-    if DRAWING_INITIALIZED:
-        return REGISTERED_LABELS
+    if DRAWING_STACK:
+        return DRAWING_STACK[-1][1]
     return []
     
 def rotate_vector(offset, vector, angle):
@@ -193,9 +383,6 @@ class Label(ChartObject):
         self._real_position = (0, 0)
         self._line_count = 1
         
-        self._context = None
-        self._layout = None
-        
     def do_get_property(self, property):
         if property.name == "visible":
             return self._show
@@ -267,32 +454,14 @@ class Label(ChartObject):
     def _do_draw(self, context, rect):
         self._do_draw_label(context, rect)
         
-    def _do_draw_label(self, context, rect):
+    def _get_layout(self, rect):
+        """
+        Returns a tuple (layout, text_width, text_height) for the label
+        drawn on rect. The layout is taken from the layout cache of the
+        chart that is drawn (see get_style_cache()).
+        """
         angle = 2 * math.pi * self._rotation / 360.0
         
-        if self._context == None:
-            label = gtk.Label()
-            self._context = label.create_pango_context()          
-        pango_context = self._context
-        
-        attrs = pango.AttrList()
-        attrs.insert(pango.AttrWeight(self._weight, 0, len(self._text)))
-        attrs.insert(pango.AttrStyle(self._slant, 0, len(self._text)))
-        attrs.insert(pango.AttrUnderline(self._underline, 0,
-                        len(self._text)))
-        if self._size != None:
-            attrs.insert(pango.AttrSize(1000 * self._size, 0,
-                            len(self._text)))
-        
-        if self._layout == None:
-            self._layout = pango.Layout(pango_context)
-        layout = self._layout
-        if self._markup:
-            layout.set_markup(self._text)
-        else:
-            layout.set_text(self._text)
-            layout.set_attributes(attrs)
-        
         #find out where to draw the layout and calculate the maximum width
         width = rect.width * math.cos(angle) + rect.height * math.sin(angle)
         if self._anchor in [ANCHOR_BOTTOM_LEFT, ANCHOR_TOP_LEFT,
@@ -301,15 +470,17 @@ class Label(ChartObject):
         elif self._anchor in [ANCHOR_BOTTOM_RIGHT, ANCHOR_TOP_RIGHT,
                                 ANCHOR_RIGHT_CENTER]:
             width = self._position[0]
-        
-        text_width, text_height = layout.get_pixel_size()
         width = min(width, self._max_width)
         
-        if self._wrap:
-            layout.set_wrap(pango.WRAP_WORD_CHAR)
-        layout.set_width(int(1000 * width))
+        return get_style_cache().get_layout(self._text, self._markup,
+                                            self._size, self._weight,
+                                            self._slant, self._underline,
+                                            int(1000 * width), self._wrap)
         
-        text_width, text_height = layout.get_pixel_size()
+    def _do_draw_label(self, context, rect):
+        angle = 2 * math.pi * self._rotation / 360.0
+        
+        layout, text_width, text_height = self._get_layout(rect)
         anchor = self._anchor
         x, y = self._position
     
@@ -406,47 +577,7 @@ class Label(ChartObject):
     def get_calculated_rect(self, context, rect):
         angle = 2 * math.pi * self._rotation / 360.0
         
-        if self._context == None:
-            label = gtk.Label()
-            self._context = label.create_pango_context()          
-        pango_context = self._context
-        
-        attrs = pango.AttrList()
-        attrs.insert(pango.AttrWeight(self._weight, 0, len(self._text)))
-        attrs.insert(pango.AttrStyle(self._slant, 0, len(self._text)))
-        attrs.insert(pango.AttrUnderline(self._underline, 0,
-                        len(self._text)))
-        if self._size != None:
-            attrs.insert(pango.AttrSize(1000 * self._size, 0,
-                            len(self._text)))
-        
-        if self._layout == None:
-            self._layout = pango.Layout(pango_context)
-        layout = self._layout
-        if self._markup:
-            layout.set_markup(self._text)
-        else:
-            layout.set_text(self._text)
-            layout.set_attributes(attrs)
-        
-        #find out where to draw the layout and calculate the maximum width
-        width = rect.width * math.cos(angle) + rect.height * math.sin(angle)
-        if self._anchor in [ANCHOR_BOTTOM_LEFT, ANCHOR_TOP_LEFT,
-                            ANCHOR_LEFT_CENTER]:
-            width = rect.width - self._position[0]
-        elif self._anchor in [ANCHOR_BOTTOM_RIGHT, ANCHOR_TOP_RIGHT,
-                                ANCHOR_RIGHT_CENTER]:
-            width = self._position[0]
-        
-        text_width, text_height = layout.get_pixel_size()
-        width = min(width, self._max_width)
-        
-        if self._wrap:
-            layout.set_wrap(pango.WRAP_WORD_CHAR)
-        layout.set_width(int(1000 * width))
-        
-        #======================================================================
-        text_width, text_height = layout.get_pixel_size()
+        layout, text_width, text_height = self._get_layout(rect)
         anchor = self._anchor
         x, y = self._position
     
@@ -539,7 +670,6 @@ class Label(ChartObject):
         @type text: string
         """
         self.set_property("text", text)
-        self.emit("appearance_changed")
         
     def get_text(self):
         """
@@ -557,7 +687,6 @@ class Label(ChartObject):
         @type color: gtk.gdk.Color.
         """
         self.set_property("color", color)
-        self.emit("appearance_changed")
         
     def get_color(self):
         """
@@ -578,7 +707,6 @@ class Label(ChartObject):
         @type pos: pair of (x, y).
         """
         self.set_property("position", pos)
-        self.emit("appearance_changed")
         
     def get_position(self):
         """
@@ -624,7 +752,6 @@ class Label(ChartObject):
         """
         
         self.set_property("anchor", anchor)
-        self.emit("appearance_changed")
         
     def get_anchor(self):
         """
@@ -650,7 +777,6 @@ class Label(ChartObject):
         @type underline: one of the constants above.
         """    
         self.set_property("underline", underline)
-        self.emit("appearance_changed")
         
     def set_use_markup(self, use):
         """
@@ -660,7 +786,6 @@ class Label(ChartObject):
         @type use: boolean.
         """
         self.set_property("use-markup", use)
-        self.emit("appearance_changed")
         
     def get_underline(self):
         """
@@ -687,7 +812,6 @@ class Label(ChartObject):
         @type width: integer.
         """
         self.set_property("max-width", width)
-        self.emit("appearance_changed")
         
     def get_max_width(self):
         """
@@ -705,7 +829,6 @@ class Label(ChartObject):
         @type angle: integer in [0, 360].
         """
         self.set_property("rotation", angle)
-        self.emit("appearance_changed")
         
     def get_rotation(self):
         """
@@ -723,7 +846,6 @@ class Label(ChartObject):
         @type size: integer.
         """
         self.set_property("size", size)
-        self.emit("appearance_changed")
         
     def get_size(self):
         """
@@ -745,7 +867,6 @@ class Label(ChartObject):
         @type slant: one of the constants above.
         """
         self.set_property("slant", slant)
-        self.emit("appearance_changed")
         
     def get_slant(self):
         """
@@ -771,7 +892,6 @@ class Label(ChartObject):
         @type weight: one of the constants above.
         """
         self.set_property("weight", weight)
-        self.emit("appearance_changed")
         
     def get_weight(self):
         """
@@ -790,7 +910,6 @@ class Label(ChartObject):
         @type fixed: boolean.
         """
         self.set_property("fixed", fixed)
-        self.emit("appearance_changed")
         
     def get_fixed(self):
         """
@@ -807,7 +926,6 @@ class Label(ChartObject):
         @type wrap: boolean.
         """
         self.set_property("wrap", wrap)
-        self.emit("appearance_changed")
         
     def get_wrap(self):
         """
@@ -20,7 +20,7 @@
 #       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #       MA 02110-1301, USA.
 """
-Contains the LineChart widget.
+Contains the LineChart widget and its drawing model LineChartModel.
 
 Author: Sven Festersen (sven@sven-festersen.de)
 """
@@ -30,6 +30,10 @@ import gtk
 import gobject
 import os
 import math
+import bisect
+import array
+import collections
+import pangocairo
 
 import pygtk_chart
 from pygtk_chart.basics import *
@@ -43,8 +47,9 @@ from pygtk_chart import COLOR_AUTO
 
 try:
     import numpy
+    HAVE_NUMPY = True
 except:
-    pass
+    HAVE_NUMPY = False
 
 
 RANGE_AUTO = "range_auto"
@@ -53,28 +58,57 @@ KEY_POSITION_TOP_LEFT = 1
 KEY_POSITION_BOTTOM_LEFT = 2
 KEY_POSITION_BOTTOM_RIGHT = 3
 
+DECIMATION_NONE = 0
+DECIMATION_MINMAX = 1
+DECIMATION_LTTB = 2
+
 def safe_concatenation(a, b):
     """
-    Concatenates lists or numpy arrays.
+    Concatenates lists, arrays or numpy arrays. The result is a numpy
+    array if a or b is one, a list otherwise.
+    """
+    if HAVE_NUMPY and (type(a) == numpy.ndarray or type(b) == numpy.ndarray):
+        return numpy.concatenate((numpy.asarray(a), numpy.asarray(b)))
+    return list(a) + list(b)
+    
+def graph_find_extrema(data):
+    """
+    Returns the minimum and maximum x and y values of data as a tuple
+    (xmin, xmax, ymin, ymax) or None if data is empty.
+    """
+    xdata, ydata = data
+    if len(xdata) == 0:
+        return None
+    if HAVE_NUMPY:
+        xdata = numpy.asarray(xdata)
+        ydata = numpy.asarray(ydata)
+        return (float(numpy.nanmin(xdata)), float(numpy.nanmax(xdata)),
+                float(numpy.nanmin(ydata)), float(numpy.nanmax(ydata)))
+    return min(xdata), max(xdata), min(ydata), max(ydata)
+    
+def graph_merge_extrema(a, b):
+    """
+    Merges two tuples returned by graph_find_extrema.
     """
-    if type(a) == list and type(b) == list:
-        return a + b
-    elif type(a) == list and type(b) == numpy.ndarray:
-        return numpy.concatenate((numpy.array(a), b))
-    elif type(a) == numpy.ndarray and type(b) == list:
-        return numpy.concatenate((a, numpy.array(b)))
-    elif type(a) == numpy.ndarray and type(b) == numpy.ndarray:
-        return numpy.concatenate((a, b))
+    if a == None: return b
+    if b == None: return a
+    return min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
     
 def graph_make_ranges(data):
     """
     Calculates the xrange and the yrange from data.
     """
-    xdata, ydata = data
-    if data == []:
+    return graph_ranges_from_extrema(graph_find_extrema(data))
+    
+def graph_ranges_from_extrema(extrema):
+    """
+    Calculates the xrange and the yrange from a tuple returned by
+    graph_find_extrema.
+    """
+    if extrema == None:
         return None, None
-    xrange = [min(xdata), max(xdata)]
-    yrange = [min(ydata), max(ydata)]
+    xrange = [extrema[0], extrema[1]]
+    yrange = [extrema[2], extrema[3]]
         
     if xrange[0] == xrange[1]:
         #if there is only one point, extend the xrange
@@ -88,21 +122,25 @@ def graph_make_ranges(data):
         
     return tuple(xrange), tuple(yrange)
 
-def graph_draw_point(context, x, y, radius, style):
+#maximal number of markers put into one path before it is filled
+POINT_BATCH_SIZE = 2048
+
+def graph_add_point_path(context, x, y, radius, style):
+    """
+    Add the outline of a point marker to the current path of context
+    without filling or stroking it. See graph_finish_points().
+    """
     a = radius / 1.414 #1.414=sqrt(2)
     if style == pygtk_chart.POINT_STYLE_CIRCLE:
+        context.move_to(x + radius, y)
         context.arc(x, y, radius, 0, 2 * math.pi)
-        context.fill()
     elif style == pygtk_chart.POINT_STYLE_SQUARE:
         context.rectangle(x - a, y- a, 2 * a, 2 * a)
-        context.fill()
     elif style == pygtk_chart.POINT_STYLE_CROSS:
         context.move_to(x, y - a)
         context.rel_line_to(0, 2 * a)
-        context.stroke()
         context.move_to(x - a, y)
         context.rel_line_to(2 * a, 0)
-        context.stroke()
     elif style == pygtk_chart.POINT_STYLE_TRIANGLE_UP:
         a = 1.732 * radius #1.732=sqrt(3)
         b = a / (2 * 1.732)
@@ -111,7 +149,6 @@ def graph_draw_point(context, x, y, radius, style):
         context.rel_line_to(-a / 2, -(radius + b))
         context.rel_line_to(-a / 2, radius + b)
         context.close_path()
-        context.fill()
     elif style == pygtk_chart.POINT_STYLE_TRIANGLE_DOWN:
         a = 1.732 * radius #1.732=sqrt(3)
         b = a / (2 * 1.732)
@@ -120,72 +157,463 @@ def graph_draw_point(context, x, y, radius, style):
         context.rel_line_to(-a / 2, radius + b)
         context.rel_line_to(-a / 2, -(radius + b))
         context.close_path()
-        context.fill()
     elif style == pygtk_chart.POINT_STYLE_DIAMOND:
         context.move_to(x, y - a)
         context.rel_line_to(a, a)
         context.rel_line_to(-a, a)
         context.rel_line_to(-a, -a)
         context.rel_line_to(a, -a)
+        context.close_path()
+        
+def graph_finish_points(context, style):
+    """
+    Fill (or stroke, for crosses) the markers added to the current path
+    with graph_add_point_path().
+    """
+    if style == pygtk_chart.POINT_STYLE_CROSS:
+        context.stroke()
+    else:
         context.fill()
+
+def graph_draw_point(context, x, y, radius, style):
+    graph_add_point_path(context, x, y, radius, style)
+    graph_finish_points(context, style)
+    
+def graph_draw_point_batch(context, positions, radius, style):
+    """
+    Draw a marker at every (x, y) in positions. The markers are
+    collected in one path that is filled once (every POINT_BATCH_SIZE
+    points) instead of filling every marker on its own.
+    """
+    n = 0
+    for x, y in positions:
+        graph_add_point_path(context, x, y, radius, style)
+        n += 1
+        if n == POINT_BATCH_SIZE:
+            graph_finish_points(context, style)
+            n = 0
+    if n > 0:
+        graph_finish_points(context, style)
+        
+#least recently used cache of cairo surfaces created from pixbufs used
+#as point style
+PIXBUF_SPRITES = collections.OrderedDict()
+PIXBUF_SPRITES_SIZE = 16
+        
+def graph_get_pixbuf_sprite(pixbuf):
+    """
+    Returns a cairo.ImageSurface with the content of pixbuf. The surface
+    is created once per pixbuf and cached in PIXBUF_SPRITES, so the
+    pixbuf doesn't have to be converted for every point. When the cache
+    is full, the least recently used surface is dropped. Call
+    PIXBUF_SPRITES.clear() if you modify the pixels of a pixbuf that is
+    in use as point style.
+    """
+    sprite = PIXBUF_SPRITES.pop(pixbuf, None)
+    if sprite != None:
+        PIXBUF_SPRITES[pixbuf] = sprite
+        return sprite
+    sprite = cairo.ImageSurface(cairo.FORMAT_ARGB32, pixbuf.get_width(),
+                                pixbuf.get_height())
+    context = gtk.gdk.CairoContext(cairo.Context(sprite))
+    context.set_source_pixbuf(pixbuf, 0, 0)
+    context.paint()
+    while len(PIXBUF_SPRITES) >= PIXBUF_SPRITES_SIZE:
+        PIXBUF_SPRITES.popitem(False)
+    PIXBUF_SPRITES[pixbuf] = sprite
+    return sprite
         
 def graph_draw_point_pixbuf(context, x, y, pixbuf):
+    graph_draw_pixbufs(context, [(x, y)], pixbuf)
+    
+def graph_draw_pixbufs(context, positions, pixbuf):
+    """
+    Stamp the image of pixbuf centered at every (x, y) in positions.
+    The pixbuf is converted to a cairo surface only once (see
+    graph_get_pixbuf_sprite()), but every point is still painted on its
+    own.
+    """
+    sprite = graph_get_pixbuf_sprite(pixbuf)
     w = pixbuf.get_width()
     h = pixbuf.get_height()
-    ax = x - w / 2
-    ay = y - h / 2
-    context.set_source_pixbuf(pixbuf, ax, ay)
-    context.rectangle(ax, ay, w, h)
-    context.fill()
+    for x, y in positions:
+        ax = x - w / 2
+        ay = y - h / 2
+        context.set_source_surface(sprite, ax, ay)
+        context.rectangle(ax, ay, w, h)
+        context.fill()
+    
+def graph_transform_data(rect, data, xrange, yrange, ppu_x, ppu_y, logscale,
+                            xclip=None, cull=True):
+    """
+    Transforms the data of a graph to pixel coordinates using numpy.
+    All points are log-scaled, range checked and transformed at once.
+    Only points with a (transformed) x value in xrange are returned. If
+    xclip is given, points are instead checked against xclip before
+    the logarithm is applied. If cull is False, no points are removed.
+    Points that are not finite after the logarithm (e.g. values <= 0
+    on a logarithmic axis) are removed with the others, if cull is
+    False all their coordinates are set to NaN instead.
+    
+    @return: a tuple (x, y, posx, posy) of numpy arrays.
+    """
+    xdata = numpy.asarray(data[0], dtype=float)
+    ydata = numpy.asarray(data[1], dtype=float)
+    if xclip != None:
+        mask = (xdata >= xclip[0]) & (xdata <= xclip[1])
+        xdata = xdata[mask]
+        ydata = ydata[mask]
+    old_settings = numpy.seterr(all="ignore")
+    try:
+        if logscale[0]: xdata = numpy.log10(xdata)
+        if logscale[1]: ydata = numpy.log10(ydata)
+    finally:
+        numpy.seterr(**old_settings)
+    mask = numpy.isfinite(xdata) & numpy.isfinite(ydata)
+    if xclip != None or cull:
+        if xclip == None:
+            mask &= (xdata >= xrange[0]) & (xdata <= xrange[1])
+        xdata = xdata[mask]
+        ydata = ydata[mask]
+    elif not numpy.all(mask):
+        xdata = numpy.where(mask, xdata, numpy.nan)
+        ydata = numpy.where(mask, ydata, numpy.nan)
+    posx = rect.x + ppu_x * (xdata - xrange[0])
+    posy = rect.y + rect.height - ppu_y * (ydata - yrange[0])
+    return xdata, ydata, posx, posy
+    
+def graph_iter_points(rect, data, xrange, yrange, ppu_x, ppu_y, logscale,
+                        xclip=None, cull=True):
+    """
+    Pure python fallback for graph_transform_data. Yields a
+    (x, y, posx, posy) tuple for every point with x in xrange (or in
+    xclip, see graph_transform_data).
+    """
+    xdata, ydata = data
+    nan = float("nan")
+    for i in range(0, len(xdata)):
+        x, y = xdata[i], ydata[i]
+        if xclip != None and not xclip[0] <= x <= xclip[1]: continue
+        x = graph_transform_value(x, logscale[0])
+        y = graph_transform_value(y, logscale[1])
+        if not (graph_is_finite(x) and graph_is_finite(y)):
+            if xclip == None and not cull:
+                yield nan, nan, nan, nan
+            continue
+        if xclip == None and cull and not xrange[0] <= x <= xrange[1]:
+            continue
+        posx = rect.x + ppu_x * (x - xrange[0])
+        posy = rect.y + rect.height - ppu_y * (y - yrange[0])
+        yield x, y, posx, posy
+        
+def graph_get_positions(rect, data, xrange, yrange, ppu_x, ppu_y, logscale,
+                        xclip=None, cull=True):
+    """
+    Returns the pixel coordinates of the visible points of data as a
+    pair (posx, posy). These are numpy arrays if numpy is available,
+    lists otherwise.
+    """
+    if HAVE_NUMPY:
+        xs, ys, posx, posy = graph_transform_data(rect, data, xrange, yrange,
+                                                    ppu_x, ppu_y, logscale,
+                                                    xclip, cull)
+        return posx, posy
+    posx = []
+    posy = []
+    for x, y, px, py in graph_iter_points(rect, data, xrange, yrange, ppu_x,
+                                            ppu_y, logscale, xclip, cull):
+        posx.append(px)
+        posy.append(py)
+    return posx, posy
+    
+def graph_decimate_minmax(posx, posy, resolution=1.0):
+    """
+    Reduces every run of consecutive points that fall into the same
+    pixel column to its first, minimum, maximum and last point. The
+    resulting polyline covers exactly the same pixels. resolution is
+    the number of output pixels per unit of posx.
+    
+    @return: a pair (posx, posy) of the remaining coordinates.
+    """
+    if HAVE_NUMPY:
+        posx = numpy.asarray(posx)
+        posy = numpy.asarray(posy)
+        columns = numpy.floor(posx * resolution)
+        starts = numpy.concatenate(([0],
+                                    numpy.flatnonzero(numpy.diff(columns)) + 1))
+        ends = numpy.concatenate((starts[1:], [len(posx)])) - 1
+        #sort by run first and y second: the first and the last index of
+        #each run in this order are its minimum and maximum
+        run_ids = numpy.repeat(numpy.arange(len(starts)), ends - starts + 1)
+        order = numpy.lexsort((posy, run_ids))
+        keep = numpy.unique(numpy.concatenate((starts, ends, order[starts],
+                                                order[ends])))
+        return posx[keep], posy[keep]
+        
+    nposx = []
+    nposy = []
+    n = len(posx)
+    start = 0
+    while start < n:
+        column = math.floor(posx[start] * resolution)
+        end = start
+        imin = imax = start
+        while end + 1 < n and \
+                math.floor(posx[end + 1] * resolution) == column:
+            end += 1
+            if posy[end] < posy[imin]: imin = end
+            if posy[end] > posy[imax]: imax = end
+        for i in sorted(set([start, imin, imax, end])):
+            nposx.append(posx[i])
+            nposy.append(posy[i])
+        start = end + 1
+    return nposx, nposy
+    
+def graph_decimate_lttb(posx, posy, threshold):
+    """
+    Reduces a polyline to threshold points using the
+    Largest-Triangle-Three-Buckets algorithm.
+    
+    @return: a pair (posx, posy) of the remaining coordinates.
+    """
+    n = len(posx)
+    if threshold >= n or threshold < 3:
+        return posx, posy
+    every = float(n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+    for i in range(0, threshold - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        ax, ay = posx[a], posy[a]
+        if HAVE_NUMPY:
+            cx = numpy.mean(posx[end:next_end])
+            cy = numpy.mean(posy[end:next_end])
+            bx = posx[start:end]
+            by = posy[start:end]
+            areas = numpy.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+            a = start + int(numpy.argmax(areas))
+        else:
+            count = float(next_end - end)
+            cx = sum(posx[end:next_end]) / count
+            cy = sum(posy[end:next_end]) / count
+            max_area = -1
+            for j in range(start, end):
+                area = abs((ax - cx) * (posy[j] - ay) - \
+                            (ax - posx[j]) * (cy - ay))
+                if area > max_area:
+                    max_area = area
+                    a = j
+        indices.append(a)
+    indices.append(n - 1)
+    if HAVE_NUMPY:
+        return posx[indices], posy[indices]
+    return [posx[i] for i in indices], [posy[i] for i in indices]
+    
+def graph_decimate(posx, posy, width, mode, resolution=1.0):
+    """
+    Reduces the number of points of a polyline in pixel coordinates
+    so that the path size is bounded by width (the width of the
+    drawing area in px) instead of the number of samples.
+    resolution is the number of output pixels per px, e.g. dpi / 72
+    for vector output.
+    mode has to be one of the decimation constants:
+     - line_chart.DECIMATION_NONE
+     - line_chart.DECIMATION_MINMAX
+     - line_chart.DECIMATION_LTTB
     
+    @return: a pair (posx, posy) of the remaining coordinates.
+    """
+    if mode == DECIMATION_NONE or len(posx) <= 2 * width * resolution:
+        return posx, posy
+    if mode == DECIMATION_MINMAX:
+        return graph_decimate_minmax(posx, posy, resolution)
+    elif mode == DECIMATION_LTTB:
+        return graph_decimate_lttb(posx, posy, int(2 * width * resolution))
+    return posx, posy
+    
+def graph_is_x_sorted(xdata):
+    """
+    Returns True if the x values are in ascending order.
+    """
+    if HAVE_NUMPY:
+        return bool(numpy.all(numpy.diff(numpy.asarray(xdata)) >= 0))
+    for i in range(1, len(xdata)):
+        if xdata[i] < xdata[i - 1]:
+            return False
+    return True
+    
+def graph_visible_window(data, xrange, logscale, padding=0):
+    """
+    Returns the indices (start, end) of the part of data that is
+    visible in xrange. See graph_slice_visible.
+    """
+    xdata, ydata = data
+    xmin, xmax = xrange
+    if logscale[0]:
+        xmin, xmax = 10 ** xmin, 10 ** xmax
+    if HAVE_NUMPY and isinstance(xdata, numpy.ndarray):
+        start = int(numpy.searchsorted(xdata, xmin, "left"))
+        end = int(numpy.searchsorted(xdata, xmax, "right"))
+    else:
+        start = bisect.bisect_left(xdata, xmin)
+        end = bisect.bisect_right(xdata, xmax)
+    start = max(0, start - padding)
+    end = min(len(xdata), end + padding)
+    return start, end
+    
+def graph_slice_visible(data, xrange, logscale, padding=0):
+    """
+    Returns the part of data that is visible in xrange. The x values
+    of data have to be sorted, the visible window is found by binary
+    search. padding points on each side of the window are included,
+    e.g. to draw lines up to the border of the chart.
+    """
+    xdata, ydata = data
+    start, end = graph_visible_window(data, xrange, logscale, padding)
+    if start == 0 and end == len(xdata):
+        return data
+    return xdata[start:end], ydata[start:end]
+    
+def graph_merge_points(points, resolution):
+    """
+    Removes all but the first of the (index, posx, posy) tuples in
+    points whose positions fall into the same output pixel. resolution
+    is the number of output pixels per px.
+    """
+    cells = set()
+    merged = []
+    for point in points:
+        cell = (int(math.floor(point[1] * resolution)),
+                int(math.floor(point[2] * resolution)))
+        if cell not in cells:
+            cells.add(cell)
+            merged.append(point)
+    return merged
+
+def graph_merge_positions(posx, posy, resolution):
+    """
+    numpy version of graph_merge_points: returns the indices of the
+    first point in every output pixel, in ascending order.
+    """
+    columns = numpy.floor(posx * resolution)
+    rows = numpy.floor(posy * resolution)
+    order = numpy.lexsort((numpy.arange(len(posx)), rows, columns))
+    first = numpy.ones(len(order), dtype=bool)
+    first[1:] = (numpy.diff(columns[order]) != 0) | \
+                (numpy.diff(rows[order]) != 0)
+    return numpy.sort(order[first])
+
 def graph_draw_points(graph, context, rect, data, xrange, yrange, ppu_x, ppu_y,
-                        point_style, color, point_size, highlighted, logscale):
+                        point_style, color, point_size, logscale, offset=0,
+                        resolution=None, sensitive_areas=None, indices=None):
+    """
+    Draws the points of data that are visible in xrange. The sensitive
+    areas of the points are added to sensitive_areas (a
+    chart.SensitiveAreas) with data (graph, index), where index is the
+    index of the point in the graph. offset is the index of the first
+    point of data, or indices holds the index of every point of data.
+    If resolution (output pixels per px) is given, only one point per
+    output pixel is drawn.
+    """
     context.set_source_rgb(*color_gdk_to_cairo(color))
     if point_style != pygtk_chart.POINT_STYLE_NONE:
-        xdata, ydata = data
-        for i in range(0, len(xdata)):
-            x, y = xdata[i], ydata[i]
-            if logscale[0]: x = math.log10(x)
-            if logscale[1]: y = math.log10(y)
-            if not xrange[0] <= x <= xrange[1]: continue
-            posx = rect.x + ppu_x * (x - xrange[0])
-            posy = rect.y + rect.height - ppu_y * (y - yrange[0])
-            
-            if type(point_style) != gtk.gdk.Pixbuf:
-                chart.add_sensitive_area(chart.AREA_CIRCLE,
-                                            (posx, posy, point_size),
-                                            (graph, (x, y)))
-                graph_draw_point(context, posx, posy, point_size, point_style)
-                if (x, y) in highlighted:
-                    context.set_source_rgba(1, 1, 1, 0.3)
-                    graph_draw_point(context, posx, posy, point_size,
-                                                            point_style)
-                    context.set_source_rgb(*color_gdk_to_cairo(color))
+        if HAVE_NUMPY:
+            xs, ys, posxs, posys = graph_transform_data(rect, data, xrange,
+                                                        yrange, ppu_x, ppu_y,
+                                                        logscale, cull=False)
+            keep = numpy.flatnonzero(numpy.isfinite(xs))
+            keep = keep[(xs[keep] >= xrange[0]) & (xs[keep] <= xrange[1])]
+            if resolution != None:
+                keep = keep[graph_merge_positions(posxs[keep], posys[keep],
+                                                    resolution)]
+            if indices is not None:
+                point_indices = numpy.asarray(indices)[keep]
             else:
-                graph_draw_point_pixbuf(context, posx, posy, point_style)
+                point_indices = keep + offset
+            points = zip(point_indices.tolist(), posxs[keep].tolist(),
+                            posys[keep].tolist())
+        else:
+            if indices is None:
+                indices = range(offset, offset + len(data[0]))
+            points = [(indices[i], posx, posy) for i, (x, y, posx, posy) in
+                        enumerate(graph_iter_points(rect, data, xrange, yrange,
+                                                    ppu_x, ppu_y, logscale,
+                                                    cull=False))
+                        if xrange[0] <= x <= xrange[1]]
+            if resolution != None:
+                points = graph_merge_points(points, resolution)
+        positions = [(posx, posy) for index, posx, posy in points]
+        if type(point_style) != gtk.gdk.Pixbuf:
+            if sensitive_areas != None and sensitive_areas.get_enabled():
+                for index, posx, posy in points:
+                    sensitive_areas.add(chart.AREA_CIRCLE,
+                                        (posx, posy, point_size),
+                                        (graph, index))
+            graph_draw_point_batch(context, positions, point_size,
+                                    point_style)
+        else:
+            graph_draw_pixbufs(context, positions, point_style)
+                
+def graph_make_path(context, posx, posy, connect=False):
+    """
+    Appends a polyline through the points (posx[i], posy[i]) to the
+    current path of context. If connect is True, the polyline is
+    connected to the current point of the path. The polyline is broken
+    at points with NaN coordinates.
+    """
+    if HAVE_NUMPY:
+        positions = zip(numpy.asarray(posx).tolist(),
+                        numpy.asarray(posy).tolist())
+    else:
+        positions = zip(posx, posy)
+    first_point = not connect
+    for px, py in positions:
+        if px != px or py != py:
+            first_point = True
+        elif first_point:
+            context.move_to(px, py)
+            first_point = False
+        else:
+            context.line_to(px, py)
+                
+def graph_split_gaps(posx, posy):
+    """
+    Splits a polyline at the points with NaN coordinates.
+    
+    @return: a list of (posx, posy) pairs without NaN coordinates.
+    """
+    if HAVE_NUMPY:
+        posx = numpy.asarray(posx)
+        posy = numpy.asarray(posy)
+        gaps = numpy.flatnonzero(numpy.isnan(posx) | numpy.isnan(posy))
+        if len(gaps) == 0:
+            return [(posx, posy)]
+        bounds = numpy.concatenate(([-1], gaps, [len(posx)])).tolist()
+    else:
+        bounds = [-1] + [i for i in range(0, len(posx))
+                            if posx[i] != posx[i] or posy[i] != posy[i]]
+        bounds.append(len(posx))
+    return [(posx[a + 1:b], posy[a + 1:b])
+            for a, b in zip(bounds[:-1], bounds[1:]) if b - a > 1]
                 
 def graph_draw_lines(context, rect, data, xrange, yrange, ppu_x, ppu_y,
-                        line_style, line_width, color, logscale):
+                        line_style, line_width, color, logscale,
+                        decimation=DECIMATION_NONE, cull=True,
+                        resolution=1.0):
     context.set_source_rgb(*color_gdk_to_cairo(color))
     context.set_line_width(line_width)
     if line_style != pygtk_chart.LINE_STYLE_NONE:
         set_context_line_style(context, line_style)
-        xdata, ydata = data
-        first_point = True
-        for i in range(0, len(xdata)):
-            x = xdata[i]
-            y = ydata[i]
-            if logscale[0]: x = math.log10(x)
-            if logscale[1]: y = math.log10(y)
-            if not xrange[0] <= x <= xrange[1]: continue
-            posx = rect.x + ppu_x * (x - xrange[0])
-            posy = rect.y + rect.height - ppu_y * (y - yrange[0])
-            
-            if first_point:
-                context.move_to(posx, posy)
-                first_point = False
-            else:
-                context.line_to(posx, posy)
+        posx, posy = graph_get_positions(rect, data, xrange, yrange, ppu_x,
+                                            ppu_y, logscale, None, cull)
+        #points that can't be shown (e.g. values <= 0 on a logarithmic
+        #axis) are gaps in the line
+        for posx, posy in graph_split_gaps(posx, posy):
+            posx, posy = graph_decimate(posx, posy, rect.width, decimation,
+                                        resolution)
+            graph_make_path(context, posx, posy)
         context.stroke()
     context.set_line_width(1)
         
@@ -194,7 +622,8 @@ def graph_new_constant(xmin, xmax, value):
     return g
         
 def graph_draw_fill_to(context, rect, data, xrange, yrange, ppu_x, ppu_y,
-                        fill_to, color, opacity, logscale):
+                        fill_to, color, opacity, logscale,
+                        decimation=DECIMATION_NONE, resolution=1.0):
     fill_graph = None
     xmin, xmax = xrange
     if type(fill_to) == Graph:
@@ -213,43 +642,519 @@ def graph_draw_fill_to(context, rect, data, xrange, yrange, ppu_x, ppu_y,
     if fill_graph != None:
         c = color_gdk_to_cairo(color)
         context.set_source_rgba(c[0], c[1], c[2], opacity)
-        other_data = fill_graph.get_points()[:]
+        other_data = fill_graph._data
         
         oxdata, oydata = other_data
         
         xmin = max(xmin, min(oxdata))
         xmax = min(xmax, max(oxdata))
-        other_data[0].reverse()
-        other_data[1].reverse()
-        first_point = True
         
+        posx, posy = graph_get_positions(rect, data, xrange, yrange, ppu_x,
+                                            ppu_y, logscale, (xmin, xmax))
+        posx, posy = graph_decimate(posx, posy, rect.width, decimation,
+                                    resolution)
+        graph_make_path(context, posx, posy)
+        #the other graph is traversed backwards to close the area
+        posx, posy = graph_get_positions(rect, other_data, xrange, yrange,
+                                            ppu_x, ppu_y, logscale,
+                                            (xmin, xmax))
+        posx, posy = graph_decimate(posx[::-1], posy[::-1], rect.width,
+                                    decimation, resolution)
+        graph_make_path(context, posx, posy, True)
+        context.fill()
+    
+
+def graph_pyramid_reduce(xdata, ydata, chunk):
+    """
+    Splits the points into blocks of chunk consecutive points and
+    replaces every block with its minimum and its maximum point (in
+    their original order).
+    
+    @return: a tuple (xdata, ydata, indices) with two points per block,
+    indices are the positions of the points in the input.
+    """
+    if HAVE_NUMPY:
+        xdata = numpy.asarray(xdata, dtype=float)
+        ydata = numpy.asarray(ydata, dtype=float)
+        n = len(ydata)
+        n_full = n // chunk
+        offsets = numpy.arange(n_full) * chunk
+        blocks = ydata[:n_full * chunk].reshape(n_full, chunk)
+        imin = numpy.argmin(blocks, axis=1) + offsets
+        imax = numpy.argmax(blocks, axis=1) + offsets
+        if n % chunk != 0:
+            tail = ydata[n_full * chunk:]
+            imin = numpy.append(imin, numpy.argmin(tail) + n_full * chunk)
+            imax = numpy.append(imax, numpy.argmax(tail) + n_full * chunk)
+        indices = numpy.column_stack((numpy.minimum(imin, imax),
+                                        numpy.maximum(imin, imax))).ravel()
+        return xdata[indices], ydata[indices], indices
+        
+    nxdata = []
+    nydata = []
+    indices = []
+    for start in range(0, len(ydata), chunk):
+        end = min(start + chunk, len(ydata))
+        imin = imax = start
+        for i in range(start + 1, end):
+            if ydata[i] < ydata[imin]: imin = i
+            if ydata[i] > ydata[imax]: imax = i
+        for i in (min(imin, imax), max(imin, imax)):
+            nxdata.append(xdata[i])
+            nydata.append(ydata[i])
+            indices.append(i)
+    return nxdata, nydata, indices
+    
+
+def graph_transform_value(value, log):
+    """
+    Returns log10(value) if log is True, value otherwise. Returns None
+    for values that can't be shown on a logarithmic axis.
+    """
+    if not log:
+        return value
+    if value <= 0:
+        return None
+    return math.log10(value)
+    
+def graph_is_finite(value):
+    """
+    Returns False if value is None, infinite or NaN.
+    """
+    return value != None and not math.isinf(value) and \
+            not math.isnan(value)
+    
+def graph_nearest_sorted(data, x, y, scale, logscale):
+    """
+    Finds the point of data closest to (x, y) if the x values of data
+    are sorted. x and y have to be transformed already if an axis has
+    logarithmic scale, the distance along an axis is multiplied with
+    the corresponding value of scale. If y is None, only x is
+    considered. Returns a pair (distance, index) or None.
+    """
+    xdata, ydata = data
+    n = len(xdata)
+    if n == 0:
+        return None
+    raw_x = x
+    if logscale[0]:
+        raw_x = 10 ** x
+    if HAVE_NUMPY and type(xdata) == numpy.ndarray:
+        i = int(numpy.searchsorted(xdata, raw_x))
+        width = 8
+        while True:
+            lo, hi = max(0, i - width), min(n, i + width)
+            xs = xdata[lo:hi]
+            old_settings = numpy.seterr(all="ignore")
+            if logscale[0]:
+                xs = numpy.log10(xs)
+            distances = ((xs - x) * scale[0]) ** 2
+            if y != None:
+                ys = ydata[lo:hi]
+                if logscale[1]:
+                    ys = numpy.log10(ys)
+                distances = distances + ((ys - y) * scale[1]) ** 2
+            numpy.seterr(**old_settings)
+            distances[numpy.isnan(distances)] = numpy.inf
+            j = int(numpy.argmin(distances))
+            best = distances[j]
+            if best == numpy.inf:
+                if lo == 0 and hi == n:
+                    return None
+            elif y == None or lo == 0 and hi == n:
+                return math.sqrt(best), lo + j
+            else:
+                #points outside of the window can't be closer if they
+                #are farther away along the x axis
+                left = lo == 0 or ((xs[0] - x) * scale[0]) ** 2 >= best
+                right = hi == n or ((xs[-1] - x) * scale[0]) ** 2 >= best
+                if left and right:
+                    return math.sqrt(best), lo + j
+            width *= 4
+    i = bisect.bisect_left(xdata, raw_x)
+    best = None
+    for indices in (xrange(i, n), xrange(i - 1, -1, -1)):
+        for j in indices:
+            px = graph_transform_value(xdata[j], logscale[0])
+            if px == None: continue
+            dx = ((px - x) * scale[0]) ** 2
+            if best != None and dx >= best[0]:
+                break
+            distance = dx
+            if y != None:
+                py = graph_transform_value(ydata[j], logscale[1])
+                if py == None: continue
+                distance += ((py - y) * scale[1]) ** 2
+            if best == None or distance < best[0] or \
+                    distance == best[0] and j < best[1]:
+                best = (distance, j)
+    if best == None:
+        return None
+    return math.sqrt(best[0]), best[1]
+    
+
+class GraphKDTree(object):
+    """
+    A 2d tree of the points of a graph for nearest point queries on
+    graphs with unsorted x values. The tree is built from the
+    (optionally log-transformed) data, but distances along the axes can
+    be weighted differently for every query.
+    """
+    
+    def __init__(self, data, logscale=(False, False), leaf_size=32):
         xdata, ydata = data
+        if HAVE_NUMPY:
+            old_settings = numpy.seterr(all="ignore")
+            xdata = numpy.asarray(xdata, dtype=numpy.float64)
+            ydata = numpy.asarray(ydata, dtype=numpy.float64)
+            if logscale[0]: xdata = numpy.log10(xdata)
+            if logscale[1]: ydata = numpy.log10(ydata)
+            numpy.seterr(**old_settings)
+            valid = ~(numpy.isnan(xdata) | numpy.isnan(ydata))
+            indices = numpy.nonzero(valid)[0]
+        else:
+            xdata = [graph_transform_value(x, logscale[0]) for x in xdata]
+            ydata = [graph_transform_value(y, logscale[1]) for y in ydata]
+            indices = [i for i in range(len(xdata)) if xdata[i] != None and
+                        ydata[i] != None and xdata[i] == xdata[i] and
+                        ydata[i] == ydata[i]]
+        self._coords = (xdata, ydata)
+        self._leaf_size = leaf_size
+        self._root = self._build(indices, 0)
+        
+    def _build(self, indices, depth):
+        """
+        Returns a leaf (None, indices) or a node
+        (axis, split, left, right).
+        """
+        if len(indices) <= self._leaf_size:
+            return None, indices
+        axis = depth % 2
+        coords = self._coords[axis]
+        if HAVE_NUMPY:
+            indices = indices[numpy.argsort(coords[indices], kind="mergesort")]
+        else:
+            indices = sorted(indices, key=coords.__getitem__)
+        mid = len(indices) // 2
+        return (axis, coords[indices[mid]],
+                self._build(indices[:mid], depth + 1),
+                self._build(indices[mid:], depth + 1))
+                
+    def nearest(self, x, y, scale=(1, 1)):
+        """
+        Returns a pair (distance, index) for the point closest to
+        (x, y) or None if the tree is empty. The coordinates have to be
+        log-transformed if the tree was built with logscale.
+        """
+        best = [float("inf"), None]
+        self._search(self._root, (x, y), scale, best)
+        if best[1] == None:
+            return None
+        return math.sqrt(best[0]), best[1]
+        
+    def _search(self, node, point, scale, best):
+        if node[0] == None:
+            indices = node[1]
+            if len(indices) == 0:
+                return
+            xdata, ydata = self._coords
+            if HAVE_NUMPY:
+                distances = ((xdata[indices] - point[0]) * scale[0]) ** 2 + \
+                            ((ydata[indices] - point[1]) * scale[1]) ** 2
+                j = int(numpy.argmin(distances))
+                candidates = [(distances[j], indices[j])]
+            else:
+                candidates = [(((xdata[i] - point[0]) * scale[0]) ** 2 +
+                                ((ydata[i] - point[1]) * scale[1]) ** 2, i)
+                                for i in indices]
+            for distance, i in candidates:
+                if distance < best[0] or distance == best[0] and i < best[1]:
+                    best[0], best[1] = distance, int(i)
+            return
+        axis, split, left, right = node
+        diff = point[axis] - split
+        if diff < 0:
+            first, second = left, right
+        else:
+            first, second = right, left
+        self._search(first, point, scale, best)
+        if (diff * scale[axis]) ** 2 <= best[0]:
+            self._search(second, point, scale, best)
+
+
+class GraphPyramid(object):
+    """
+    A level-of-detail pyramid of min/max aggregates of a graph's data.
+    Level 0 is the data itself. Every other level holds the minimum and
+    the maximum point of each block of 2 * factor points of the level
+    below, so it has 1/factor of its points. Levels are only built
+    while the level below has more than min_size points. For every
+    point of a level the index of the point in the data is kept.
+    """
+    
+    def __init__(self, data, factor=4, min_size=1024):
+        self._factor = factor
+        self._min_size = min_size
+        self._levels = []
+        self._length = 0
+        self.rebuild(data)
         
-        for i in range(0, len(xdata)):
-            x, y = xdata[i], ydata[i]
-            if not xmin <= x <= xmax: continue
-            if logscale[0]: x = math.log10(x)
-            if logscale[1]: y = math.log10(y)
-            posx = rect.x + ppu_x * (x - xrange[0])
-            posy = rect.y + rect.height - ppu_y * (y - yrange[0])
-            
-            if first_point:
-                context.move_to(posx, posy)
-                first_point = False
+    def __len__(self):
+        return len(self._levels) + 1
+        
+    def rebuild(self, data):
+        """
+        Rebuild all levels from data.
+        """
+        self._levels = []
+        self._length = 0
+        self.extend(data)
+        
+    def extend(self, data):
+        """
+        Update the pyramid after points were appended to data. Only
+        the last block of every level is recalculated.
+        """
+        chunk = 2 * self._factor
+        changed = self._length
+        source = data
+        self._length = len(data[0])
+        level = 0
+        while len(source[0]) > self._min_size:
+            if level == len(self._levels):
+                #new level: reduce the whole level below
+                self._levels.append(([], [], [], 0))
+                changed = 0
+            first_block = changed // chunk
+            start = first_block * chunk
+            xdata, ydata, indices = graph_pyramid_reduce(source[0][start:],
+                                                        source[1][start:],
+                                                        chunk)
+            #indices in the data instead of in the level below
+            if HAVE_NUMPY:
+                indices = indices + start
+                if level > 0:
+                    indices = source_indices[indices]
+            elif level == 0:
+                indices = [start + i for i in indices]
             else:
-                context.line_to(posx, posy)
-        for i in range(0, len(other_data[0])):
-            x, y = oxdata[i], oydata[i]
-            if not xmin <= x <= xmax: continue
-            if logscale[0]: x = math.log10(x)
-            if logscale[1]: y = math.log10(y)
-            posx = rect.x + ppu_x * (x - xrange[0])
-            posy = rect.y + rect.height - ppu_y * (y - yrange[0])
-            context.line_to(posx, posy)
-        context.fill()
-            
+                indices = [source_indices[start + i] for i in indices]
+            self._store(level, 2 * first_block, xdata, ydata, indices)
+            changed = 2 * first_block
+            source = self.get_level(data, level + 1)
+            source_indices = self.get_indices(level + 1)
+            level += 1
+        del self._levels[level:]
+        
+    def _store(self, level, keep, xdata, ydata, indices):
+        """
+        Replace everything after the first keep points of a level with
+        xdata, ydata and indices. With numpy, the level is kept in arrays
+        whose capacity is doubled when necessary, so appending is cheap.
+        """
+        oxdata, oydata, oindices, count = self._levels[level]
+        count = keep + len(xdata)
+        if HAVE_NUMPY:
+            if count > len(oxdata):
+                capacity = max(2 * len(oxdata), count)
+                nxdata = numpy.empty(capacity)
+                nydata = numpy.empty(capacity)
+                nindices = numpy.empty(capacity, dtype=int)
+                nxdata[:keep] = oxdata[:keep]
+                nydata[:keep] = oydata[:keep]
+                nindices[:keep] = oindices[:keep]
+                oxdata, oydata, oindices = nxdata, nydata, nindices
+            oxdata[keep:count] = xdata
+            oydata[keep:count] = ydata
+            oindices[keep:count] = indices
+        else:
+            del oxdata[keep:]
+            del oydata[keep:]
+            del oindices[keep:]
+            oxdata.extend(xdata)
+            oydata.extend(ydata)
+            oindices.extend(indices)
+        self._levels[level] = (oxdata, oydata, oindices, count)
+        
+    def get_level(self, data, level):
+        """
+        Returns the data of the given level. data has to be the data the
+        pyramid was built from (level 0).
+        """
+        if level == 0:
+            return data
+        xdata, ydata, indices, count = self._levels[level - 1]
+        return xdata[:count], ydata[:count]
+        
+    def get_indices(self, level):
+        """
+        Returns the indices in the data of the points of the given
+        level or None for level 0.
+        """
+        if level == 0:
+            return None
+        xdata, ydata, indices, count = self._levels[level - 1]
+        return indices[:count]
+        
+    def choose_level(self, fraction, width):
+        """
+        Returns the coarsest level that still has at least two points
+        per pixel column if the given fraction of the data is shown on
+        width pixels.
+        """
+        level = 0
+        n = self._length * fraction
+        for i in range(0, len(self._levels)):
+            n = n / float(self._factor)
+            if n < 2 * width: break
+            level = i + 1
+        return level
+
+
+class GraphArrayView(object):
+    """
+    A read-only view of the values start to end of an array.array.
+    Slicing an array.array copies it, this view is used instead so that
+    GraphBuffer.get_data() takes constant time without numpy.
+    Indexing, slicing (returns an array.array), iteration and len() are
+    supported.
+    """
     
+    def __init__(self, data, start, end):
+        self._array = data
+        self._start = start
+        self._end = end
+        
+    def __len__(self):
+        return self._end - self._start
+        
+    def __getitem__(self, index):
+        n = self._end - self._start
+        if isinstance(index, slice):
+            start, end, step = index.indices(n)
+            if step == 1:
+                end = max(start, end)
+            return self._array[self._start + start:self._start + end:step]
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError, "GraphArrayView index out of range"
+        return self._array[self._start + index]
+        
+    def __iter__(self):
+        data = self._array
+        for i in xrange(self._start, self._end):
+            yield data[i]
+            
+    def tolist(self):
+        return self._array[self._start:self._end].tolist()
+
+
+class GraphBuffer(object):
+    """
+    Columnar storage for the data of a graph. The x and the y values
+    are stored as 64 bit floats in two separate buffers. With numpy,
+    these are arrays whose capacity is doubled when they are full, so
+    appending points takes amortized constant time and the data can
+    be read through views without copying. Points removed from the
+    front leave free space that is reused before the buffers grow.
+    Without numpy, array.array is used; points removed from the front
+    are skipped by an offset and only deleted once they make up more
+    than half of the buffer.
+    """
     
+    def __init__(self, xdata=None, ydata=None):
+        if xdata is None: xdata = []
+        if ydata is None: ydata = []
+        self.set_data(xdata, ydata)
+        
+    def __len__(self):
+        return self._end - self._start
+        
+    def _reserve(self, n):
+        """
+        Make sure n more values can be appended to the buffers.
+        """
+        capacity = len(self._xdata)
+        if self._end + n <= capacity: return
+        count = self._end - self._start
+        if count + n > capacity / 2:
+            capacity = max(2 * (count + n), 16)
+        xdata = numpy.empty(capacity, dtype=numpy.float64)
+        ydata = numpy.empty(capacity, dtype=numpy.float64)
+        xdata[:count] = self._xdata[self._start:self._end]
+        ydata[:count] = self._ydata[self._start:self._end]
+        self._xdata = xdata
+        self._ydata = ydata
+        self._start = 0
+        self._end = count
+        
+    def set_data(self, xdata, ydata):
+        """
+        Replace the buffer's contents with xdata and ydata.
+        """
+        if HAVE_NUMPY:
+            self._xdata = numpy.array(xdata, dtype=numpy.float64)
+            self._ydata = numpy.array(ydata, dtype=numpy.float64)
+        else:
+            self._xdata = array.array("d", xdata)
+            self._ydata = array.array("d", ydata)
+        self._start = 0
+        self._end = len(self._xdata)
+        
+    def append(self, x, y):
+        """
+        Append a single point.
+        """
+        if HAVE_NUMPY:
+            self._reserve(1)
+            self._xdata[self._end] = x
+            self._ydata[self._end] = y
+        else:
+            self._xdata.append(x)
+            self._ydata.append(y)
+        self._end += 1
+        
+    def extend(self, xdata, ydata):
+        """
+        Append the points given by xdata and ydata. Both may be lists or
+        numpy arrays.
+        """
+        n = len(xdata)
+        if HAVE_NUMPY:
+            self._reserve(n)
+            self._xdata[self._end:self._end + n] = xdata
+            self._ydata[self._end:self._end + n] = ydata
+        else:
+            self._xdata.extend(xdata)
+            self._ydata.extend(ydata)
+        self._end += n
+        
+    def remove_first(self, n):
+        """
+        Remove the first n points.
+        """
+        n = min(n, len(self))
+        self._start += n
+        if not HAVE_NUMPY and self._start > len(self):
+            #compact: amortized constant time per removed point
+            del self._xdata[:self._start]
+            del self._ydata[:self._start]
+            self._end -= self._start
+            self._start = 0
+        
+    def get_data(self):
+        """
+        Returns the stored data as a pair (xdata, ydata). These are
+        views of the buffers, not copies (numpy arrays, or
+        GraphArrayViews without numpy).
+        """
+        if HAVE_NUMPY:
+            return (self._xdata[self._start:self._end],
+                    self._ydata[self._start:self._end])
+        return (GraphArrayView(self._xdata, self._start, self._end),
+                GraphArrayView(self._ydata, self._start, self._end))
+
 
 class Graph(ChartObject):
     
@@ -294,10 +1199,23 @@ class Graph(ChartObject):
                         "highlighted": (gobject.TYPE_PYOBJECT,
                                         "list of points to highlight",
                                         "List of points to highlight.",
-                                        gobject.PARAM_READWRITE)}
+                                        gobject.PARAM_READWRITE),
+                        "decimation": (gobject.TYPE_INT,
+                                        "decimation mode",
+                                        "The decimation mode for drawing \
+                                        lines.",
+                                        0, 2, 1, gobject.PARAM_READWRITE),
+                        "pyramid-factor": (gobject.TYPE_INT,
+                                            "level-of-detail pyramid factor",
+                                            "Reduction factor between the \
+                                            levels of the level-of-detail \
+                                            pyramid (0: no pyramid).",
+                                            0, 16, 0, gobject.PARAM_READWRITE)}
     
     _xrange = None
     _yrange = None
+    _extrema = None
+    _ranges_valid = False
     _line_style = pygtk_chart.LINE_STYLE_SOLID
     _line_width = 1
     _point_style = pygtk_chart.POINT_STYLE_CIRCLE
@@ -305,17 +1223,22 @@ class Graph(ChartObject):
     _color = COLOR_AUTO
     _fill_to = None
     _fill_opacity = 0.3
-    _highlighted = []
+    _decimation = DECIMATION_MINMAX
+    _pyramid_factor = 0
+    _pyramid = None
+    _kdtrees = {}
+    _x_sorted = False
     
-    def __init__(self, name, xdata, ydata):
+    def __init__(self, name, xdata, ydata, x_sorted=None):
         super(Graph, self).__init__()
         self._name = name
-        self._data = (xdata, ydata)
+        self._buffer = GraphBuffer(xdata, ydata)
+        self._highlighted = set()
         
-        self._process_data()
+        self._process_data(x_sorted=x_sorted)
         
     def __len__(self):
-        return len(self._data)
+        return len(self._buffer)
         
     def __getitem__(self, item):
         xdata, ydata = self._data
@@ -334,7 +1257,7 @@ class Graph(ChartObject):
         Concatenate the data of two graph objects.
         """
         xdata, ydata = self._data
-        oxdata, oydata = other.get_points()
+        oxdata, oydata = other._data
         xdata = safe_concatenation(xdata, oxdata)
         ydata = safe_concatenation(ydata, oydata)
         return Graph("%s+%s" % (self._name, other.get_name()), xdata, ydata)
@@ -345,7 +1268,7 @@ class Graph(ChartObject):
         Swapped operands.
         """
         xdata, ydata = self._data
-        oxdata, oydata = other.get_points()
+        oxdata, oydata = other._data
         xdata = safe_concatenation(oxdata, xdata)
         ydata = safe_concatenation(oydata, ydata)
         return Graph("%s+%s" % (other.get_name(), self._name), xdata, ydata)
@@ -355,11 +1278,9 @@ class Graph(ChartObject):
         Replace the graphs data with a concatenation of its data and the data
         of other.
         """
-        xdata, ydata = self._data
-        oxdata, oydata = other.get_points()
-        xdata = safe_concatenation(xdata, oxdata)
-        ydata = safe_concatenation(ydata, oydata)
-        self._data = xdata, ydata
+        oxdata, oydata = other._data
+        self._buffer.extend(oxdata, oydata)
+        self._process_data(len(oxdata))
         return self
         
     def __mul__(self, n):
@@ -379,8 +1300,10 @@ class Graph(ChartObject):
         
     def do_get_property(self, property):
         if property.name == "xrange":
+            self._update_ranges()
             return self._xrange
         elif property.name == "yrange":
+            self._update_ranges()
             return self._yrange
         elif property.name == "line-style":
             return self._line_style
@@ -397,7 +1320,12 @@ class Graph(ChartObject):
         elif property.name == "fill-opacity":
             return self._fill_opacity
         elif property.name == "highlighted":
-            return self._highlighted
+            xdata, ydata = self._data
+            return [(xdata[i], ydata[i]) for i in sorted(self._highlighted)]
+        elif property.name == "decimation":
+            return self._decimation
+        elif property.name == "pyramid-factor":
+            return self._pyramid_factor
         else:
             return super(Graph, self).do_get_property(property)
         
@@ -418,33 +1346,263 @@ class Graph(ChartObject):
         elif property.name == "fill-opacity":
             self._fill_opacity = value
         elif property.name == "highlighted":
-            self._highlighted = value
+            self._highlighted = set()
+            for point in value:
+                self.add_highlighted(point)
+        elif property.name == "decimation":
+            self._decimation = value
+        elif property.name == "pyramid-factor":
+            self._pyramid_factor = value
+            self._update_pyramid()
         else:
             super(Graph, self).do_set_property(property, value)
         
-    def _process_data(self):
+    def _process_data(self, appended=0, x_sorted=None):
+        """
+        Checks whether the x values are sorted and calculates ranges.
+        If points were only added at the end of the data, appended has
+        to be the number of new points. Set x_sorted to True or False to
+        skip the check.
+        """
+        self._data = self._buffer.get_data()
+        self._kdtrees = {}
+        if not appended:
+            #the indices of the old points are meaningless now
+            self._highlighted = set()
+        if x_sorted != None:
+            self._x_sorted = x_sorted
+        elif not appended:
+            self._x_sorted = graph_is_x_sorted(self._data[0])
+        elif self._x_sorted:
+            #only the new points and the last old one have to be checked
+            self._x_sorted = graph_is_x_sorted(
+                                        self._data[0][-(appended + 1):])
+        if appended and self._ranges_valid:
+            new_data = (self._data[0][-appended:], self._data[1][-appended:])
+            self._extrema = graph_merge_extrema(self._extrema,
+                                                graph_find_extrema(new_data))
+            self._xrange, self._yrange = graph_ranges_from_extrema(
+                                                            self._extrema)
+        else:
+            #recalculate when the ranges are needed the next time
+            self._ranges_valid = False
+        self._update_pyramid(appended)
+        
+    def _update_ranges(self):
         """
-        Sorts data points and calculates ranges.
+        Calculates the ranges if the data was changed since the last
+        calculation.
         """
-        self._xrange, self._yrange = graph_make_ranges(self._data)
+        if not self._ranges_valid:
+            self._extrema = graph_find_extrema(self._data)
+            self._xrange, self._yrange = graph_ranges_from_extrema(
+                                                            self._extrema)
+            self._ranges_valid = True
         
-    def _do_draw(self, context, rect, xrange, yrange, color, logscale):
+    def _update_pyramid(self, appended=0):
+        """
+        Builds, updates or removes the level-of-detail pyramid depending
+        on the 'pyramid-factor' property.
+        """
+        if self._pyramid_factor < 2:
+            self._pyramid = None
+        elif self._pyramid == None or \
+                self._pyramid._factor != self._pyramid_factor:
+            self._pyramid = GraphPyramid(self._data, self._pyramid_factor)
+        elif appended:
+            self._pyramid.extend(self._data)
+        else:
+            self._pyramid.rebuild(self._data)
+            
+    def _get_line_level(self, rect, xrange, logscale, resolution=1.0):
+        """
+        Returns the level of the level-of-detail pyramid to draw from
+        (0 if there is no pyramid): the coarsest level that still has two
+        points per output pixel column in the visible range. If the x
+        values are sorted, the points in the visible range are counted,
+        otherwise evenly spaced x values are assumed.
+        """
+        if self._pyramid == None or self.get_xrange() == None:
+            return 0
+        if self._x_sorted:
+            start, end = graph_visible_window(self._data, xrange, logscale)
+            fraction = (end - start) / float(len(self))
+            return self._pyramid.choose_level(fraction,
+                                                rect.width * resolution)
+        xmin, xmax = xrange
+        if logscale[0]:
+            xmin, xmax = 10 ** xmin, 10 ** xmax
+        gxmin, gxmax = self.get_xrange()
+        fraction = (min(xmax, gxmax) - max(xmin, gxmin)) / float(gxmax - gxmin)
+        fraction = min(max(fraction, 0), 1)
+        return self._pyramid.choose_level(fraction, rect.width * resolution)
+        
+    def _do_draw(self, context, rect, xrange, yrange, color, logscale,
+                    resolution=None, sensitive_areas=None):
         #ppu: pixel per unit
         ppu_x = float(rect.width) / abs(xrange[0] - xrange[1])
         ppu_y = float(rect.height) / abs(yrange[0] - yrange[1])
         
-        graph_draw_fill_to(context, rect, self._data, xrange, yrange, ppu_x,
+        #resolution is only given for exports, the output size is then
+        #bounded by the resolution even if decimation is disabled
+        decimation = self._decimation
+        line_resolution = 1.0
+        if resolution != None:
+            line_resolution = resolution
+            if decimation == DECIMATION_NONE:
+                decimation = DECIMATION_MINMAX
+        
+        level = self._get_line_level(rect, xrange, logscale,
+                                        line_resolution)
+        line_data = point_data = self._data
+        indices = None
+        offset = 0
+        if level > 0:
+            #there are many points per pixel column: the points are
+            #drawn from the same level as the lines
+            line_data = point_data = self._pyramid.get_level(self._data,
+                                                                level)
+            indices = self._pyramid.get_indices(level)
+        if self._x_sorted:
+            #only draw the visible part, lines go on to the next point
+            #outside the visible range
+            line_data = graph_slice_visible(line_data, xrange, logscale, 1)
+            offset, end = graph_visible_window(point_data, xrange, logscale)
+            point_data = point_data[0][offset:end], point_data[1][offset:end]
+            if level > 0:
+                indices = indices[offset:end]
+        #with more points than pixel columns only one point per pixel
+        #is drawn
+        point_resolution = resolution
+        if point_resolution == None and len(point_data[0]) > rect.width:
+            point_resolution = 1.0
+        graph_draw_fill_to(context, rect, line_data, xrange, yrange, ppu_x,
                             ppu_y, self._fill_to, color, self._fill_opacity,
-                            logscale)
-        graph_draw_lines(context, rect, self._data, xrange, yrange, ppu_x,
+                            logscale, decimation, line_resolution)
+        graph_draw_lines(context, rect, line_data, xrange, yrange, ppu_x,
                             ppu_y, self._line_style, self._line_width, color,
-                            logscale)                
-        graph_draw_points(self, context, rect, self._data, xrange, yrange,
+                            logscale, decimation, not self._x_sorted,
+                            line_resolution)
+        graph_draw_points(self, context, rect, point_data, xrange, yrange,
                             ppu_x, ppu_y, self._point_style, color,
-                            self._point_size, self._highlighted, logscale)    
+                            self._point_size, logscale, offset,
+                            point_resolution, sensitive_areas, indices)
+                            
+    def draw_highlighted(self, context, rect, xrange, yrange, logscale):
+        """
+        Draw the highlight of the highlighted points. This is done in a
+        separate pass on top of the graphs, so that changing the
+        highlighted points does not require redrawing the graph.
+        
+        @type context: cairo.Context
+        @param context: The context to draw on.
+        @type rect: gtk.gdk.Rectangle
+        @param rect: A rectangle representing the charts area.
+        """
+        point_style = self._point_style
+        if not self._show or not self._highlighted: return
+        if point_style == pygtk_chart.POINT_STYLE_NONE: return
+        if type(point_style) == gtk.gdk.Pixbuf: return
+        ppu_x = float(rect.width) / abs(xrange[0] - xrange[1])
+        ppu_y = float(rect.height) / abs(yrange[0] - yrange[1])
+        xdata, ydata = self._data
+        indices = sorted(self._highlighted)
+        data = [xdata[i] for i in indices], [ydata[i] for i in indices]
+        if not self._antialias:
+            context.set_antialias(cairo.ANTIALIAS_NONE)
+        context.set_source_rgba(1, 1, 1, 0.3)
+        context.set_line_width(self._line_width)
+        positions = [(posx, posy) for x, y, posx, posy in
+                        graph_iter_points(rect, data, xrange, yrange, ppu_x,
+                                            ppu_y, logscale)]
+        graph_draw_point_batch(context, positions, self._point_size,
+                                point_style)
+        context.set_antialias(cairo.ANTIALIAS_DEFAULT)
+        
+    def _find_nearest(self, x, y=None, max_distance=None, scale=(1, 1),
+                        logscale=(False, False)):
+        """
+        Returns a pair (distance, index) for the point closest to
+        (x, y) or None. See nearest_point().
+        """
+        x = graph_transform_value(x, logscale[0])
+        if y != None:
+            y = graph_transform_value(y, logscale[1])
+        if x == None or len(self) == 0:
+            return None
+        if self._x_sorted:
+            res = graph_nearest_sorted(self._data, x, y, scale, logscale)
+        elif y == None:
+            #compare x values only, the tree does not help here
+            res = None
+            for i, px in enumerate(self._data[0]):
+                px = graph_transform_value(px, logscale[0])
+                if px == None or px != px: continue
+                distance = abs(px - x) * scale[0]
+                if res == None or distance < res[0]:
+                    res = (distance, i)
+        else:
+            if logscale not in self._kdtrees:
+                self._kdtrees[logscale] = GraphKDTree(self._data, logscale)
+            res = self._kdtrees[logscale].nearest(x, y, scale)
+        if res == None or max_distance != None and res[0] > max_distance:
+            return None
+        return res
+        
+    def nearest_index(self, x, y=None, max_distance=None, scale=(1, 1),
+                        logscale=(False, False)):
+        """
+        Returns the index of the data point closest to (x, y) or None if
+        there is no point within max_distance. See nearest_point().
+        
+        @return: int or None
+        """
+        res = self._find_nearest(x, y, max_distance, scale, logscale)
+        if res == None:
+            return None
+        return res[1]
+        
+    def nearest_point(self, x, y=None, max_distance=None, scale=(1, 1),
+                        logscale=(False, False)):
+        """
+        Returns the data point [(x, y) pair] closest to (x, y) or None if
+        there is no point within max_distance. If y is None, only the x
+        values are compared.
+        Distances are measured in data units. Use scale to weight the
+        axes, e.g. pass the pixels per unit of both axes to measure the
+        distance in pixels, and logscale if the axes have logarithmic
+        scale.
+        On graphs with sorted x values the point is found by bisection,
+        on other graphs a 2d tree is built on first use.
+        
+        @type x: float
+        @type y: float or None
+        @type max_distance: float or None
+        @param max_distance: the maximum distance (in scaled units)
+        @type scale: a pair of float
+        @type logscale: a pair of boolean
+        @return: (x, y) pair or None
+        """
+        index = self.nearest_index(x, y, max_distance, scale, logscale)
+        if index == None:
+            return None
+        return self._data[0][index], self._data[1][index]
         
     def get_points(self):
-        return self._data
+        """
+        Returns the graph's data as a pair (xdata, ydata). With numpy,
+        these are read-only views of the graph's data, without numpy
+        they are copies.
+        
+        @return: pair of numpy arrays (or array.array without numpy)
+        """
+        if HAVE_NUMPY:
+            xdata = self._data[0].view()
+            ydata = self._data[1].view()
+            xdata.setflags(write=False)
+            ydata.setflags(write=False)
+            return xdata, ydata
+        return array.array("d", self._data[0]), array.array("d", self._data[1])
         
     def get_name(self):
         return self._name
@@ -454,29 +1612,40 @@ class Graph(ChartObject):
         Add a single data point [(x, y) pair] to the graph.
         """
         x, y = point
-        self._data[0].append(x)
-        self._data[1].append(y)
-        self._process_data()
+        self._buffer.append(x, y)
+        self._process_data(1)
         self.emit("appearance_changed")
         
     def add_points(self, points):
         """
-        Add a list of data points [(x, y) pairs] to the graph.
+        Add data points to the graph. points has to be a pair
+        (xdata, ydata) of lists or numpy arrays.
         """
-        self._data[0] += points[0]
-        self._data[1] += points[1]
-        self._process_data()
+        self._buffer.extend(points[0], points[1])
+        self._process_data(len(points[0]))
         self.emit("appearance_changed")
         
-    def set_points(self, points):
+    def set_points(self, points, x_sorted=None):
         """
         Replace the data points of the graph with a new list of points
         [(x, y) pairs].
+        If you know whether the x values are sorted, set x_sorted to
+        True or False to skip the check (see L{get_x_sorted}).
         """
-        self._data = points
-        self._process_data()
+        self._buffer.set_data(points[0], points[1])
+        self._process_data(x_sorted=x_sorted)
         self.emit("appearance_changed")
         
+    def get_x_sorted(self):
+        """
+        Returns True if the x values of the graph's data are sorted in
+        ascending order. For sorted graphs, only the visible part of the
+        data is processed when drawing.
+        
+        @return: boolean
+        """
+        return self._x_sorted
+        
     def get_ranges(self):
         """
         Returns the xrange and the yrange of the graph.
@@ -487,6 +1656,8 @@ class Graph(ChartObject):
         """
         Returns the xrange of this graph. The xrange is a pair
         holding the minimum and the maximum x values (xmin, xmax).
+        The ranges are cached: adding points updates them in constant
+        time, after set_points() they are recalculated once when needed.
         
         @return: pair of float
         """
@@ -531,7 +1702,6 @@ class Graph(ChartObject):
         @type style: a line style constant (see above)
         """
         self.set_property("line-style", style)
-        self.emit("appearance_changed")
     
     def get_line_width(self):
         """
@@ -549,7 +1719,6 @@ class Graph(ChartObject):
         @type width: int
         """
         self.set_property("line-width", width)
-        self.emit("appearance_changed")
         
     def get_point_style(self):
         """
@@ -718,116 +1887,547 @@ class Graph(ChartObject):
         
     def add_highlighted(self, point):
         """
-        Add a point to the highlighted list.
+        Add a point to the highlighted list. The point is looked up by
+        its coordinates, which costs a binary search on graphs with
+        sorted x values and a linear search on other graphs. If you know
+        the index of the point, use the faster add_highlighted_index().
+        
+        @type point: a pair of float
+        """
+        index = self._find_index(point[0], point[1])
+        if index != None:
+            self._highlighted.add(index)
+            
+    def _find_index(self, x, y):
+        """
+        Returns the index of the first data point (x, y) or None if
+        there is no such point.
+        """
+        xdata, ydata = self._data
+        if self._x_sorted:
+            start, end = graph_visible_window(self._data, (x, x),
+                                                (False, False))
+            candidates = xrange(start, end)
+        elif HAVE_NUMPY:
+            candidates = numpy.nonzero(xdata == x)[0].tolist()
+        else:
+            candidates = [i for i, value in enumerate(xdata) if value == x]
+        for i in candidates:
+            if ydata[i] == y:
+                return i
+        return None
+            
+    def get_highlighted_indices(self):
+        """
+        Returns the set of indices of the highlighted datapoints. Don't
+        modify the set.
+        
+        @return: set of int
+        """
+        return self._highlighted
+        
+    def set_highlighted_indices(self, indices):
+        """
+        Set the indices of the datapoints to be highlighted.
+        
+        @type indices: an iterable of int
+        """
+        self._highlighted = set(indices)
+        
+    def add_highlighted_index(self, index):
+        """
+        Add the datapoint with the given index to the highlighted
+        points. This is the fast way to highlight a point, it needs no
+        lookup of the point (see add_highlighted()).
+        
+        @type index: int
+        """
+        self._highlighted.add(index)
+        
+    def get_point(self, index):
+        """
+        Returns the datapoint with the given index as a (x, y) pair.
+        
+        @return: (x, y) pair
+        """
+        return self._data[0][index], self._data[1][index]
+        
+    def get_decimation(self):
+        """
+        Returns the decimation mode used for drawing lines.
+        
+        (getter method for property 'decimation', see setter method for
+        details)
+        
+        @return: a decimation constant
+        """
+        return self.get_property("decimation")
+        
+    def set_decimation(self, mode):
+        """
+        Set how the graph's lines are decimated before drawing. If the
+        graph has more points than the chart has pixel columns, there
+        is no need to draw a line segment for every point. mode has to
+        be one of these decimation constants:
+         - line_chart.DECIMATION_NONE = 0 (draw every point)
+         - line_chart.DECIMATION_MINMAX = 1 (keep first, minimum,
+           maximum and last point of every pixel column)
+         - line_chart.DECIMATION_LTTB = 2 (largest triangle three
+           buckets downsampling)
+        
+        This is the setter method for the property 'decimation'.
+        Property type: gobject.TYPE_INT
+        Property minimum value: 0
+        Property maximum value: 2
+        Property default value: 1 (line_chart.DECIMATION_MINMAX)
+        
+        @type mode: a decimation constant (see above)
+        """
+        self.set_property("decimation", mode)
+        
+    def get_pyramid_factor(self):
+        """
+        Returns the reduction factor between the levels of the graph's
+        level-of-detail pyramid or 0 if there is no pyramid.
+        
+        @return: int
+        """
+        return self.get_property("pyramid-factor")
+        
+    def set_pyramid_factor(self, factor):
+        """
+        Set whether the graph should keep a level-of-detail pyramid of
+        min/max aggregates of its data. Every level of the pyramid has
+        1/factor of the points of the level below. When drawing, the
+        coarsest level that still matches the visible range and the
+        width of the chart is used, so zooming and panning on very
+        large graphs stay fast. Use factor 2 or 4; factor 0 removes the
+        pyramid.
+        If there are more points than pixel columns in the visible
+        range, the data points are drawn from the same level as the
+        lines.
+        
+        This is the setter method for the property 'pyramid-factor'.
+        Property type: gobject.TYPE_INT
+        Property minimum value: 0
+        Property maximum value: 16
+        Property default value: 0
+        
+        @type factor: int
         """
-        self._highlighted.append(point)
+        self.set_property("pyramid-factor", factor)
         
+
+class SlidingExtrema(object):
+    """
+    Keeps track of the minimum and the maximum of a sequence of values
+    from which values are appended at the end and removed from the
+    front. Uses monotonic queues, so both operations take amortized
+    constant time.
+    """
+    
+    def __init__(self):
+        self._min_queue = collections.deque()
+        self._max_queue = collections.deque()
+        self._first = 0
+        self._next = 0
+        
+    def push(self, values):
+        """
+        Append values at the end.
+        """
+        min_queue = self._min_queue
+        max_queue = self._max_queue
+        for value in values:
+            while min_queue and min_queue[-1][1] >= value:
+                min_queue.pop()
+            min_queue.append((self._next, value))
+            while max_queue and max_queue[-1][1] <= value:
+                max_queue.pop()
+            max_queue.append((self._next, value))
+            self._next += 1
+            
+    def pop(self, n):
+        """
+        Remove n values from the front.
+        """
+        self._first += n
+        while self._min_queue and self._min_queue[0][0] < self._first:
+            self._min_queue.popleft()
+        while self._max_queue and self._max_queue[0][0] < self._first:
+            self._max_queue.popleft()
+            
+    def get(self):
+        """
+        Returns a pair (minimum, maximum) or None if there are no
+        values.
+        """
+        if not self._min_queue:
+            return None
+        return self._min_queue[0][1], self._max_queue[0][1]
         
 
+class StreamGraph(Graph):
+    """
+    A graph for real-time data. Old points are removed automatically
+    when new points are added, so memory usage stays bounded: the graph
+    keeps at most max-points points and, if window is set, only the
+    points whose x value is not more than window smaller than the x
+    value of the newest point. With a window, the xrange of the graph
+    is always (newest x - window, newest x), so the x axis scrolls with
+    the data.
+    Points have to be added in ascending x order for the window to
+    work. StreamGraphs do not use a level-of-detail pyramid.
+    
+    Properties
+    ==========
+    StreamGraph inherits properties from Graph.
+    Additional properties:
+     - max-points (the maximum number of points, type: int)
+     - window (the x window to keep, type: float or None).
+    """
+    
+    __gproperties__ = {"max-points": (gobject.TYPE_INT,
+                                        "maximum number of points",
+                                        "The maximum number of points to \
+                                        keep.",
+                                        1, 2147483647, 10000,
+                                        gobject.PARAM_READWRITE),
+                        "window": (gobject.TYPE_PYOBJECT,
+                                    "x window",
+                                    "The range of x values to keep.",
+                                    gobject.PARAM_READWRITE)}
+    
+    _max_points = 10000
+    _window = None
+    
+    def __init__(self, name, max_points=10000, window=None):
+        super(StreamGraph, self).__init__(name, [], [], True)
+        self._max_points = max_points
+        self._window = window
+        self._xextrema = SlidingExtrema()
+        self._yextrema = SlidingExtrema()
+        
+    def do_get_property(self, property):
+        if property.name == "max-points":
+            return self._max_points
+        elif property.name == "window":
+            return self._window
+        else:
+            return super(StreamGraph, self).do_get_property(property)
+            
+    def do_set_property(self, property, value):
+        if property.name == "max-points":
+            self._max_points = value
+            self._evict()
+        elif property.name == "window":
+            self._window = value
+            self._evict()
+        else:
+            super(StreamGraph, self).do_set_property(property, value)
+            
+    def _update_pyramid(self, appended=0):
+        self._pyramid = None
+        
+    def _evict(self):
+        """
+        Remove the points that do not fit into the graph anymore and
+        update the ranges.
+        """
+        n = len(self._buffer)
+        remove = max(0, n - self._max_points)
+        if self._window != None and self._x_sorted and n > 0:
+            xdata = self._data[0]
+            limit = xdata[-1] - self._window
+            if HAVE_NUMPY:
+                remove = max(remove, int(numpy.searchsorted(xdata, limit)))
+            else:
+                remove = max(remove, bisect.bisect_left(xdata, limit))
+        if remove > 0:
+            self._buffer.remove_first(remove)
+            self._xextrema.pop(remove)
+            self._yextrema.pop(remove)
+            self._data = self._buffer.get_data()
+            self._kdtrees = {}
+            self._highlighted = set([i - remove for i in self._highlighted
+                                        if i >= remove])
+        xextrema = self._xextrema.get()
+        yextrema = self._yextrema.get()
+        if xextrema == None:
+            self._extrema = None
+        else:
+            self._extrema = xextrema + yextrema
+        self._xrange, self._yrange = graph_ranges_from_extrema(self._extrema)
+        if self._window != None and self._extrema != None:
+            self._xrange = (self._extrema[1] - self._window, self._extrema[1])
+        self._ranges_valid = True
+        
+    def add_point(self, point):
+        """
+        Add a single data point [(x, y) pair] to the graph. Old points
+        are removed if necessary.
+        """
+        x, y = point
+        self._buffer.append(x, y)
+        self._xextrema.push((x, ))
+        self._yextrema.push((y, ))
+        self._process_data(1)
+        self._evict()
+        self.emit("appearance_changed")
+        
+    def add_points(self, points):
+        """
+        Add data points to the graph. points has to be a pair
+        (xdata, ydata) of lists or numpy arrays. Old points are removed
+        if necessary.
+        """
+        xdata, ydata = points
+        self._buffer.extend(xdata, ydata)
+        self._xextrema.push(xdata)
+        self._yextrema.push(ydata)
+        self._process_data(len(xdata))
+        self._evict()
+        self.emit("appearance_changed")
+        
+    def set_points(self, points, x_sorted=None):
+        """
+        Replace the data points of the graph. Only the newest points
+        that fit into the graph are kept.
+        """
+        xdata, ydata = points
+        self._buffer.set_data(xdata, ydata)
+        self._xextrema = SlidingExtrema()
+        self._yextrema = SlidingExtrema()
+        self._xextrema.push(xdata)
+        self._yextrema.push(ydata)
+        self._process_data(x_sorted=x_sorted)
+        self._evict()
+        self.emit("appearance_changed")
+        
+    def get_max_points(self):
+        """
+        Returns the maximum number of points the graph keeps.
+        
+        @return: int
+        """
+        return self.get_property("max-points")
+        
+    def set_max_points(self, max_points):
+        """
+        Set the maximum number of points to keep. If there are more
+        points, the oldest ones are removed.
+        
+        This is the setter method for the property 'max-points'.
+        Property type: gobject.TYPE_INT
+        Property default value: 10000
+        
+        @type max_points: int
+        """
+        self.set_property("max-points", max_points)
+        
+    def get_window(self):
+        """
+        Returns the range of x values the graph keeps or None.
+        
+        @return: float or None
+        """
+        return self.get_property("window")
+        
+    def set_window(self, window):
+        """
+        Set the range of x values to keep, e.g. the number of seconds
+        if x is a time stamp. Points with an x value smaller than
+        (newest x - window) are removed. Set window to None to only
+        limit the number of points.
+        
+        This is the setter method for the property 'window'.
+        Property type: gobject.TYPE_PYOBJECT
+        Property default value: None
+        
+        @type window: float or None
+        """
+        self.set_property("window", window)
+        
+        
+
+def chart_finish_range(calc_range, manual_range, extend, logscale):
+    """
+    Turns the range calc_range found in the graphs (None if there is no
+    graph) into the range of an axis: manual_range is used if it is not
+    RANGE_AUTO, otherwise calc_range is extended by the fractions in
+    extend. The result is transformed if the axis has logarithmic
+    scale.
+    """
+    if manual_range != RANGE_AUTO:
+        #the range was set manually => no calculation neccessary
+        calc_range = manual_range
+    elif calc_range == None:
+        calc_range = (0, 1)
+    else:
+        delta = abs(calc_range[1] - calc_range[0])
+        calc_range = (calc_range[0] - delta * extend[0],
+                        calc_range[1] + delta * extend[1])
+    if logscale:
+        if calc_range[0] <= 0: calc_range = (0.001, calc_range[1])
+        calc_range = tuple(map(math.log10, calc_range))
+    return calc_range
+    
+def chart_merge_range(calc_range, new_range):
+    if calc_range == None:
+        return new_range
+    return min(calc_range[0], new_range[0]), max(calc_range[1], new_range[1])
+
 def chart_calculate_ranges(xrange, yrange, x_graphs, y_graphs, extend_x=(0, 0),
                             extend_y=(0, 0), logscale=(False, False)):
-    if xrange != RANGE_AUTO:
-        #the xrange was set manually => no calculation neccessary
-        calc_xrange = xrange
-    else:
+    calc_xrange = None
+    if xrange == RANGE_AUTO:
         #calculate the xrange from graphs. (0, 1) if there is no graph
-        calc_xrange = None
         for graph in x_graphs:
             if not graph.get_visible() or len(graph) == 0: continue
-            g_xrange, g_yrange = graph.get_ranges()
-            if calc_xrange == None:
-                calc_xrange = g_xrange
-            else:
-                calc_xrange = min(calc_xrange[0], g_xrange[0]), \
-                                max(calc_xrange[1], g_xrange[1])
-        if calc_xrange == None:
-            calc_xrange = (0, 1)
-        else:
-            delta = abs(calc_xrange[1] - calc_xrange[0])
-            calc_xrange = (calc_xrange[0] - delta * extend_x[0],
-                            calc_xrange[1] + delta * extend_x[1])
-            
-    if yrange != RANGE_AUTO:
-        #the yrange was set manually => no calculation neccessary
-        calc_yrange = yrange
-    else:
+            calc_xrange = chart_merge_range(calc_xrange, graph.get_xrange())
+    calc_yrange = None
+    if yrange == RANGE_AUTO:
         #calculate the yrange from graphs. (0, 1) if there is no graph
-        calc_yrange = None
         for graph in y_graphs:
             if not graph.get_visible() or len(graph) == 0: continue
-            g_xrange, g_yrange = graph.get_ranges()
-            if calc_yrange == None:
-                calc_yrange = g_yrange
-            else:
-                calc_yrange = min(calc_yrange[0], g_yrange[0]), \
-                                max(calc_yrange[1], g_yrange[1])
-                
-        if calc_yrange == None:
-            calc_yrange = (0, 1)
-        else:
-            delta = abs(calc_yrange[1] - calc_yrange[0])
-            calc_yrange = (calc_yrange[0] - delta * extend_y[0],
-                            calc_yrange[1] + delta * extend_y[1])
-                            
-    if logscale[0]:
-        if calc_xrange[0] <= 0: calc_xrange = (0.001, calc_xrange[1])
-        calc_xrange = map(math.log10, calc_xrange)
-    if logscale[1]:
-        if calc_yrange[0] <= 0: calc_yrange = (0.001, calc_yrange[1])
-        calc_yrange = map(math.log10, calc_yrange)
-        
-    return calc_xrange, calc_yrange
+            calc_yrange = chart_merge_range(calc_yrange, graph.get_yrange())
+    return chart_finish_range(calc_xrange, xrange, extend_x, logscale[0]), \
+            chart_finish_range(calc_yrange, yrange, extend_y, logscale[1])
+            
+def chart_calculate_axes_ranges(manual_ranges, graphs, extend_x=(0, 0),
+                                extend_y=(0, 0), logscale1=(False, False),
+                                logscale2=(False, False)):
+    """
+    Calculates the ranges of all four axes in a single pass over the
+    graphs. manual_ranges is a tuple (xrange1, yrange1, xrange2,
+    yrange2) of ranges set manually (or RANGE_AUTO), graphs is a list
+    of (graph, xaxis, yaxis) tuples. Returns a tuple (xrange1, yrange1,
+    xrange2, yrange2).
+    """
+    xrange1, yrange1, xrange2, yrange2 = manual_ranges
+    calc_xranges = {1: None, 2: None}
+    calc_yranges = {1: None, 2: None}
+    for graph, xaxis, yaxis in graphs:
+        if not graph.get_visible() or len(graph) == 0: continue
+        g_xrange, g_yrange = graph.get_ranges()
+        calc_xranges[xaxis] = chart_merge_range(calc_xranges[xaxis], g_xrange)
+        calc_yranges[yaxis] = chart_merge_range(calc_yranges[yaxis], g_yrange)
+    return (chart_finish_range(calc_xranges[1], xrange1, extend_x,
+                                logscale1[0]),
+            chart_finish_range(calc_yranges[1], yrange1, extend_y,
+                                logscale1[1]),
+            chart_finish_range(calc_xranges[2], xrange2, extend_x,
+                                logscale2[0]),
+            chart_finish_range(calc_yranges[2], yrange2, extend_y,
+                                logscale2[1]))
     
     
-def chart_calculate_tics_for_range(crange, logscale):
+TICS_CACHE = {}
+TICS_CACHE_SIZE = 256
+
+
+def chart_nice_step(step):
+    """
+    Returns the smallest number of the form 1, 2 or 5 times a power of
+    ten that is greater than or equal to step.
+    """
+    ten_exp = math.pow(10, math.floor(math.log10(step)))
+    for factor in (1, 2, 5, 10):
+        if factor * ten_exp >= step * (1 - 1e-9):
+            return factor * ten_exp
+    return 10 * ten_exp
+
+def chart_calculate_tics_for_range(crange, logscale, pixel_length=None,
+                                    min_spacing=35):
     """
     This function calculates the tics that should be drawn for a given
-    range.
+    range. If pixel_length (the length of the axis in px) is given, the
+    tics are chosen so that they are about min_spacing px apart.
+    If no tic falls inside the range, the ends of the range are used as
+    tics, so the result is never empty.
+    The results are cached and returned as tuples.
     """
+    if pixel_length != None:
+        #very short (or negative) axis lengths would allow no tic at all
+        pixel_length = max(pixel_length, min_spacing)
+    key = (tuple(crange), logscale, pixel_length, min_spacing)
+    if key in TICS_CACHE:
+        return TICS_CACHE[key]
     tics = []
     if not logscale:
         delta = abs(crange[0] - crange[1])
-        exp = int(math.log10(delta))
-        
-        ten_exp = math.pow(10, exp) #store this value for performance reasons
-        
-        if delta / ten_exp < 1:
-            ten_exp = ten_exp / 10
-        
-        m = int(crange[0] / ten_exp) - 1
-        n = int(crange[1] / ten_exp) + 1
+        if pixel_length != None:
+            max_count = max(1.0, float(pixel_length) / min_spacing)
+            step = chart_nice_step(delta / max_count)
+        else:
+            exp = int(math.log10(delta))
+            ten_exp = math.pow(10, exp)
+            if delta / ten_exp < 1:
+                ten_exp = ten_exp / 10
+            step = ten_exp / 10
+        #round the tics to the precision of the step to avoid values
+        #like 0.30000000000000004
+        digits = max(0, 1 - int(math.floor(math.log10(step))))
+        m = int(math.ceil(crange[0] / step - 1e-9))
+        n = int(math.floor(crange[1] / step + 1e-9))
         for i in range(m, n + 1):
-            for j in range(0, 10):
-                tics.append((i + j / 10.0) * ten_exp)
-        #filter out tics not in range (there can be one or two)
-        tics = filter(lambda x: crange[0] <= x <= crange[1], tics)
+            tics.append(round(i * step, digits))
+        #filter out tics not in range (rounding can add one)
+        tics = [x for x in tics if crange[0] <= x <= crange[1]]
+        if not tics:
+            #the range lies between two tics
+            tics = [round(crange[0], digits + 1), round(crange[1], digits + 1)]
     else:
-        #tics = chart_calculate_tics_for_range(crange, False)
-        lower = int(crange[0])
+        lower = int(math.floor(crange[0]))
         upper = int(crange[1]) + 1
-        current = lower
-        while current < upper:
-            for i in range(1, 10):
+        factors = range(1, 10)
+        decade_step = 1
+        if pixel_length != None:
+            decade_length = float(pixel_length) / max(crange[1] - crange[0],
+                                                        1e-9)
+            #the smallest gap in a decade is between 9 and 10
+            if decade_length * (1 - math.log10(9)) < min_spacing:
+                factors = [1, 2, 5]
+                if decade_length * (1 - math.log10(5)) < min_spacing:
+                    factors = [1]
+                    decade_step = int(math.ceil(min_spacing / decade_length))
+        lower = lower - lower % decade_step
+        for current in range(lower, upper, decade_step):
+            for i in factors:
                 tics.append(i * math.pow(10, current))
-            current += 1
         f = lambda x: math.pow(10, crange[0]) <= x <= math.pow(10, crange[1])
         tics = filter(f, tics)
+        if not tics:
+            #the range lies between two tics
+            tics = [math.pow(10, crange[0]), math.pow(10, crange[1])]
+    tics = tuple(tics)
+    if len(TICS_CACHE) >= TICS_CACHE_SIZE:
+        TICS_CACHE.clear()
+    TICS_CACHE[key] = tics
     return tics
 
 
-class LineChart(chart.Chart):
-    
-    __gsignals__ = {"point-clicked": (gobject.SIGNAL_RUN_LAST,
+#the signals of LineChartModel, LineChart emits them, too
+LINE_CHART_SIGNALS = {"point-clicked": (gobject.SIGNAL_RUN_LAST,
                                         gobject.TYPE_NONE,
                                         (gobject.TYPE_PYOBJECT,
                                         gobject.TYPE_PYOBJECT)),
-                    "point-hovered": (gobject.SIGNAL_RUN_LAST,
+                        "point-hovered": (gobject.SIGNAL_RUN_LAST,
                                         gobject.TYPE_NONE,
                                         (gobject.TYPE_PYOBJECT,
                                         gobject.TYPE_PYOBJECT)),
-                    "selection-changed": (gobject.SIGNAL_RUN_LAST,
+                        "selection-changed": (gobject.SIGNAL_RUN_LAST,
                                         gobject.TYPE_NONE,
                                         (gobject.TYPE_PYOBJECT, ))}
+
+
+class LineChartModel(chart.ChartModel):
+    """
+    The drawing model of a line chart, see chart.ChartModel. It can be
+    rendered without a widget; use LineChart to show it.
+    """
+    
+    __gsignals__ = dict(LINE_CHART_SIGNALS)
                                         
     __gproperties__ = {"mouse-over-effect": (gobject.TYPE_BOOLEAN,
                                             "set whether to show datapoint \
@@ -860,16 +2460,10 @@ class LineChart(chart.Chart):
     _extend_xrange = (0, 0)
     _extend_yrange = (0, 0)
     
-    _graphs_xaxis1 = []
-    _graphs_xaxis2 = []
-    _graphs_yaxis1 = []
-    _graphs_yaxis2 = []
-    _peak_markers = {}
-    
     _color_set = TangoColors()
     
     def __init__(self):
-        super(LineChart, self).__init__()
+        super(LineChartModel, self).__init__()
         #public attributes
         self.xaxis = XAxis()
         self.xaxis2 = XAxis()
@@ -878,12 +2472,27 @@ class LineChart(chart.Chart):
         self.grid = Grid()
         self.key = LineChartKey()
         #private attributes
-        self._graphs = []
+        #maps every graph to a tuple (xaxis, yaxis, handler id)
+        self._graph_axes = collections.OrderedDict()
+        self._n_graphs_xaxis2 = 0
+        self._n_graphs_yaxis2 = 0
+        self._peak_markers = {}
+        #maps the id of every peak marker to its handler id
+        self._peak_marker_handlers = {}
         self._selection_mode = False
         self._selection_start = None
         self._selection_end = None
         self._selecting = False
         self._data_rect = None
+        self._drawn_ranges = None
+        self._ranges_cache = None
+        #layer cache
+        self._frame_surface = None
+        self._data_surface = None
+        self._frame_key = None
+        self._layer_rect = None
+        self._frame_dirty = True
+        self._data_dirty = True
         
         #init some properties
         self.yaxis2.set_visible(True)
@@ -891,6 +2500,8 @@ class LineChart(chart.Chart):
         #connect to "appearance-changed" signals
         self.xaxis.connect("appearance-changed", self._cb_appearance_changed)
         self.yaxis.connect("appearance-changed", self._cb_appearance_changed)
+        self.xaxis2.connect("appearance-changed", self._cb_appearance_changed)
+        self.yaxis2.connect("appearance-changed", self._cb_appearance_changed)
         self.grid.connect("appearance-changed", self._cb_appearance_changed)
         self.key.connect("appearance-changed", self._cb_appearance_changed)
         
@@ -906,7 +2517,7 @@ class LineChart(chart.Chart):
         elif property.name == "selection-mode":
             return self._selection_mode
         else:
-            return super(LineChart, self).do_get_property(property)
+            return super(LineChartModel, self).do_get_property(property)
             
     def do_set_property(self, property, value):
         if property.name == "mouse-over-effect":
@@ -920,7 +2531,7 @@ class LineChart(chart.Chart):
         elif property.name == "selection-mode":
             self._selection_mode = value
         else:
-            super(LineChart, self).do_set_property(property, value)
+            super(LineChartModel, self).do_set_property(property, value)
         
     def _cb_button_pressed(self, widget, event):
         if self._selection_mode:
@@ -932,10 +2543,10 @@ class LineChart(chart.Chart):
                                         (event.y - ry) / rh)
             self._selecting = True
         else:
-            data = chart.get_sensitive_areas(event.x, event.y)
-            for graph, point in data:
-                self.emit("point-clicked", graph, point)
-        super(LineChart, self)._cb_button_pressed(widget, event)
+            data = self._sensitive_areas.get_areas(event.x, event.y)
+            for graph, index in data:
+                self.emit("point-clicked", graph, graph.get_point(index))
+        super(LineChartModel, self)._cb_button_pressed(widget, event)
         
     def _cb_button_released(self, widget, event):
         if self._selection_mode:
@@ -943,7 +2554,7 @@ class LineChart(chart.Chart):
             data = (self._selection_start[0], self._selection_start[1],
                     self._selection_end[0], self._selection_end[1])
             self.emit("selection-changed", data)
-        super(LineChart, self)._cb_button_released(widget, event)
+        super(LineChartModel, self)._cb_button_released(widget, event)
     
     def _cb_motion_notify(self, widget, event):
         if self._selection_mode:
@@ -955,38 +2566,125 @@ class LineChart(chart.Chart):
                     rh = float(self._data_rect.height)
                     self._selection_end = ((event.x - rx) / rw,
                                             (event.y - ry) / rh)
-                    self.queue_draw()
+                    self.queue_overlay_redraw()
         else:
             if not self._mouse_over_effect: return
-            data = chart.get_sensitive_areas(event.x, event.y)
-            change = False
-            for graph in self._graphs:
-                if graph.get_highlighted() != []:
-                    change = True
-                graph.set_highlighted([])
-            for graph, point in data:
-                graph.add_highlighted(point)
-                self.emit("point-hovered", graph, point)
-            if data != [] or change:
-                self.queue_draw()
-        
-    def draw(self, context):
-        """
-        Draw the widget. This method is called automatically. Don't call it
-        yourself. If you want to force a redrawing of the widget, call
+            hovered = {}
+            for graph, index in self._sensitive_areas.get_areas(event.x,
+                                                                event.y):
+                hovered.setdefault(graph, set()).add(index)
+            changed = []
+            for graph in self._graph_axes:
+                old = graph.get_highlighted_indices()
+                new = hovered.get(graph, set())
+                if old == new: continue
+                graph.set_highlighted_indices(new)
+                changed.append((graph, old ^ new))
+                for index in sorted(new - old):
+                    self.emit("point-hovered", graph, graph.get_point(index))
+            self._queue_draw_points(changed)
+            
+    def _queue_draw_points(self, changed):
+        """
+        Redraw the areas around some points of graphs. changed is a list
+        of (graph, indices) pairs.
+        """
+        if changed == []:
+            return
+        if self._drawn_ranges == None:
+            self.queue_overlay_redraw()
+            return
+        rect = self._data_rect
+        ranges, logscale1, logscale2 = self._drawn_ranges
+        for graph, indices in changed:
+            xrange, yrange, logscale = self._get_graph_ranges(graph, ranges,
+                                                            logscale1,
+                                                            logscale2)
+            #ppu: pixel per unit
+            ppu_x = float(rect.width) / abs(xrange[0] - xrange[1])
+            ppu_y = float(rect.height) / abs(yrange[0] - yrange[1])
+            size = graph.get_point_size() + graph.get_line_width() + 2
+            xdata, ydata = graph._data
+            data = [xdata[i] for i in indices], [ydata[i] for i in indices]
+            for x, y, posx, posy in graph_iter_points(rect, data, xrange,
+                                                        yrange, ppu_x, ppu_y,
+                                                        logscale):
+                self.queue_draw_area(int(posx - size), int(posy - size),
+                                        int(2 * size + 1), int(2 * size + 1))
+        
+    def expose(self, context):
+        """
+        Draw the chart for an expose of the widget, using the layer
+        cache (see draw()).
+        """
+        self.draw(context, True)
+        
+    def _cb_appearance_changed(self, object):
+        """
+        This method is called after the appearance of an object changed.
+        It marks the layer containing the object as dirty and schedules
+        a redraw.
+        """
+        if object in [self.background, self.title, self.xaxis, self.yaxis,
+                        self.xaxis2, self.yaxis2, self.grid]:
+            self._frame_dirty = True
+        else:
+            self._data_dirty = True
+            self._ranges_cache = None
+        chart.ChartModel.queue_redraw(self)
+        
+    def queue_redraw(self):
+        """
+        Schedule a complete redraw of the chart. See
+        chart.ChartModel.queue_redraw().
+        """
+        self._frame_dirty = True
+        self._data_dirty = True
+        self._ranges_cache = None
+        chart.ChartModel.queue_redraw(self)
+        
+    def queue_draw(self):
+        """
+        Redraw the complete chart, including the cached frame and data
+        layers (see draw()).
+        """
+        self._frame_dirty = True
+        self._data_dirty = True
+        self._ranges_cache = None
+        chart.ChartModel.queue_draw(self)
+        
+    def queue_overlay_redraw(self):
+        """
+        Schedule a redraw of the overlay layer (highlighted points and
+        selection) only. The frame and the graphs are taken from the
+        layer cache.
+        """
+        chart.ChartModel.queue_redraw(self)
+        
+    def draw(self, context, cache=False):
+        """
+        Draw the chart. This method is called automatically. Don't call it
+        yourself. If you want to force a redrawing of the chart, call
         the queue_draw() method.
         
+        If cache is True, the chart is drawn in three layers: the static
+        frame (background, title, axes and grid), the data layer (graphs,
+        peak markers and key) and the overlay (highlighted points and
+        selection). The first two layers are kept on off-screen surfaces
+        and only redrawn if they are dirty, so e.g. a mouse-over effect
+        only redraws the overlay. Painting is restricted to the clip
+        region of context, so an expose of a small area (see
+        _queue_draw_points()) only copies that area from the layers.
+        
         @type context: cairo.Context
         @param context: The context to draw on.
+        @type cache: boolean
+        @param cache: Set whether to use the layer cache.
         """
-        label.begin_drawing()
+        label.begin_drawing(self._style_cache)
         
-        rect = self.get_allocation()
-        #transform rect to context coordinates
-        rect = gtk.gdk.Rectangle(0, 0, rect.width, rect.height)
+        rect = self._get_draw_rect()
         context.set_line_width(1)
-                                    
-        rect = self._draw_basics(context, rect)
         
         extend_x = self._extend_xrange
         extend_y = self._extend_yrange
@@ -1000,57 +2698,109 @@ class LineChart(chart.Chart):
         logscale2 = (self.xaxis2.get_property("logscale"),
                     self.yaxis2.get_property("logscale"))
         
-        #calculate the ranges for all four possible combinations of axis
-        #affinity
-        ranges = chart_calculate_ranges(self._xrange1, self._yrange1,
-                                        self._graphs_xaxis1,
-                                        self._graphs_yaxis1, extend_x,
-                                        extend_y, (logscale1[0], logscale1[1]))
-        calculated_xrange1a, calculated_yrange1a = ranges
-        ranges = chart_calculate_ranges(self._xrange1, self._yrange2,
-                                        self._graphs_xaxis1,
-                                        self._graphs_yaxis2, extend_x,
-                                        extend_y, (logscale1[0], logscale2[1]))
-        calculated_xrange1b, calculated_yrange2a = ranges
-        ranges = chart_calculate_ranges(self._xrange2, self._yrange1,
-                                        self._graphs_xaxis2,
-                                        self._graphs_yaxis1, extend_x,
-                                        extend_y, (logscale2[0], logscale1[1]))
-        calculated_xrange2a, calculated_yrange1b = ranges
-        ranges = chart_calculate_ranges(self._xrange2, self._yrange2,
-                                        self._graphs_xaxis2,
-                                        self._graphs_yaxis2, extend_x,
-                                        extend_y, (logscale2[0], logscale2[1]))
-        calculated_xrange2b, calculated_yrange2b = ranges
-        
-        #find out the actual ranges from the eight ranges calculated above
-        calculated_xrange1 = min(calculated_xrange1a[0],
-                                    calculated_xrange1b[0]), \
-                                    max(calculated_xrange1a[1],
-                                    calculated_xrange1b[1])
-        calculated_yrange1 = min(calculated_yrange1a[0],
-                                    calculated_yrange1b[0]), \
-                                    max(calculated_yrange1a[1],
-                                    calculated_yrange1b[1])
-        calculated_xrange2 = min(calculated_xrange2a[0], 
-                                    calculated_xrange2b[0]), \
-                                    max(calculated_xrange2a[1],
-                                    calculated_xrange2b[1])
-        calculated_yrange2 = min(calculated_yrange2a[0],
-                                    calculated_yrange2b[0]), \
-                                    max(calculated_yrange2a[1],
-                                    calculated_yrange2b[1])
-        
-        #calculate tic positions for all axes
+        #calculate the ranges of all axes, they are cached until a graph
+        #or the chart changes
+        ranges_key = (self._xrange1, self._yrange1, self._xrange2,
+                        self._yrange2, extend_x, extend_y, logscale1, logscale2)
+        if self._ranges_cache == None or self._ranges_cache[0] != ranges_key:
+            graphs = [(graph, xaxis, yaxis) for graph, (xaxis, yaxis, handler)
+                        in self._graph_axes.iteritems()]
+            ranges = chart_calculate_axes_ranges(ranges_key[:4], graphs,
+                                                    extend_x, extend_y,
+                                                    logscale1, logscale2)
+            self._ranges_cache = ranges_key, ranges
+        calculated_xrange1, calculated_yrange1, calculated_xrange2, \
+        calculated_yrange2 = self._ranges_cache[1]
+        
+        #calculate tic positions for all axes, the length of the axes is
+        #estimated from the size of the widget
+        xlength = rect.width - 2 * self._padding
+        ylength = rect.height - 3 * self._padding
         xtics1 = chart_calculate_tics_for_range(calculated_xrange1,
-                                                logscale1[0])
+                                                logscale1[0], xlength,
+                                                self.xaxis._min_tic_spacing)
         ytics1 = chart_calculate_tics_for_range(calculated_yrange1,
-                                                logscale1[1])
+                                                logscale1[1], ylength,
+                                                self.yaxis._min_tic_spacing)
         xtics2 = chart_calculate_tics_for_range(calculated_xrange2,
-                                                logscale2[0])
+                                                logscale2[0], xlength,
+                                                self.xaxis2._min_tic_spacing)
         ytics2 = chart_calculate_tics_for_range(calculated_yrange2,
-                                                logscale2[1])
+                                                logscale2[1], ylength,
+                                                self.yaxis2._min_tic_spacing)
                                                 
+        ranges = (calculated_xrange1, calculated_yrange1, calculated_xrange2,
+                    calculated_yrange2)
+        tics = (xtics1, ytics1, xtics2, ytics2)
+        
+        if not cache:
+            rect = self._draw_frame(context, rect, ranges, tics)
+            self._draw_data(context, rect, ranges, logscale1, logscale2)
+        else:
+            frame_key = (rect.width, rect.height, ranges, tics, logscale1,
+                            logscale2)
+            if self._frame_surface == None or self._frame_dirty or \
+                    frame_key != self._frame_key:
+                self._frame_surface, layer_context = self._create_layer(
+                                                context, rect.width,
+                                                rect.height)
+                self._layer_rect = self._draw_frame(layer_context, rect,
+                                                    ranges, tics)
+                self._frame_key = frame_key
+                self._frame_dirty = False
+                self._data_dirty = True
+            rect = self._layer_rect
+            if self._data_surface == None or self._data_dirty:
+                self._data_surface, layer_context = self._create_layer(
+                                                context, frame_key[0],
+                                                frame_key[1])
+                self._draw_data(layer_context, rect, ranges, logscale1,
+                                logscale2)
+                self._data_dirty = False
+            context.set_source_surface(self._frame_surface, 0, 0)
+            context.paint()
+            context.set_source_surface(self._data_surface, 0, 0)
+            context.paint()
+            
+        self._draw_overlay(context, rect, ranges, logscale1, logscale2)
+        
+        label.finish_drawing()
+        self._data_rect = rect
+        self._drawn_ranges = ranges, logscale1, logscale2
+        
+    def render(self, target, width, height, resolution=None):
+        """
+        Draw the chart on target at the given size. See
+        chart.ChartModel.render().
+        """
+        old_state = self._data_rect, self._drawn_ranges
+        try:
+            chart.ChartModel.render(self, target, width, height,
+                                    resolution)
+        finally:
+            self._data_rect, self._drawn_ranges = old_state
+            
+    def _create_layer(self, context, width, height):
+        """
+        Create an off-screen surface compatible with the target of
+        context and a context to draw on it.
+        """
+        surface = context.get_target().create_similar(
+                                    cairo.CONTENT_COLOR_ALPHA, width, height)
+        layer_context = pangocairo.CairoContext(cairo.Context(surface))
+        layer_context.set_line_width(1)
+        return surface, layer_context
+        
+    def _draw_frame(self, context, rect, ranges, tics):
+        """
+        Draw the static frame of the chart: background, title, axes and
+        grid. Returns the rectangle available for the graphs.
+        """
+        calculated_xrange1, calculated_yrange1, calculated_xrange2, \
+        calculated_yrange2 = ranges
+        xtics1, ytics1, xtics2, ytics2 = tics
+        rect = self._draw_basics(context, rect)
+        
         #draw axes
         rect, xtics1_drawn_at, ytics1_drawn_at, xtics2_drawn_at, \
         ytics2_drawn_at = self._draw_axes(context, rect, calculated_xrange1,
@@ -1064,8 +2814,22 @@ class LineChart(chart.Chart):
         context.rectangle(rect.x + 1, rect.y + 1, rect.width - 1,
                             rect.height - 1)
         context.clip()
-        
         self._draw_grid(context, rect, xtics1_drawn_at, ytics1_drawn_at)
+        context.restore()
+        return rect
+        
+    def _draw_data(self, context, rect, ranges, logscale1, logscale2):
+        """
+        Draw the data layer of the chart: graphs, peak markers and key.
+        """
+        calculated_xrange1, calculated_yrange1, calculated_xrange2, \
+        calculated_yrange2 = ranges
+        
+        #restrict drawing area
+        context.save()
+        context.rectangle(rect.x + 1, rect.y + 1, rect.width - 1,
+                            rect.height - 1)
+        context.clip()
         
         self._draw_graphs(context, rect, calculated_xrange1,
                             calculated_yrange1, calculated_xrange2,
@@ -1077,12 +2841,24 @@ class LineChart(chart.Chart):
         
         #draw key
         context.restore()
-        self.key.draw(context, rect, self._graphs, self._color_set)
+        self.key.draw(context, rect, self._graph_axes.keys(), self._color_set)
         
-        self._draw_selection(context, rect)
+    def _draw_overlay(self, context, rect, ranges, logscale1, logscale2):
+        """
+        Draw the overlay of the chart: highlighted points and selection.
+        """
+        context.save()
+        context.rectangle(rect.x + 1, rect.y + 1, rect.width - 1,
+                            rect.height - 1)
+        context.clip()
+        for graph in self._graph_axes:
+            xrange, yrange, logscale = self._get_graph_ranges(graph, ranges,
+                                                            logscale1,
+                                                            logscale2)
+            graph.draw_highlighted(context, rect, xrange, yrange, logscale)
+        context.restore()
         
-        label.finish_drawing()
-        self._data_rect = rect
+        self._draw_selection(context, rect)
         
     def _draw_basics(self, context, rect):
         """
@@ -1112,9 +2888,11 @@ class LineChart(chart.Chart):
         rect = self.xaxis2.make_rect_label_offset(context, rect, xtics2, True)
         rect = self.yaxis2.make_rect_label_offset(context, rect, ytics2, True)
         
-        if self.xaxis2.get_visible() and self._graphs_xaxis2 != []:
+        if (self.xaxis2.get_visible() and self._n_graphs_xaxis2 > 0
+                and self.xaxis.get_show_other_side()):
             self.xaxis.set_property("show-other-side", False)
-        if self.yaxis2.get_visible() and self._graphs_yaxis2 != []:
+        if (self.yaxis2.get_visible() and self._n_graphs_yaxis2 > 0
+                and self.yaxis.get_show_other_side()):
             self.yaxis.set_property("show-other-side", False)
         
         xtics1_drawn_at = self.xaxis.draw(context, rect, calculated_xrange1,
@@ -1124,11 +2902,11 @@ class LineChart(chart.Chart):
         
         xtics2_drawn_at = []
         ytics2_drawn_at = []
-        if self._graphs_xaxis2 != []:
+        if self._n_graphs_xaxis2 > 0:
             xtics2_drawn_at = self.xaxis2.draw(context, rect,
                                                 calculated_xrange2, xtics2,
                                                 True)
-        if self._graphs_yaxis2 != []:
+        if self._n_graphs_yaxis2 > 0:
             ytics2_drawn_at = self.yaxis2.draw(context, rect,
                                                 calculated_yrange2, ytics2,
                                                 True)
@@ -1146,30 +2924,36 @@ class LineChart(chart.Chart):
                     self.yaxis.get_property("logscale"))
         logscale2 = (self.xaxis2.get_property("logscale"),
                     self.yaxis2.get_property("logscale"))
-        chart.init_sensitive_areas()
+        ranges = (calculated_xrange1, calculated_yrange1, calculated_xrange2,
+                    calculated_yrange2)
+        self._sensitive_areas.clear()
         self._color_set.reset()
-        for i, graph in enumerate(self._graphs):
+        for graph in self._graph_axes:
             gc = graph.get_property("color")
             if gc == COLOR_AUTO:
                 gc = self._color_set.get_color()
+            xrange, yrange, logscale = self._get_graph_ranges(graph, ranges,
+                                                            logscale1,
+                                                            logscale2)
+            graph.draw(context, rect, xrange, yrange, gc, logscale,
+                        self._render_resolution, self._sensitive_areas)
             
-            logx = False
-            logy = False
-            
-            if graph in self._graphs_xaxis1:
-                calculated_xrange = calculated_xrange1
-                logx = logscale1[0]
-            elif graph in self._graphs_xaxis2:
-                calculated_xrange = calculated_xrange2
-                logx = logscale2[0]
-            if graph in self._graphs_yaxis1:
-                calculated_yrange = calculated_yrange1
-                logy = logscale1[1]
-            elif graph in self._graphs_yaxis2:
-                calculated_yrange = calculated_yrange2
-                logy = logscale2[1]
-            graph.draw(context, rect, calculated_xrange, calculated_yrange, gc,
-                        (logx, logy))
+    def _get_graph_ranges(self, graph, ranges, logscale1, logscale2):
+        """
+        Returns a tuple (xrange, yrange, logscale) for graph, taken from
+        the ranges (xrange1, yrange1, xrange2, yrange2) and the logscale
+        settings of the axes the graph belongs to.
+        """
+        xaxis, yaxis, handler = self._graph_axes[graph]
+        if xaxis == 1:
+            xrange, logx = ranges[0], logscale1[0]
+        else:
+            xrange, logx = ranges[2], logscale2[0]
+        if yaxis == 1:
+            yrange, logy = ranges[1], logscale1[1]
+        else:
+            yrange, logy = ranges[3], logscale2[1]
+        return xrange, yrange, (logx, logy)
             
     def _draw_peak_markers(self, context, rect, xrange1, yrange1, xrange2, yrange2, logscale1, logscale2):
         for id, marker in self._peak_markers.iteritems():
@@ -1195,10 +2979,10 @@ class LineChart(chart.Chart):
             marker.draw(context, rect, xrange, yrange, logscale)
             
     def _draw_selection(self, context, rect):
-        sc = gtk.Label("").get_style().bg[gtk.STATE_SELECTED]
-        c = basics.color_gdk_to_cairo(sc)
-        ca = (c[0], c[1], c[2], 0.3)
         if self._selection_start != None and self._selection_end != None:
+            c = basics.color_gdk_to_cairo(self._selection_color)
+            ca = (c[0], c[1], c[2], 0.3)
+            
             x = min(max(0, self._selection_start[0]), 1)
             y = min(max(0, self._selection_start[1]), 1)
             self._selection_start = (x, y)
@@ -1220,6 +3004,47 @@ class LineChart(chart.Chart):
             context.set_source_rgb(*c)
             context.stroke()
         
+    def pick(self, event_x, event_y, max_distance=None):
+        """
+        Find the data point closest to the position (event_x, event_y)
+        in widget coordinates, e.g. the position of the mouse pointer.
+        The distance is measured in pixels. Returns a pair
+        (graph, (x, y)) or None if there is no visible point within
+        max_distance pixels (or if the chart was not drawn yet).
+        
+        @type event_x: float
+        @type event_y: float
+        @type max_distance: float or None
+        @return: (graph, point) or None
+        """
+        if self._data_rect == None or self._drawn_ranges == None:
+            return None
+        rect = self._data_rect
+        ranges, logscale1, logscale2 = self._drawn_ranges
+        best = None
+        for graph in self._graph_axes:
+            if not graph.get_visible(): continue
+            xrange, yrange, (logx, logy) = self._get_graph_ranges(graph,
+                                                                ranges,
+                                                                logscale1,
+                                                                logscale2)
+            #ppu: pixel per unit
+            ppu_x = float(rect.width) / abs(xrange[0] - xrange[1])
+            ppu_y = float(rect.height) / abs(yrange[0] - yrange[1])
+            x = xrange[0] + (event_x - rect.x) / ppu_x
+            y = yrange[0] + (rect.y + rect.height - event_y) / ppu_y
+            if logx: x = 10 ** x
+            if logy: y = 10 ** y
+            res = graph._find_nearest(x, y, max_distance, (ppu_x, ppu_y),
+                                        (logx, logy))
+            if res != None and (best == None or res[0] < best[0]):
+                best = res[0], graph, res[1]
+        if best == None:
+            return None
+        distance, graph, index = best
+        xdata, ydata = graph._data
+        return graph, (xdata[index], ydata[index])
+        
     def add_graph(self, graph, xaxis=1, yaxis=1):
         """
         Add a graph to the LineChart widget.
@@ -1231,26 +3056,83 @@ class LineChart(chart.Chart):
         @type xaxis: int (1 or 2)
         @type yaxis: int (1 or 2)
         """
-        self._graphs.append(graph)
+        if graph in self._graph_axes:
+            self.remove_graph(graph)
+        handler = graph.connect("appearance-changed",
+                                self._cb_appearance_changed)
+        self._graph_axes[graph] = (xaxis, yaxis, handler)
+        self._count_graph_axes(xaxis, yaxis, 1)
+        self.queue_redraw()
         
-        if xaxis == 1:
-            self._graphs_xaxis1.append(graph)
-        else:
-            self._graphs_xaxis2.append(graph)
-        if yaxis == 1:
-            self._graphs_yaxis1.append(graph)
-        else:
-            self._graphs_yaxis2.append(graph)
-            
-        self.queue_draw()
+    def _count_graph_axes(self, xaxis, yaxis, n):
+        if xaxis == 2:
+            self._n_graphs_xaxis2 += n
+        if yaxis == 2:
+            self._n_graphs_yaxis2 += n
+        
+    def remove_graph(self, graph):
+        """
+        Remove a graph from the LineChart widget.
+        
+        @type graph: line_chart.Graph
+        @param graph: the graph to remove
+        """
+        if graph not in self._graph_axes:
+            raise ValueError, "The graph is not part of the chart."
+        xaxis, yaxis, handler = self._graph_axes.pop(graph)
+        graph.disconnect(handler)
+        self._count_graph_axes(xaxis, yaxis, -1)
+        self.queue_redraw()
+        
+    def move_graph_to_axis(self, graph, xaxis=None, yaxis=None):
+        """
+        Change the axes that are used to scale and display a graph.
+        Pass None to keep the current axis.
+        
+        @type graph: line_chart.Graph
+        @param graph: a graph of the chart
+        @type xaxis: int (1 or 2) or None
+        @type yaxis: int (1 or 2) or None
+        """
+        if graph not in self._graph_axes:
+            raise ValueError, "The graph is not part of the chart."
+        old_xaxis, old_yaxis, handler = self._graph_axes[graph]
+        if xaxis == None: xaxis = old_xaxis
+        if yaxis == None: yaxis = old_yaxis
+        self._count_graph_axes(old_xaxis, old_yaxis, -1)
+        self._graph_axes[graph] = (xaxis, yaxis, handler)
+        self._count_graph_axes(xaxis, yaxis, 1)
+        self.queue_redraw()
+        
+    def get_graph_axes(self, graph):
+        """
+        Returns the axes used for graph as a pair (xaxis, yaxis).
+        
+        @return: pair of int
+        """
+        xaxis, yaxis, handler = self._graph_axes[graph]
+        return xaxis, yaxis
+        
+    def get_graphs(self):
+        """
+        Returns a list of the graphs of the chart.
+        
+        @return: list of line_chart.Graph
+        """
+        return self._graph_axes.keys()
         
     def add_peak_marker(self, id, marker):
+        if id in self._peak_markers:
+            self._peak_markers[id].disconnect(self._peak_marker_handlers[id])
         self._peak_markers[id] = marker
-        self.queue_draw()
+        self._peak_marker_handlers[id] = marker.connect("appearance-changed",
+                                                self._cb_appearance_changed)
+        self.queue_redraw()
         
     def remove_peak_marker(self, id):
-        del self._peak_markers[id]
-        self.queue_draw()
+        marker = self._peak_markers.pop(id)
+        marker.disconnect(self._peak_marker_handlers.pop(id))
+        self.queue_redraw()
         
     def get_peak_marker(self, id):
         return self._peak_markers[id]
@@ -1259,14 +3141,17 @@ class LineChart(chart.Chart):
         return self._peak_markers
         
     def clear(self, peak_markers=True):
-        self._graphs = []
-        self._graphs_xaxis1 = []
-        self._graphs_xaxis2 = []
-        self._graphs_yaxis1 = []
-        self._graphs_yaxis2 = []
+        for graph, (xaxis, yaxis, handler) in self._graph_axes.iteritems():
+            graph.disconnect(handler)
+        self._graph_axes = collections.OrderedDict()
+        self._n_graphs_xaxis2 = 0
+        self._n_graphs_yaxis2 = 0
         if peak_markers:
+            for id, marker in self._peak_markers.iteritems():
+                marker.disconnect(self._peak_marker_handlers[id])
             self._peak_markers = {}
-        self.queue_draw()
+            self._peak_marker_handlers = {}
+        self.queue_redraw()
         
     def get_color_set(self):
         """
@@ -1288,7 +3173,6 @@ class LineChart(chart.Chart):
         @type color_set: a pygtk_chart.color.ColorSet instance
         """
         self.set_property("color-set", color_set)
-        self.queue_draw()
         
     def get_mouse_over_effect(self):
         """
@@ -1323,7 +3207,7 @@ class LineChart(chart.Chart):
         @type pos: pair of float
         """
         self._peak_marker = pos
-        self.queue_draw()
+        self.queue_redraw()
         
     def get_extend_xrange(self):
         """
@@ -1344,7 +3228,6 @@ class LineChart(chart.Chart):
         @type extend: pair of float
         """
         self.set_property("extend-xrange", extend)
-        self.queue_draw()
         
     def get_extend_yrange(self):
         """
@@ -1365,7 +3248,6 @@ class LineChart(chart.Chart):
         @type extend: pair of float
         """
         self.set_property("extend-yrange", extend)
-        self.queue_draw()
         
     def get_selection_mode(self):
         """
@@ -1387,6 +3269,33 @@ class LineChart(chart.Chart):
         """
         self.set_property("selection_mode", enable)
         
+        
+class LineChart(chart.Chart):
+    """
+    A widget that shows a line chart. See LineChartModel for its
+    attributes, methods and properties.
+    
+    Signals
+    =======
+    The LineChart class inherits signals from chart.Chart.
+    Additional signals:
+     - point-clicked: emitted when a data point is clicked, callback
+       signature: def callback(chart, graph, point).
+     - point-hovered: emitted when the mouse is moved over a data
+       point, callback signature: def callback(chart, graph, point).
+     - selection-changed: emitted when a selection was made in
+       selection mode, callback signature:
+       def callback(chart, (x0, y0, x1, y1)).
+    """
+    
+    __gsignals__ = dict(LINE_CHART_SIGNALS)
+    
+    def __init__(self, model=None):
+        if model == None:
+            model = LineChartModel()
+        chart.Chart.__init__(self, model)
+        self._forward_signals(LINE_CHART_SIGNALS)
+        
 
 class Axis(ChartObject):
     
@@ -1523,7 +3432,6 @@ class Axis(ChartObject):
         @type param: boolean.
         """
         self.set_property("logscale", logscale)
-        self.emit("appearance-changed")
         
     def get_show_label(self):
         """
@@ -1687,59 +3595,54 @@ class XAxis(Axis):
         else:
             context.move_to(rect.x, rect.y + 0.5)
         context.rel_line_to(rect.width, 0)
-        context.stroke()
         
         if self._show_other_side and not top:
             context.move_to(rect.x, rect.y + 0.5)
             context.rel_line_to(rect.width, 0)
-            context.stroke()
         
-        tics_drawn_at = self._draw_tics(context, rect, calculated_xrange, tics,
-                                        top)
+        tics_drawn_at = self._get_tic_positions(rect, calculated_xrange, tics)
+        self._draw_tics(context, rect, tics_drawn_at, top)
+        #the axis line and all tics are stroked at once
+        context.stroke()
         self._draw_tic_labels(context, rect, tics_drawn_at, top)
         return tics_drawn_at
         
-    def _draw_tics(self, context, rect, xrange, tics, top):
+    def _get_tic_positions(self, rect, xrange, tics):
+        """
+        Returns a list of (tic, x) pairs, x is the pixel position of the
+        tic. Tics closer than min_tic_spacing to the previous one are
+        left out. The list is used for tics, tic labels and the grid.
+        """
         tics_drawn_at = []
         if self._show_tics:
             ppu = float(rect.width) / abs(xrange[0] - xrange[1])
-            if not top:
-                y = rect.y + rect.height
-            else:
-                y = rect.y + self._tics_size
             last_pos = -100
-            if not self._logscale:
-                for tic in tics:
+            for tic in tics:
+                if not self._logscale:
                     x = rect.x + ppu * (tic - xrange[0])
-                    if abs(x - last_pos) >= self._min_tic_spacing:
-                        context.move_to(x, y)
-                        context.rel_line_to(0, -self._tics_size)
-                        context.stroke()
-                        
-                        if self._show_other_side:
-                            context.move_to(x, rect.y)
-                            context.rel_line_to(0, self._tics_size)
-                            context.stroke()
-                        
-                        last_pos = x
-                        tics_drawn_at.append((tic, x))
-            else:
-                for tic in tics:
+                else:
                     x = rect.x + ppu * (math.log10(tic) - xrange[0])
-                    if abs(x - last_pos) >= self._min_tic_spacing:
-                        context.move_to(x, y)
-                        context.rel_line_to(0, -self._tics_size)
-                        context.stroke()
-                        
-                        if self._show_other_side:
-                            context.move_to(x, rect.y)
-                            context.rel_line_to(0, self._tics_size)
-                            context.stroke()
-                        
-                        last_pos = x
-                        tics_drawn_at.append((tic, x))
+                if abs(x - last_pos) >= self._min_tic_spacing:
+                    last_pos = x
+                    tics_drawn_at.append((tic, x))
         return tics_drawn_at
         
+    def _draw_tics(self, context, rect, tics_drawn_at, top):
+        """
+        Add the tics at the positions in tics_drawn_at to the current
+        path.
+        """
+        if not top:
+            y = rect.y + rect.height
+        else:
+            y = rect.y + self._tics_size
+        for tic, x in tics_drawn_at:
+            context.move_to(x, y)
+            context.rel_line_to(0, -self._tics_size)
+            if self._show_other_side:
+                context.move_to(x, rect.y)
+                context.rel_line_to(0, self._tics_size)
+        
     def _draw_label(self, context, rect, top):
         if self._label and self._show_label:
             if not top:
@@ -1783,7 +3686,7 @@ class XAxis(Axis):
             label_object.set_use_markup(True)
             w, h = label_object.get_calculated_dimensions(context, rect)
             offset = int(h)
-        if self._show_tics and self._show_tic_labels:
+        if self._show_tics and self._show_tic_labels and tics:
             label_object = label.Label((0, 0), self._tic_label_format(tics[0]),
                                         anchor=label.ANCHOR_TOP_LEFT)
             w, h = label_object.get_calculated_dimensions(context, rect)
@@ -1810,60 +3713,60 @@ class YAxis(Axis):
         else:
             context.move_to(rect.x + rect.width + 0.5, rect.y)
         context.rel_line_to(0, rect.height)
-        context.stroke()
         
         if self._show_other_side and not right:
             context.move_to(rect.x + rect.width + 0.5, rect.y)
             context.rel_line_to(0, rect.height)
-            context.stroke()
         
-        tics_drawn_at = self._draw_tics(context, rect, calculated_yrange, tics,
-                                        right)
+        tics_drawn_at = self._get_tic_positions(rect, calculated_yrange, tics)
+        self._draw_tics(context, rect, tics_drawn_at, right)
+        #the axis line and all tics are stroked at once
+        context.stroke()
         self._draw_tic_labels(context, rect, tics_drawn_at, right)
         return tics_drawn_at
         
-    def _draw_tics(self, context, rect, yrange, tics, right):
+    def _get_tic_positions(self, rect, yrange, tics):
+        """
+        Returns a list of (tic, y) pairs, y is the pixel position of the
+        tic. Tics closer than min_tic_spacing (10px on logarithmic axes)
+        to the previous one are left out. The list is used for tics, tic
+        labels and the grid.
+        """
         tics_drawn_at = []
         if self._show_tics:
             ppu = float(rect.height) / abs(yrange[0] - yrange[1])
-            if not right:
-                x = rect.x
-            else:
-                x = rect.x + rect.width - self._tics_size
             last_pos = -100
             if not self._logscale:
-                for tic in tics:
-                    y = rect.y + rect.height - ppu * (tic - yrange[0])
-                    if abs(y - last_pos) >= self._min_tic_spacing:
-                        context.move_to(x, y)
-                        context.rel_line_to(self._tics_size, 0)
-                        context.stroke()
-                        
-                        if self._show_other_side:
-                            context.move_to(x + rect.width, y)
-                            context.rel_line_to(-self._tics_size, 0)
-                            context.stroke()
-                        
-                        last_pos = y
-                        tics_drawn_at.append((tic, y))
+                min_spacing = self._min_tic_spacing
             else:
-                for tic in tics:
+                min_spacing = 10
+            for tic in tics:
+                if not self._logscale:
+                    y = rect.y + rect.height - ppu * (tic - yrange[0])
+                else:
                     y = rect.y + rect.height - ppu * (math.log10(tic) - \
                                                         yrange[0])
-                    if abs(y - last_pos) >= 10:
-                        context.move_to(x, y)
-                        context.rel_line_to(self._tics_size, 0)
-                        context.stroke()
-                        
-                        if self._show_other_side:
-                            context.move_to(x + rect.width, y)
-                            context.rel_line_to(-self._tics_size, 0)
-                            context.stroke()
-                        
-                        last_pos = y
-                        tics_drawn_at.append((tic, y))
+                if abs(y - last_pos) >= min_spacing:
+                    last_pos = y
+                    tics_drawn_at.append((tic, y))
         return tics_drawn_at
         
+    def _draw_tics(self, context, rect, tics_drawn_at, right):
+        """
+        Add the tics at the positions in tics_drawn_at to the current
+        path.
+        """
+        if not right:
+            x = rect.x
+        else:
+            x = rect.x + rect.width - self._tics_size
+        for tic, y in tics_drawn_at:
+            context.move_to(x, y)
+            context.rel_line_to(self._tics_size, 0)
+            if self._show_other_side:
+                context.move_to(x + rect.width, y)
+                context.rel_line_to(-self._tics_size, 0)
+        
     def _draw_label(self, context, rect, right):
         if self._label and self._show_label:
             if not right:
@@ -1910,7 +3813,7 @@ class YAxis(Axis):
             label_object.set_max_width(rect.height)
             w, h = label_object.get_calculated_dimensions(context, rect)
             offset = int(w)
-        if self._show_tics and self._show_tic_labels:
+        if self._show_tics and self._show_tic_labels and tics:
             m = ""
             w = 0
             for y in tics:
@@ -2007,7 +3910,7 @@ class Grid(ChartObject):
                 else:
                     context.move_to(xpos, rect.y)
                     context.rel_line_to(0, rect.height - xaxis.get_tic_size())
-                context.stroke()
+            context.stroke()
         #draw horizontal lines
         if self._show_horizontal_lines:
             set_context_line_style(context, self._line_style_horizontal)
@@ -2018,7 +3921,7 @@ class Grid(ChartObject):
                                         0)
                 else:
                     context.rel_line_to(rect.width - yaxis.get_tic_size(), 0)
-                context.stroke()
+            context.stroke()
                 
     def get_show_horizontal_lines(self):
         """
@@ -2293,19 +4196,14 @@ class LineChartKey(ChartObject):
     def do_set_property(self, property, value):
         if property.name == "width":
             self._width = value
-            self.emit("appearance-changed")
         elif property.name == "position":
             self._position = value
-            self.emit("appearance-changed")
         elif property.name == "line-length":
             self._line_length = value
-            self.emit("appearance-changed")
         elif property.name == "padding":
             self._padding = value
-            self.emit("appearance-changed")
         elif property.name == "opacity":
             self._bg_opacity = value
-            self.emit("appearance-changed")
         else:
             super(LineChartKey, self).do_set_property(property, value)
             
@@ -2448,7 +4346,7 @@ class PeakMarker(ChartObject):
         elif property.name == "text":
             return self._text
         else:
-            super(PeakMarker, self).do_get_property(property)
+            return super(PeakMarker, self).do_get_property(property)
             
     def do_set_property(self, property, value):
         if property.name == "xaxis":
@@ -2511,7 +4409,6 @@ class PeakMarker(ChartObject):
         """
         self.set_property("xaxis", xaxis)
         self.set_property("yaxis", yaxis)
-        self.emit("appearance-changed")
     
     def get_color(self):
         """
@@ -2529,7 +4426,6 @@ class PeakMarker(ChartObject):
         @type color: gtk.gdk.Color
         """
         self.set_property("color", color)
-        self.emit("appearance-changed")
         
     def get_position(self):
         """
@@ -2547,7 +4443,6 @@ class PeakMarker(ChartObject):
         @type pos: (x, y) pair.
         """
         self.set_property("position", pos)
-        self.emit("appearance-changed")
         
     def get_text(self):
         """
@@ -2564,5 +4459,4 @@ class PeakMarker(ChartObject):
         @param txt: the new text
         @type txt: string
         """
-        self.set_proeprty("text", txt)
-        self.emit("appearance-changed")
+        self.set_property("text", txt)
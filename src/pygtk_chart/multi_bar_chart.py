@@ -15,7 +15,8 @@
 #       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #       MA 02110-1301, USA.
 """
-Contains the MultiBarChart widget.
+Contains the MultiBarChart widget and its drawing model
+MultiBarChartModel.
 
 Author: Sven Festersen (sven@sven-festersen.de)
 """
@@ -58,13 +59,13 @@ class Bar(bar_chart.Bar):
         bar_chart.Bar.__init__(self, name, value, title)
     
     #drawing methods
-    def _do_draw(self, context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels):
+    def _do_draw(self, context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, sensitive_areas):
         if mode == MODE_VERTICAL:
-            return self._do_draw_multi_vertical(context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels)
+            return self._do_draw_multi_vertical(context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, sensitive_areas)
         elif mode == MODE_HORIZONTAL:
-            return self._do_draw_multi_horizontal(context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels)
+            return self._do_draw_multi_horizontal(context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, sensitive_areas)
             
-    def _do_draw_multi_vertical(self, context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels):
+    def _do_draw_multi_vertical(self, context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, sensitive_areas):
         bar_width = (rect.width - (bar_count - n) * bar_padding - (n - 1) * group_padding) / bar_count
         bar_height = (rect.height - value_label_size - label_size) * self._value / maximum_value
         bar_x = group_end + j * (bar_width + bar_padding)
@@ -73,7 +74,7 @@ class Bar(bar_chart.Bar):
         bar_chart.draw_rounded_rectangle(context, bar_x, bar_y, bar_width, bar_height, self._corner_radius)
         context.fill()
         
-        chart.add_sensitive_area(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), (group, self))
+        sensitive_areas.add(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), (group, self))
         
         if self._highlighted:
             context.set_source_rgba(1, 1, 1, 0.1)
@@ -104,7 +105,7 @@ class Bar(bar_chart.Bar):
         
         return bar_x + bar_width
             
-    def _do_draw_multi_horizontal(self, context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels):
+    def _do_draw_multi_horizontal(self, context, rect, group, bar_count, n, i, m, j, mode, group_padding, bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, sensitive_areas):
         bar_height = (rect.height - (bar_count - n) * bar_padding - (n - 1) * group_padding) / bar_count
         bar_width = (rect.width - value_label_size - label_size) * self._value / maximum_value
         bar_x = rect.x + label_size
@@ -113,7 +114,7 @@ class Bar(bar_chart.Bar):
         bar_chart.draw_rounded_rectangle(context, bar_x, bar_y, bar_width, bar_height, self._corner_radius)
         context.fill()
         
-        chart.add_sensitive_area(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), (group, self))
+        sensitive_areas.add(chart.AREA_RECTANGLE, (bar_x, bar_y, bar_width, bar_height), (group, self))
         
         if self._highlighted:
             context.set_source_rgba(1, 1, 1, 0.1)
@@ -297,7 +298,6 @@ class BarGroup(ChartObject):
         @type title: string.
         """
         self.set_property("title", title)
-        self.emit("appearance_changed")
         
     def get_title(self):
         """
@@ -323,7 +323,6 @@ class BarGroup(ChartObject):
         @type padding: int in [0, 100].
         """
         self.set_property("bar-padding", padding)
-        self.emit("appearance_changed")
         
     def get_bar_padding(self):
         """
@@ -334,10 +333,10 @@ class BarGroup(ChartObject):
         return self.get_property("bar-padding")
         
     #drawing methods
-    def _do_draw(self, context, rect, bar_count, n, i, mode, group_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, rotate_label_horizontal):
+    def _do_draw(self, context, rect, bar_count, n, i, mode, group_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, rotate_label_horizontal, sensitive_areas):
         end = group_end
         for j, bar in enumerate(self._bars):
-            end = bar.draw(context, rect, self, bar_count, n, i, len(self._bars), j, mode, group_padding, self._bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels)
+            end = bar.draw(context, rect, self, bar_count, n, i, len(self._bars), j, mode, group_padding, self._bar_padding, maximum_value, group_end, value_label_size, label_size, label_rotation, draw_labels, sensitive_areas)
         
         if draw_labels and mode == MODE_VERTICAL:
             context.set_source_rgb(0, 0, 0)
@@ -376,9 +375,19 @@ class BarGroup(ChartObject):
         @param bar: the bar to add
         @type bar: multi_bar_chart.Bar.
         """
-        if bar.get_color() == COLOR_AUTO:
-            bar.set_color(COLORS[len(self._bars) % len(COLORS)])
         self._bars.append(bar)
+        bar.connect("appearance_changed", self._cb_bar_changed)
+        if bar.get_color() == COLOR_AUTO:
+            #the bar emits appearance-changed, see _cb_bar_changed()
+            bar.set_color(COLORS[(len(self._bars) - 1) % len(COLORS)])
+        else:
+            self.emit("appearance_changed")
+            
+    def _cb_bar_changed(self, bar):
+        """
+        The appearance of a bar in the group changed, so the group
+        changed, too.
+        """
         self.emit("appearance_changed")
         
     def get_value_label_size(self, context, rect, mode, bar_count, n, group_padding, bar_padding):
@@ -406,15 +415,23 @@ class BarGroup(ChartObject):
             return self._group_label_object.get_calculated_dimensions(context, rect)[0]
         
         
-class MultiBarChart(bar_chart.BarChart):
+#the signals of MultiBarChartModel, MultiBarChart emits them, too
+MULTI_BAR_CHART_SIGNALS = {"group-clicked": (gobject.SIGNAL_RUN_LAST,
+                                            gobject.TYPE_NONE,
+                                            (gobject.TYPE_PYOBJECT,
+                                            gobject.TYPE_PYOBJECT))}
+
+
+class MultiBarChartModel(bar_chart.BarChartModel):
     """
-    The MultiBarChart widget displays groups of bars.
+    The drawing model of a MultiBarChart, it displays groups of bars.
     Usage: create multi_bar_chart.BarGroups and
     add multi_bar_chart.Bars. The add the bar groups to MultiBarChart.
     
     Properties
     ==========
-    The MultiBarChart class inherits properties from bar_chart.BarChart
+    The MultiBarChartModel class inherits properties from
+    bar_chart.BarChartModel
     (except bar-padding). Additional properties:
      - group-padding (the space between two bar groups in px, type: int
       in [0, 100], default: 16)
@@ -426,15 +443,13 @@ class MultiBarChart(bar_chart.BarChart):
       
     Signals
     =======
-    The MultiBarChart class inherits the signal 'bar-clicked' from
-    bar_chart.BarChart. Additional signals:
+    The MultiBarChartModel class inherits the signal 'bar-clicked' from
+    bar_chart.BarChartModel. Additional signals:
      - group-clicked: emitted when a bar is clicked, callback signature:
       def group_clicked(chart, group, bar).
     """
     
-    __gsignals__ = {"group-clicked": (gobject.SIGNAL_RUN_LAST, 
-                                    gobject.TYPE_NONE, 
-                                    (gobject.TYPE_PYOBJECT, gobject.TYPE_PYOBJECT))}
+    __gsignals__ = dict(MULTI_BAR_CHART_SIGNALS)
                                     
     __gproperties__ = {"group-padding": (gobject.TYPE_INT, "group padding",
                                         "The space between two bar groups.",
@@ -457,7 +472,7 @@ class MultiBarChart(bar_chart.BarChart):
                                         True, gobject.PARAM_READWRITE)}
     
     def __init__(self):
-        bar_chart.BarChart.__init__(self)
+        bar_chart.BarChartModel.__init__(self)
         #private properties:
         self._groups = []
         #gobject properties:
@@ -507,7 +522,6 @@ class MultiBarChart(bar_chart.BarChart):
         @type padding: int in [0, 100].
         """
         self.set_property("group-padding", padding)
-        self.queue_draw()
         
     def get_group_padding(self):
         """
@@ -525,7 +539,6 @@ class MultiBarChart(bar_chart.BarChart):
         @type angle: int in [0, 360].
         """
         self.set_property("label-rotation", angle)
-        self.queue_draw()
         
     def get_label_rotation(self):
         """
@@ -544,7 +557,6 @@ class MultiBarChart(bar_chart.BarChart):
         @type rotate: boolean.
         """
         self.set_property("rotate-group-labels", rotate)
-        self.queue_draw()
         
     def get_rotate_group_labels(self):
         """
@@ -558,15 +570,15 @@ class MultiBarChart(bar_chart.BarChart):
     #callbacks
     def _cb_motion_notify(self, widget, event):
         if not self._mouseover: return
-        active = chart.get_sensitive_areas(event.x, event.y)
+        active = self._sensitive_areas.get_areas(event.x, event.y)
         if active == []: return
         for group in self._groups:
             for bar in group.get_bars():
                 bar.set_highlighted((group, bar) in active)
-        self.queue_draw()
+        self.queue_redraw()
         
     def _cb_button_pressed(self, widget, event):
-        active = chart.get_sensitive_areas(event.x, event.y)
+        active = self._sensitive_areas.get_areas(event.x, event.y)
         for group, bar in active:
             self.emit("group-clicked", group, bar)
             self.emit("bar-clicked", bar)
@@ -581,22 +593,21 @@ class MultiBarChart(bar_chart.BarChart):
             group_end = rect.y
         
         for i, group in enumerate(self._groups):
-            group_end = group.draw(context, rect, bar_count, len(self._groups), i, self._mode, self._group_padding, maximum_value, group_end, value_label_size, label_size, self._label_rotation, self._draw_labels, self._rotate_group_label_in_horizontal_mode)
+            group_end = group.draw(context, rect, bar_count, len(self._groups), i, self._mode, self._group_padding, maximum_value, group_end, value_label_size, label_size, self._label_rotation, self._draw_labels, self._rotate_group_label_in_horizontal_mode, self._sensitive_areas)
         
     def draw(self, context):
         """
-        Draw the widget. This method is called automatically. Don't call it
-        yourself. If you want to force a redrawing of the widget, call
+        Draw the chart. This method is called automatically. Don't call it
+        yourself. If you want to force a redrawing of the chart, call
         the queue_draw() method.
         
         @type context: cairo.Context
         @param context: The context to draw on.
         """
-        label.begin_drawing()
-        chart.init_sensitive_areas()
+        label.begin_drawing(self._style_cache)
+        self._sensitive_areas.clear()
         
-        rect = self.get_allocation()
-        rect = gtk.gdk.Rectangle(0, 0, rect.width, rect.height) #transform rect to context coordinates
+        rect = self._get_draw_rect()
         context.set_line_width(1)
                                     
         rect = self.draw_basics(context, rect)
@@ -628,7 +639,7 @@ class MultiBarChart(bar_chart.BarChart):
         elif self._mode == MODE_HORIZONTAL:
             minimum_width = rect.x + self._padding + 200
             minimum_height = rect.y + self._padding + bar_count * 10 + n * self._group_padding
-        self.set_size_request(minimum_width, minimum_height)
+        self._set_minimum_size(minimum_width, minimum_height)
     
     #other methods        
     def add_group(self, group):
@@ -638,7 +649,8 @@ class MultiBarChart(bar_chart.BarChart):
         @type group: multi_bar_chart.BarGroup.
         """
         self._groups.append(group)
-        self.queue_draw()
+        group.connect("appearance_changed", self._cb_appearance_changed)
+        self.queue_redraw()
         
     def add_bar(self, bar):
         """
@@ -647,3 +659,18 @@ class MultiBarChart(bar_chart.BarChart):
         """
         print "MultiBarChart.add_bar is deprecated. Use add_group instead."
         self.add_group(bar)
+        
+class MultiBarChart(bar_chart.BarChart):
+    """
+    The MultiBarChart widget displays groups of bars. See
+    MultiBarChartModel for its attributes, methods, properties and
+    signals.
+    """
+    
+    __gsignals__ = dict(MULTI_BAR_CHART_SIGNALS)
+    
+    def __init__(self, model=None):
+        if model == None:
+            model = MultiBarChartModel()
+        bar_chart.BarChart.__init__(self, model)
+        self._forward_signals(MULTI_BAR_CHART_SIGNALS)
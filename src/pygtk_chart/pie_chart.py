@@ -19,7 +19,7 @@
 #       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #       MA 02110-1301, USA.
 """
-Contains the PieChart widget.
+Contains the PieChart widget and its drawing model PieChartModel.
 
 Author: Sven Festersen (sven@sven-festersen.de)
 """
@@ -103,13 +103,19 @@ class PieArea(chart.Area):
             self._label_object.draw(context, rect)
 
 
-class PieChart(chart.Chart):
+#the signals of PieChartModel, PieChart emits them, too
+PIE_CHART_SIGNALS = {"area-clicked": (gobject.SIGNAL_RUN_LAST,
+                                        gobject.TYPE_NONE,
+                                        (gobject.TYPE_PYOBJECT,))}
+
+
+class PieChartModel(chart.ChartModel):
     """
-    This is the pie chart class.
+    This is the drawing model of a pie chart, see chart.ChartModel.
     
     Properties
     ==========
-    The PieChart class inherits properties from chart.Chart.
+    The PieChartModel class inherits properties from chart.ChartModel.
     Additional properties:
      - rotate (the angle that the pie chart should be rotated by in
        degrees, type: int in [0, 360])
@@ -127,7 +133,7 @@ class PieChart(chart.Chart):
        
     Signals
     =======
-    The PieChart class inherits signals from chart.Chart.
+    The PieChartModel class inherits signals from chart.ChartModel.
     Additional signals:
      - area-clicked (emitted when an area is clicked)
     callback signature:
@@ -163,10 +169,10 @@ class PieChart(chart.Chart):
                                         "Set whether a mouseover effect should be visible if moving the mouse over a pie area.",
                                         True, gobject.PARAM_READWRITE)}
                                         
-    __gsignals__ = {"area-clicked": (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_PYOBJECT,))}
+    __gsignals__ = dict(PIE_CHART_SIGNALS)
     
     def __init__(self):
-        chart.Chart.__init__(self)
+        chart.ChartModel.__init__(self)
         self._areas = []
         self._rotate = 0
         self._shadow = True
@@ -176,11 +182,6 @@ class PieChart(chart.Chart):
         self._enable_scroll = True
         self._enable_mouseover = True
         
-        self.add_events(gtk.gdk.BUTTON_PRESS_MASK|gtk.gdk.SCROLL_MASK|gtk.gdk.POINTER_MOTION_MASK)
-        self.connect("button_press_event", self._cb_button_pressed)
-        self.connect("scroll-event", self._cb_scroll_event)
-        self.connect("motion-notify-event", self._cb_motion_notify)
-        
     def do_get_property(self, property):
         if property.name == "rotate":
             return self._rotate
@@ -218,14 +219,14 @@ class PieChart(chart.Chart):
             raise AttributeError, "Property %s does not exist." % property.name
             
     def _cb_appearance_changed(self, widget):
-        self.queue_draw()
+        self.queue_redraw()
         
     def _cb_motion_notify(self, widget, event):
         if not self._enable_mouseover: return
         area = self._get_area_at_pos(event.x, event.y)
         for a in self._areas:
             a.set_property("highlighted", a == area)
-        self.queue_draw()
+        self.queue_redraw()
         
     def _cb_button_pressed(self, widget, event):
         area = self._get_area_at_pos(event.x, event.y)
@@ -233,7 +234,7 @@ class PieChart(chart.Chart):
             self.emit("area-clicked", area)
                 
     def _get_area_at_pos(self, x, y):
-        rect = self.get_allocation()
+        rect = self._get_draw_rect()
         center = rect.width / 2, rect.height / 2
         x = x - center[0]
         y = y - center[1]
@@ -281,19 +282,19 @@ class PieChart(chart.Chart):
             
     def draw(self, context):
         """
-        Draw the widget. This method is called automatically. Don't call it
-        yourself. If you want to force a redrawing of the widget, call
+        Draw the chart. This method is called automatically. Don't call it
+        yourself. If you want to force a redrawing of the chart, call
         the queue_draw() method.
 
         @type context: cairo.Context
         @param context: The context to draw on.
         """
-        label.begin_drawing()
+        label.begin_drawing(self._style_cache)
         
-        rect = self.get_allocation()
+        rect = self._get_draw_rect()
         #initial context settings: line width & font
         context.set_line_width(1)
-        font = gtk.Label().style.font_desc.get_family()
+        font = self._style_cache.get_font_family()
         context.select_font_face(font, cairo.FONT_SLANT_NORMAL, \
                                     cairo.FONT_WEIGHT_NORMAL)
 
@@ -360,7 +361,6 @@ class PieChart(chart.Chart):
         @type angle: integer.
         """
         self.set_property("rotate", angle)
-        self.queue_draw()
         
     def get_rotate(self):
         """
@@ -377,7 +377,6 @@ class PieChart(chart.Chart):
         @type draw: boolean.
         """
         self.set_property("draw-shadow", draw)
-        self.queue_draw()
         
     def get_draw_shadow(self):
         """
@@ -394,7 +393,6 @@ class PieChart(chart.Chart):
         @type draw: boolean.
         """
         self.set_property("draw-labels", draw)
-        self.queue_draw()
         
     def get_draw_labels(self):
         """
@@ -411,7 +409,6 @@ class PieChart(chart.Chart):
         @type show: boolean.
         """
         self.set_property("show-percentage", show)
-        self.queue_draw()
         
     def get_show_percentage(self):
         """
@@ -462,7 +459,6 @@ class PieChart(chart.Chart):
         @type show: boolean.
         """
         self.set_property("show-values", show)
-        self.queue_draw()
         
     def get_show_values(self):
         """
@@ -472,3 +468,17 @@ class PieChart(chart.Chart):
         """
         return self.get_property("show-values")
         
+        
+class PieChart(chart.Chart):
+    """
+    This is the pie chart widget. See PieChartModel for its attributes,
+    methods, properties and signals.
+    """
+    
+    __gsignals__ = dict(PIE_CHART_SIGNALS)
+    
+    def __init__(self, model=None):
+        if model == None:
+            model = PieChartModel()
+        chart.Chart.__init__(self, model)
+        self._forward_signals(PIE_CHART_SIGNALS)
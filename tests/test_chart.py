@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#
+#       test_chart.py
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+Tests for the chart module: the spatial index of click sensitive areas.
+
+Run from the top directory with: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pygtk_chart import chart
+
+
+class SensitiveAreasTest(unittest.TestCase):
+    
+    def test_get_areas(self):
+        areas = chart.SensitiveAreas()
+        areas.add(chart.AREA_RECTANGLE, (10, 10, 100, 50), "rect")
+        areas.add(chart.AREA_CIRCLE, (50, 30, 5), "circle")
+        areas.add(chart.AREA_RECTANGLE, (300, 200, -20, -20), "negative")
+        self.assertEqual(areas.get_areas(50, 30), ["rect", "circle"])
+        self.assertEqual(areas.get_areas(100, 55), ["rect"])
+        self.assertEqual(areas.get_areas(290, 190), ["negative"])
+        self.assertEqual(areas.get_areas(200, 100), [])
+        areas.add(chart.AREA_CIRCLE, (200, 100, 1), "added")
+        self.assertEqual(areas.get_areas(200, 100), ["added"])
+        areas.clear()
+        self.assertEqual(areas.get_areas(50, 30), [])
+        
+    def test_occupancy_at_scale(self):
+        #200k points of 1px on a 400x300 chart
+        areas = chart.SensitiveAreas()
+        n = 200000
+        for i in xrange(n):
+            areas.add(chart.AREA_CIRCLE, (i % 500 * 0.8, i // 500 * 0.75, 0.5),
+                        i)
+        self.assertEqual(areas.get_areas(0.8 * 7, 0.75 * 3), [3 * 500 + 7])
+        occupancy = max(len(cell) for cell in areas._cells.itervalues())
+        self.assertTrue(occupancy <= 16, occupancy)
+        
+        
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+#       test_export.py
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+Tests for the export module: specs are turned into charts and rendered.
+
+Run from the top directory with: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import gtk
+
+from pygtk_chart import bar_chart
+from pygtk_chart import export
+from pygtk_chart import line_chart
+from pygtk_chart import multi_bar_chart
+from pygtk_chart import pie_chart
+
+OBJECTS = {"title": {"text": "Test"}}
+
+SPECS = [{"type": "line",
+            "width": 200, "height": 150,
+            "objects": OBJECTS,
+            "graphs": [{"name": "a", "xdata": [1, 2, 3],
+                        "ydata": [3, 1, 2],
+                        "properties": {"color": "#ff0000"}}]},
+        {"type": "bar",
+            "width": 200, "height": 150,
+            "objects": OBJECTS,
+            "bars": [{"name": "q1", "value": 12, "title": "Q1"},
+                    {"name": "q2", "value": 17, "title": "Q2",
+                        "properties": {"color": "#00ff00"}}]},
+        {"type": "multibar",
+            "width": 200, "height": 150,
+            "objects": OBJECTS,
+            "groups": [{"name": "2009", "title": "2009",
+                        "bars": [{"name": "q1", "value": 12},
+                                {"name": "q2", "value": 17}]}]},
+        {"type": "pie",
+            "width": 200, "height": 150,
+            "objects": OBJECTS,
+            "areas": [{"name": "a", "value": 2, "title": "A"},
+                    {"name": "b", "value": 3, "title": "B"}]}]
+
+CLASSES = [line_chart.LineChartModel, bar_chart.BarChartModel,
+            multi_bar_chart.MultiBarChartModel, pie_chart.PieChartModel]
+
+
+class ExportTest(unittest.TestCase):
+
+    def test_create_chart(self):
+        for spec, chart_class in zip(SPECS, CLASSES):
+            chart = export.create_chart(spec)
+            self.assertTrue(isinstance(chart, chart_class))
+            self.assertFalse(isinstance(chart, gtk.Widget))
+            self.assertEqual(chart.title.get_text(), "Test")
+
+    def test_create_chart_colors(self):
+        chart = export.create_chart(SPECS[0])
+        graph = chart.get_graphs()[0]
+        self.assertEqual(graph.get_color(), gtk.gdk.color_parse("#ff0000"))
+
+    def test_unknown_type(self):
+        self.assertRaises(ValueError, export.create_chart, {"type": "x"})
+
+    def test_render_many(self):
+        results = list(export.render_many(SPECS, workers=1))
+        self.assertEqual(len(results), len(SPECS))
+        for data in results:
+            self.assertTrue(data.startswith("\x89PNG"))
+            
+    def test_render_many_workers(self):
+        specs = SPECS * 3
+        results = list(export.render_many(specs, workers=2, chunksize=2))
+        self.assertEqual(results, list(export.render_many(specs, workers=1)))
+        
+    def test_render_many_workers_error(self):
+        specs = SPECS + [{"type": "x"}]
+        self.assertRaises(ValueError, list,
+                            export.render_many(specs, workers=2, chunksize=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
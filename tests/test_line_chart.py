@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+#
+#       test_line_chart.py
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+Tests for line_chart.LineChart: changing a property of the chart or of
+one of its objects has to change the drawn chart (layer cache), and
+the tic calculation.
+
+Run from the top directory with: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cairo
+import gtk
+import pango
+import pangocairo
+
+import pygtk_chart
+from pygtk_chart import line_chart
+
+WIDTH = 400
+HEIGHT = 300
+
+
+class LayerCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chart = line_chart.LineChart()
+        self.chart.size_allocate(gtk.gdk.Rectangle(0, 0, WIDTH, HEIGHT))
+        self.graph = line_chart.Graph("test", range(10),
+                                        [x * x for x in range(10)])
+        self.graph.set_fill_to(0)
+        self.chart.add_graph(self.graph)
+
+    def draw(self):
+        """
+        Draw the chart with the layer cache like an expose does and
+        return the image data.
+        """
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+        context = pangocairo.CairoContext(cairo.Context(surface))
+        self.chart.draw(context, True)
+        surface.flush()
+        return str(surface.get_data())
+
+    def assertRedrawn(self, change, *args):
+        before = self.draw()
+        #draw twice, the second draw only uses the cached layers
+        self.assertEqual(before, self.draw())
+        change(*args)
+        self.assertNotEqual(before, self.draw(), change.__name__)
+
+    def test_axis(self):
+        axis = self.chart.xaxis
+        self.assertRedrawn(axis.set_label, "label")
+        self.assertRedrawn(axis.set_tic_size, axis.get_tic_size() + 5)
+        self.assertRedrawn(axis.set_tic_format, lambda x: "#")
+        self.assertRedrawn(axis.set_show_tic_labels,
+                            not axis.get_show_tic_labels())
+        self.assertRedrawn(axis.set_show_tics, not axis.get_show_tics())
+        axis = self.chart.yaxis
+        self.assertRedrawn(axis.set_show_other_side,
+                            not axis.get_show_other_side())
+
+    def test_grid(self):
+        grid = self.chart.grid
+        self.assertRedrawn(grid.set_line_style_horizontal,
+                            pygtk_chart.LINE_STYLE_DASHED)
+        self.assertRedrawn(grid.set_line_style_vertical,
+                            pygtk_chart.LINE_STYLE_DASHED_ASYMMETRIC)
+        self.assertRedrawn(grid.set_color, gtk.gdk.Color(65535, 0, 0))
+        self.assertRedrawn(grid.set_show_horizontal_lines,
+                            not grid.get_show_horizontal_lines())
+        self.assertRedrawn(grid.set_show_vertical_lines,
+                            not grid.get_show_vertical_lines())
+
+    def test_graph(self):
+        graph = self.graph
+        self.assertRedrawn(graph.set_point_style,
+                            pygtk_chart.POINT_STYLE_SQUARE)
+        self.assertRedrawn(graph.set_point_size, graph.get_point_size() + 4)
+        self.assertRedrawn(graph.set_color, gtk.gdk.Color(0, 65535, 0))
+        self.assertRedrawn(graph.set_fill_opacity, 0.9)
+        self.assertRedrawn(graph.set_fill_to, 20)
+        self.assertRedrawn(graph.set_highlighted, [(4, 16)])
+
+    def test_set_property(self):
+        self.assertRedrawn(self.graph.set_property, "color",
+                            gtk.gdk.Color(0, 0, 65535))
+        self.assertRedrawn(self.chart.xaxis.set_property, "label", "label")
+        self.assertRedrawn(self.chart.set_property, "padding", 30)
+
+    def test_peak_marker(self):
+        marker = line_chart.PeakMarker((5, 25), "peak")
+        self.chart.add_peak_marker("peak", marker)
+        self.assertRedrawn(marker.set_text, "top")
+        self.assertRedrawn(marker.set_position, (6, 36))
+        self.assertRedrawn(marker.set_color, gtk.gdk.Color(65535, 0, 0))
+        self.chart.remove_peak_marker("peak")
+        self.draw()
+        model = self.chart.get_model()
+        marker.set_text("removed")
+        self.assertFalse(model._data_dirty)
+        
+    def test_mouse_over_effect(self):
+        self.draw()
+        data_surface = self.chart._data_surface
+        self.chart.set_mouse_over_effect(False)
+        self.draw()
+        self.assertFalse(self.chart._data_surface is data_surface)
+
+    def test_queue_draw(self):
+        self.draw()
+        frame_surface = self.chart._frame_surface
+        self.chart.queue_draw()
+        self.draw()
+        self.assertFalse(self.chart._frame_surface is frame_surface)
+
+
+class PixbufPointStyleTest(unittest.TestCase):
+
+    def test_draw(self):
+        chart = line_chart.LineChart()
+        chart.size_allocate(gtk.gdk.Rectangle(0, 0, WIDTH, HEIGHT))
+        graph = line_chart.Graph("test", range(10), range(10))
+        pixbuf = gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB, True, 8, 6, 6)
+        pixbuf.fill(0xff0000ff)
+        graph.set_point_style(pixbuf)
+        chart.add_graph(graph)
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+        chart.draw(pangocairo.CairoContext(cairo.Context(surface)))
+        self.assertTrue(pixbuf in line_chart.PIXBUF_SPRITES)
+
+
+class StyleCacheTest(unittest.TestCase):
+    
+    def test_per_chart(self):
+        models = [line_chart.LineChartModel(), line_chart.LineChartModel()]
+        for model in models:
+            model.title.set_text("Title")
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+            model.render(surface, WIDTH, HEIGHT)
+        layouts = [model._style_cache.get_layout_cache() for model in models]
+        self.assertTrue(len(layouts[0]) > 0)
+        self.assertEqual(len(layouts[0]), len(layouts[1]))
+        models[0].set_style_defaults(pango.FontDescription("Serif 12"))
+        self.assertEqual(len(layouts[0]), 0)
+        self.assertTrue(len(layouts[1]) > 0)
+        
+        
+class HighlightTest(unittest.TestCase):
+
+    def test_add_highlighted(self):
+        for xdata in (range(10), [3, 1, 4, 1, 5, 9, 2, 6, 5, 3]):
+            graph = line_chart.Graph("test", xdata, range(10))
+            graph.add_highlighted((xdata[3], 3))
+            graph.add_highlighted((xdata[3], 4))
+            graph.add_highlighted((100, 1))
+            self.assertEqual(graph.get_highlighted_indices(), set([3]))
+
+
+class PyramidTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.xdata = range(20000)
+        self.ydata = [(x * 7919) % 1000 for x in self.xdata]
+        
+    def test_indices(self):
+        pyramid = line_chart.GraphPyramid((self.xdata, self.ydata))
+        self.assertTrue(len(pyramid) > 2)
+        for level in range(1, len(pyramid)):
+            xdata, ydata = pyramid.get_level((self.xdata, self.ydata), level)
+            indices = list(pyramid.get_indices(level))
+            self.assertEqual(list(xdata), [self.xdata[i] for i in indices])
+            self.assertEqual(list(ydata), [self.ydata[i] for i in indices])
+            
+    def test_points_drawn_from_level(self):
+        chart = line_chart.LineChart()
+        chart.size_allocate(gtk.gdk.Rectangle(0, 0, WIDTH, HEIGHT))
+        graph = line_chart.Graph("test", self.xdata, self.ydata)
+        graph.set_pyramid_factor(4)
+        chart.add_graph(graph)
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+        chart.draw(pangocairo.CairoContext(cairo.Context(surface)))
+        areas = chart.get_model()._sensitive_areas._areas
+        self.assertTrue(0 < len(areas) <= 4 * WIDTH)
+        for type, coords, (area_graph, index) in areas:
+            self.assertTrue(area_graph is graph)
+            self.assertEqual(graph.get_point(index),
+                                (self.xdata[index], self.ydata[index]))
+        
+        
+    def test_level_irregular_x(self):
+        #19000 points in [0, 1) and 1000 points in [1, 1000]
+        xdata = [i / 19000.0 for i in range(19000)] + \
+                [1 + i * 999 / 999.0 for i in range(1000)]
+        graph = line_chart.Graph("test", xdata, self.ydata)
+        graph.set_pyramid_factor(4)
+        rect = gtk.gdk.Rectangle(0, 0, WIDTH, HEIGHT)
+        logscale = (False, False)
+        self.assertEqual(graph._get_line_level(rect, (1, 1000), logscale), 0)
+        self.assertEqual(graph._get_line_level(rect, (0, 1), logscale), 2)
+        
+        
+class TransformTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.rect = gtk.gdk.Rectangle(0, 0, WIDTH, HEIGHT)
+        self.data = ([1, 10, 100, 1000, 0], [10, 0, -1, 10, 10])
+        
+    def transform(self, cull):
+        args = (self.rect, self.data, (0, 3), (0, 2), 100, 100, (True, True))
+        results = [zip(*line_chart.graph_iter_points(cull=cull, *args))]
+        if line_chart.HAVE_NUMPY:
+            results.append([a.tolist() for a in
+                            line_chart.graph_transform_data(cull=cull, *args)])
+        return results
+        
+    def test_non_finite_culled(self):
+        for xs, ys, posx, posy in self.transform(True):
+            self.assertEqual(list(xs), [0, 3])
+            self.assertEqual(list(posy), [200, 200])
+        
+    def test_non_finite_not_culled(self):
+        for result in self.transform(False):
+            for values in result:
+                self.assertEqual([v == v for v in values],
+                                    [True, False, False, True, False])
+        
+    def test_gaps(self):
+        posx, posy = line_chart.graph_get_positions(self.rect, self.data,
+                                                    (0, 3), (0, 2), 100, 100,
+                                                    (True, True), cull=False)
+        segments = line_chart.graph_split_gaps(posx, posy)
+        self.assertEqual([list(x) for x, y in segments], [[0], [300]])
+        
+        
+class PathTest(unittest.TestCase):
+    
+    class Recorder(object):
+        
+        def __init__(self):
+            self.calls = []
+            
+        def move_to(self, x, y):
+            self.calls.append(("move_to", x, y))
+            
+        def line_to(self, x, y):
+            self.calls.append(("line_to", x, y))
+    
+    def test_break_at_nan(self):
+        nan = float("nan")
+        context = self.Recorder()
+        line_chart.graph_make_path(context, [0, 1, nan, 3, 4, 5],
+                                    [0, 1, 2, 3, nan, 5])
+        self.assertEqual([call[0] for call in context.calls],
+                            ["move_to", "line_to", "move_to", "move_to"])
+        
+        
+class TicsTest(unittest.TestCase):
+
+    def test_never_empty(self):
+        for crange, logscale, length in [((2.41, 2.59), False, 60),
+                                            ((1.05, 1.95), False, -20),
+                                            ((0.1, 0.2), True, 300)]:
+            tics = line_chart.chart_calculate_tics_for_range(crange,
+                                                                logscale,
+                                                                length)
+            self.assertTrue(len(tics) > 0, (crange, logscale, length))
+
+    def test_cached_result_is_immutable(self):
+        tics = line_chart.chart_calculate_tics_for_range((0, 100), False,
+                                                            400)
+        self.assertTrue(isinstance(tics, tuple))
+
+    def test_short_axis(self):
+        chart = line_chart.LineChart()
+        chart.size_allocate(gtk.gdk.Rectangle(0, 0, 60, 40))
+        chart.add_graph(line_chart.Graph("test", [1.05, 1.95], [2.41, 2.59]))
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 60, 40)
+        chart.draw(pangocairo.CairoContext(cairo.Context(surface)))
+
+
+if __name__ == "__main__":
+    unittest.main()